@@ -0,0 +1,14 @@
+"""
+Benchmarks das views mais acessadas.
+
+Cada cenário faz requisições com o client de teste do Django contra o banco
+configurado (gere dados com ``manage.py seed_platform``) e mede consultas SQL,
+latência (p50/p95) e alocação de memória. ``manage.py benchmark_views``
+compara o resultado com ``benchmarks/baseline.json`` e falha quando uma view
+passa do orçamento de consultas ou passa a responder com erro.
+
+Latência e alocação dependem da máquina: o baseline versionado foi gravado
+em uma única máquina, com SQLite. Elas só entram no orçamento com ``--latencia``,
+e então o baseline deve ser regravado (``--gravar-baseline``) na mesma
+máquina que roda a comparação, como um runner de CI fixo.
+"""
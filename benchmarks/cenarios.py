@@ -0,0 +1,67 @@
+# benchmarks/cenarios.py
+"""Cenários medidos: qual view, com qual usuário e com quais objetos do banco."""
+from django.db.models import Count
+from django.urls import reverse
+
+from cursos.models import Trilha, ConteudoModulo
+from usuarios.models import Sala, Missao, MensagemMissao, ParticipacaoSala
+
+
+class DadosInsuficientes(Exception):
+    pass
+
+
+def montar_contexto():
+    """
+    Escolhe os objetos mais pesados do banco: a sala com mais alunos, a
+    missão dela com mais mensagens, um aluno que entregou essa missão e uma
+    trilha sem requisitos da sala.
+    """
+    sala = (
+        Sala.objects.annotate(alunos=Count('participantes'))
+        .order_by('-alunos').select_related('criador').first()
+    )
+    if sala is None:
+        raise DadosInsuficientes('Banco sem salas. Rode manage.py seed_platform.')
+
+    missao = Missao.objects.filter(sala=sala).annotate(n=Count('mensagens')).order_by('-n').first()
+    entrega = (
+        MensagemMissao.objects.filter(missao=missao, tipo='entrega').select_related('usuario').first()
+        if missao else None
+    )
+    trilha = (
+        Trilha.objects.filter(sala=sala, pontos_necessarios=0, trilha_anterior__isnull=True)
+        .annotate(n=Count('modulos__conteudos')).order_by('-n').first()
+    )
+    conteudo = ConteudoModulo.objects.filter(modulo__trilha=trilha).order_by('modulo__ordem', 'ordem').first()
+    if not (missao and entrega and trilha and conteudo):
+        raise DadosInsuficientes('A sala escolhida não tem missões, entregas ou trilhas. Rode manage.py seed_platform.')
+
+    professor = (
+        ParticipacaoSala.objects.filter(sala=sala, tipo_na_sala='professor')
+        .select_related('usuario').first()
+    )
+    return {
+        'aluno': entrega.usuario,
+        'professor': professor.usuario if professor else sala.criador,
+        'sala': sala.id,
+        'missao': missao.id,
+        'trilha': trilha.id,
+        'conteudo': conteudo.id,
+    }
+
+
+# (nome, usuário que faz a requisição, função que monta a URL)
+CENARIOS = [
+    ('principal', 'aluno', lambda c: reverse('usuarios:pag_principal')),
+    ('sala_virtual', 'aluno', lambda c: reverse('usuarios:sala_virtual', args=[c['sala']])),
+    ('sala_virtual_professor', 'professor', lambda c: reverse('usuarios:sala_virtual', args=[c['sala']])),
+    ('chat_missao', 'aluno', lambda c: reverse('usuarios:chat_missao', args=[c['missao']])),
+    ('chat_missao_professor', 'professor', lambda c: reverse('usuarios:chat_missao', args=[c['missao']])),
+    ('listar_titulos', 'aluno', lambda c: reverse('usuarios:listar_titulos')),
+    ('lista_trilhas', 'aluno', lambda c: reverse('cursos:lista_trilhas')),
+    ('detalhe_trilha', 'aluno', lambda c: reverse('cursos:detalhe_trilha', args=[c['trilha']])),
+    ('visualizar_conteudo', 'aluno', lambda c: reverse('cursos:visualizar_conteudo', args=[c['conteudo']])),
+    ('sala_messages', 'aluno', lambda c: reverse('usuarios:sala_messages', args=[c['sala']])),
+    ('missao_messages', 'aluno', lambda c: reverse('usuarios:missao_messages', args=[c['missao']])),
+]
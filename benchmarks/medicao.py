@@ -0,0 +1,79 @@
+# benchmarks/medicao.py
+"""Medição de um cenário e comparação com o baseline."""
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def medir(client, url, repeticoes):
+    """
+    Faz ``repeticoes`` GETs em ``url`` e retorna status, consultas SQL,
+    p50/p95 em ms e o pico de memória alocada (KB) em uma requisição.
+    """
+    # aquecimento: templates compilados, cache de papéis, cache do banco
+    resposta = client.get(url)
+
+    with CaptureQueriesContext(connection) as ctx:
+        resposta = client.get(url)
+    consultas = len(ctx)
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        client.get(url)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    # alocação medida à parte: o tracemalloc deixa a requisição mais lenta
+    tracemalloc.start()
+    try:
+        client.get(url)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': resposta.status_code,
+        'consultas': consultas,
+        'p50_ms': round(statistics.median(tempos), 2),
+        'p95_ms': round(percentil(tempos, 95), 2),
+        'alocacao_kb': round(pico / 1024, 1),
+    }
+
+
+def comparar(resultados, baseline, tolerancia, folga_consultas=0, latencia=False):
+    """
+    Lista as regressões em relação ao baseline. Uma view que passa a
+    responder com erro é regressão, e consultas não podem passar do
+    baseline (mais ``folga_consultas``): isso independe da máquina.
+
+    Com ``latencia``, p50 e alocação também não podem passar de
+    ``baseline * (1 + tolerancia)``. São valores absolutos, só comparáveis
+    com um baseline gravado na mesma máquina. O p95 é só informativo: com
+    poucas repetições ele mede mais o ruído da máquina que a view.
+    """
+    regressoes = []
+    for nome, atual in resultados.items():
+        base = baseline.get(nome)
+        # erro novo (a view respondia bem no baseline, ou não tem baseline)
+        if atual['status'] >= 400 and (base is None or base['status'] < 400):
+            regressoes.append(f'{nome}: status {atual["status"]}')
+        if base is None:
+            continue
+        if atual['consultas'] > base['consultas'] + folga_consultas:
+            regressoes.append(f'{nome}: {atual["consultas"]} consultas (baseline {base["consultas"]})')
+        if not latencia:
+            continue
+        for metrica in ('p50_ms', 'alocacao_kb'):
+            limite = base[metrica] * (1 + tolerancia)
+            if atual[metrica] > limite:
+                regressoes.append(f'{nome}: {metrica} {atual[metrica]} > {limite:.1f} (baseline {base[metrica]})')
+    return regressoes
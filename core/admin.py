@@ -0,0 +1,11 @@
+from django.contrib import admin
+from core.models import Tarefa
+
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome', 'status', 'tentativas', 'max_tentativas', 'executar_apos', 'criado_em', 'concluido_em')
+    list_filter = ('status', 'nome')
+    search_fields = ('nome', 'chave')
+    readonly_fields = ('criado_em', 'iniciado_em', 'concluido_em', 'erro')
+    ordering = ('-criado_em',)
@@ -6,6 +6,10 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        # Registra as tarefas da fila declaradas em <app>/tarefas.py
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tarefas')
+
         # Tenta copiar ícones para static/pwa-icons automaticamente no startup
         try:
             from django.core.management import call_command
@@ -0,0 +1,48 @@
+# core/contagem.py
+"""
+Contagem estimada para as listagens do admin em tabelas grandes.
+
+A paginação do admin faz um ``COUNT(*)`` da tabela a cada página (e
+outro para o total sem filtros). No PostgreSQL isso lê a tabela inteira.
+Sem filtros, ``PaginadorEstimado`` usa a estimativa do planejador
+(``pg_class.reltuples``, atualizada pelo autovacuum/ANALYZE); com filtros,
+ou em tabelas pequenas, ou em outros bancos, conta de verdade.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Abaixo disso a contagem exata é barata e a estimativa imprecisa
+CONTAGEM_EXATA_ATE = getattr(settings, 'ADMIN_CONTAGEM_EXATA_ATE', 10_000)
+
+
+def contagem_estimada(modelo, using='default'):
+    """Linhas estimadas da tabela do modelo, ou None se o banco não souber estimar."""
+    conexao = connections[using]
+    if conexao.vendor != 'postgresql':
+        return None
+    with conexao.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [modelo._meta.db_table])
+        linha = cursor.fetchone()
+    # -1: tabela nunca analisada
+    if linha is None or linha[0] < 0:
+        return None
+    return int(linha[0])
+
+
+class PaginadorEstimado(Paginator):
+    @cached_property
+    def count(self):
+        consulta = self.object_list
+        if not consulta.query.where:
+            estimada = contagem_estimada(consulta.model, consulta.db)
+            if estimada is not None and estimada > CONTAGEM_EXATA_ATE:
+                return estimada
+        return super().count
+
+
+class ContagemEstimadaAdmin:
+    """Mixin de ModelAdmin: pagina com contagem estimada e não conta o total sem filtros."""
+    paginator = PaginadorEstimado
+    show_full_result_count = False
@@ -0,0 +1,98 @@
+import json
+import platform
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from benchmarks.cenarios import CENARIOS, DadosInsuficientes, montar_contexto
+from benchmarks.medicao import comparar, medir
+
+BASELINE_PADRAO = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede consultas SQL, latência (p50/p95) e alocação das views mais acessadas e '
+        'falha se alguma passar do orçamento de consultas do baseline '
+        '(com --latencia, também de p50 e alocação).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semear', type=int, metavar='USUARIOS',
+                            help='Roda seed_platform com esse número de usuários antes de medir.')
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições por cenário.')
+        parser.add_argument('--cenario', action='append', dest='cenarios',
+                            help='Mede apenas este cenário (pode repetir).')
+        parser.add_argument('--baseline', default=str(BASELINE_PADRAO), help='Arquivo JSON do baseline.')
+        parser.add_argument('--gravar-baseline', action='store_true',
+                            help='Grava o resultado como novo baseline em vez de comparar '
+                                 '(com --cenario, atualiza só esses cenários).')
+        parser.add_argument('--latencia', action='store_true',
+                            help='Compara também p50 e alocação. Os valores são absolutos: use com um '
+                                 'baseline gravado na mesma máquina.')
+        parser.add_argument('--tolerancia', type=float, default=0.5,
+                            help='Com --latencia, folga relativa para p50 e alocação '
+                                 '(0.5 = até 50%% acima do baseline).')
+        parser.add_argument('--folga-consultas', type=int, default=0,
+                            help='Consultas a mais permitidas por view.')
+
+    def handle(self, *args, **options):
+        if options['semear']:
+            call_command('seed_platform', usuarios=options['semear'], stdout=self.stdout)
+
+        try:
+            contexto = montar_contexto()
+        except DadosInsuficientes as e:
+            raise CommandError(str(e))
+
+        cenarios = CENARIOS
+        if options['cenarios']:
+            desconhecidos = set(options['cenarios']) - {nome for nome, _, _ in CENARIOS}
+            if desconhecidos:
+                raise CommandError(f'Cenário(s) desconhecido(s): {", ".join(sorted(desconhecidos))}')
+            cenarios = [c for c in CENARIOS if c[0] in options['cenarios']]
+
+        clients = {}
+        for papel in ('aluno', 'professor'):
+            clients[papel] = Client(raise_request_exception=False)
+            clients[papel].force_login(contexto[papel])
+
+        resultados = {}
+        self.stdout.write(f'{"cenário":<24} {"status":>6} {"queries":>7} {"p50 ms":>8} {"p95 ms":>8} {"KB":>8}')
+        for nome, papel, montar_url in cenarios:
+            r = medir(clients[papel], montar_url(contexto), options['repeticoes'])
+            resultados[nome] = r
+            self.stdout.write(
+                f'{nome:<24} {r["status"]:>6} {r["consultas"]:>7} {r["p50_ms"]:>8} {r["p95_ms"]:>8} {r["alocacao_kb"]:>8}'
+            )
+
+        caminho = Path(options['baseline'])
+        if options['gravar_baseline']:
+            if options['cenarios'] and caminho.exists():
+                # regravando só alguns cenários: mantém os demais
+                resultados = {**json.loads(caminho.read_text(encoding='utf-8'))['cenarios'], **resultados}
+            caminho.write_text(json.dumps({
+                'ambiente': {
+                    'banco': connection.vendor,
+                    'python': platform.python_version(),
+                    'repeticoes': options['repeticoes'],
+                },
+                'cenarios': resultados,
+            }, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'Baseline gravado em {caminho}'))
+            return
+
+        if not caminho.exists():
+            raise CommandError(f'Baseline não encontrado: {caminho}. Gere com --gravar-baseline.')
+        baseline = json.loads(caminho.read_text(encoding='utf-8'))
+        regressoes = comparar(resultados, baseline['cenarios'], options['tolerancia'],
+                              options['folga_consultas'], latencia=options['latencia'])
+        if regressoes:
+            for regressao in regressoes:
+                self.stderr.write(regressao)
+            raise CommandError(f'{len(regressoes)} regressão(ões) de desempenho.')
+        self.stdout.write(self.style.SUCCESS('Todas as views dentro do orçamento.'))
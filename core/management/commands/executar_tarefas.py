@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core.tarefas import executar_proxima, recuperar_travadas
+
+# Intervalo entre as buscas por tarefas travadas enquanto o worker roda
+INTERVALO_RECUPERACAO_SEGUNDOS = 60
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas da fila (concessão de títulos, ...).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concorrencia', type=int, default=1,
+                            help='Número de threads executando tarefas em paralelo.')
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Esvazia a fila e encerra, em vez de ficar aguardando novas tarefas.')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera quando a fila está vazia.')
+        parser.add_argument('--timeout', type=int, default=600,
+                            help='Tarefas "executando" há mais que isso (em segundos) voltam para a fila. '
+                                 'A verificação roda no início e a cada minuto.')
+
+    def handle(self, *args, **options):
+        self._timeout = options['timeout']
+        self._lock_recuperacao = threading.Lock()
+        self._proxima_recuperacao = 0
+        self._recuperar()
+
+        concorrencia = max(1, options['concorrencia'])
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            futuros = [
+                executor.submit(self._trabalhar, options['uma_vez'], options['intervalo'])
+                for _ in range(concorrencia)
+            ]
+            total = sum(f.result() for f in futuros)
+
+        self.stdout.write(self.style.SUCCESS(f'{total} tarefa(s) executada(s).'))
+
+    def _recuperar(self):
+        """Devolve à fila as tarefas de workers mortos; no máximo uma vez por minuto entre as threads."""
+        with self._lock_recuperacao:
+            agora = time.monotonic()
+            if agora < self._proxima_recuperacao:
+                return
+            self._proxima_recuperacao = agora + INTERVALO_RECUPERACAO_SEGUNDOS
+        recuperadas = recuperar_travadas(self._timeout)
+        if recuperadas:
+            self.stdout.write(self.style.WARNING(f'{recuperadas} tarefa(s) travada(s) devolvida(s) à fila.'))
+
+    def _trabalhar(self, uma_vez, intervalo):
+        executadas = 0
+        try:
+            while True:
+                close_old_connections()
+                # outro worker pode morrer com tarefas "executando" a qualquer momento
+                self._recuperar()
+                if executar_proxima():
+                    executadas += 1
+                    continue
+                if uma_vez:
+                    return executadas
+                time.sleep(intervalo)
+        finally:
+            connection.close()
@@ -0,0 +1,335 @@
+import datetime
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from cursos.analytics import agregar_estatisticas
+from cursos.models import Trilha, Modulo, ConteudoModulo, VisualizacaoConteudo, reconstruir_progresso
+from usuarios.models import (
+    Usuario, Sala, ParticipacaoSala, Missao, MensagemMissao, correcaoMissao, ChatMessage,
+    RankingSala, PontuacaoDiaria,
+)
+
+
+@contextmanager
+def datas_livres(*campos):
+    """Desliga ``auto_now_add``/``auto_now`` dos campos para gravar datas espalhadas no tempo."""
+    originais = [(campo, campo.auto_now_add, campo.auto_now) for campo in campos]
+    for campo, _, _ in originais:
+        campo.auto_now_add = False
+        campo.auto_now = False
+    try:
+        yield
+    finally:
+        for campo, auto_now_add, auto_now in originais:
+            campo.auto_now_add = auto_now_add
+            campo.auto_now = auto_now
+
+
+class Lote:
+    """Acumula objetos e grava com bulk_create a cada ``tamanho``."""
+
+    def __init__(self, modelo, tamanho):
+        self.modelo = modelo
+        self.tamanho = tamanho
+        self.pendentes = []
+        self.total = 0
+
+    def add(self, obj):
+        self.pendentes.append(obj)
+        if len(self.pendentes) >= self.tamanho:
+            self.gravar()
+
+    def gravar(self):
+        if self.pendentes:
+            self.modelo.objects.bulk_create(self.pendentes, batch_size=self.tamanho)
+            self.total += len(self.pendentes)
+            self.pendentes = []
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera um conjunto de dados sintético e determinístico (usuários, salas, missões, entregas, '
+        'correções, chat, trilhas e visualizações) para testes de carga e benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=1000, help='Total de usuários (alunos + professores).')
+        parser.add_argument('--salas', type=int, help='Total de salas. Padrão: 1 para cada 40 usuários.')
+        parser.add_argument('--missoes-por-sala', type=int, default=20)
+        parser.add_argument('--trilhas-por-sala', type=int, default=3)
+        parser.add_argument('--dias', type=int, default=180, help='Janela de tempo em que as atividades se espalham.')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador (mesma semente, mesmos dados).')
+        parser.add_argument('--lote', type=int, default=5000, help='Objetos por bulk_create.')
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['semente'])
+        self.lote = options['lote']
+        self.agora = timezone.now()
+        self.dias = options['dias']
+        inicio = time.perf_counter()
+
+        n_usuarios = options['usuarios']
+        n_salas = options['salas'] or max(1, n_usuarios // 40)
+
+        campos_data = [
+            Sala._meta.get_field('data_criacao'),
+            Missao._meta.get_field('data_criacao'),
+            MensagemMissao._meta.get_field('data_envio'),
+            correcaoMissao._meta.get_field('data_correcao'),
+            ChatMessage._meta.get_field('criado_em'),
+            VisualizacaoConteudo._meta.get_field('data_visualizacao'),
+            VisualizacaoConteudo._meta.get_field('ultima_atualizacao'),
+        ]
+        with datas_livres(*campos_data):
+            professores, alunos = self._usuarios(n_usuarios)
+            salas = self._salas(n_salas, professores)
+            membros = self._participacoes(salas, alunos)
+            missoes = self._missoes(salas, options['missoes_por_sala'])
+            self._atividades(salas, membros, missoes)
+            self._trilhas(salas, membros, options['trilhas_por_sala'])
+
+        self._derivados(membros)
+        self.stdout.write(self.style.SUCCESS(f'Concluído em {time.perf_counter() - inicio:.1f}s.'))
+
+    # ------------------------------
+    # Distribuições
+    # ------------------------------
+    def _data(self, depois_de=None):
+        """Data aleatória na janela, mais densa nos dias recentes."""
+        inicio = depois_de or self.agora - datetime.timedelta(days=self.dias)
+        janela = (self.agora - inicio).total_seconds()
+        return inicio + datetime.timedelta(seconds=janela * (1 - self.rnd.random() ** 2))
+
+    def _engajamento(self):
+        """Fração de atividade do aluno: a maioria participa pouco, poucos muito."""
+        return self.rnd.betavariate(2, 3)
+
+    def _informar(self, texto):
+        self.stdout.write(f'  {texto}')
+
+    # ------------------------------
+    # Geração
+    # ------------------------------
+    def _usuarios(self, n_usuarios):
+        # e-mails deslocados pelo que já existe: dá para rodar mais de uma vez
+        base = Usuario.objects.count()
+        n_professores = max(1, n_usuarios // 25)
+        usuarios = Usuario.objects.bulk_create(
+            [
+                Usuario(
+                    email=f'seed.{base + i}@exemplo.com',
+                    first_name=f'Usuário {base + i}',
+                    tipo_usuario='professor' if i < n_professores else 'aluno',
+                    password='!',  # senha inutilizável; defina com changepassword se precisar logar
+                )
+                for i in range(n_usuarios)
+            ],
+            batch_size=self.lote,
+        )
+        self._informar(f'{len(usuarios)} usuários ({n_professores} professores)')
+        return usuarios[:n_professores], usuarios[n_professores:]
+
+    def _salas(self, n_salas, professores):
+        base = Sala.objects.count()
+        salas = Sala.objects.bulk_create(
+            [
+                Sala(
+                    nome=f'Sala {base + i}',
+                    criador=self.rnd.choice(professores),
+                    codigo=f'SD{base + i:08d}',
+                    data_criacao=self._data(),
+                )
+                for i in range(n_salas)
+            ],
+            batch_size=self.lote,
+        )
+        self._informar(f'{len(salas)} salas')
+        return salas
+
+    def _participacoes(self, salas, alunos):
+        """
+        Cada aluno entra em 1 a 4 salas, escolhidas com peso de cauda longa
+        (algumas salas lotadas, muitas pequenas). Retorna
+        ``{sala_id: [(aluno, engajamento)]}``.
+        """
+        pesos = [self.rnd.paretovariate(1.2) for _ in salas]
+        membros = {sala.id: [] for sala in salas}
+        lote = Lote(ParticipacaoSala, self.lote)
+        for sala in salas:
+            lote.add(ParticipacaoSala(usuario_id=sala.criador_id, sala=sala, tipo_na_sala='professor'))
+        for aluno in alunos:
+            quantidade = min(len(salas), self.rnd.choices([1, 2, 3, 4], weights=[40, 35, 15, 10])[0])
+            escolhidas = set()
+            while len(escolhidas) < quantidade:
+                escolhidas.add(self.rnd.choices(range(len(salas)), weights=pesos)[0])
+            for indice in escolhidas:
+                sala = salas[indice]
+                membros[sala.id].append((aluno, self._engajamento()))
+                lote.add(ParticipacaoSala(usuario=aluno, sala=sala, tipo_na_sala='aluno'))
+        lote.gravar()
+        self._informar(f'{lote.total} participações')
+        return membros
+
+    def _missoes(self, salas, por_sala):
+        missoes = Missao.objects.bulk_create(
+            [
+                Missao(
+                    sala=sala,
+                    titulo=f'Missão {i + 1}',
+                    descricao='Missão gerada para testes de carga.',
+                    pontos=self.rnd.choice([10, 20, 50, 100]),
+                    data_criacao=self._data(sala.data_criacao),
+                )
+                for sala in salas
+                for i in range(max(1, int(por_sala * self.rnd.uniform(0.5, 1.5))))
+            ],
+            batch_size=self.lote,
+        )
+        por_sala_id = {}
+        for missao in missoes:
+            por_sala_id.setdefault(missao.sala_id, []).append(missao)
+        self._informar(f'{len(missoes)} missões')
+        return por_sala_id
+
+    def _atividades(self, salas, membros, missoes):
+        """Entregas, comentários, correções e mensagens do chat da sala."""
+        mensagens = Lote(MensagemMissao, self.lote)
+        correcoes = Lote(correcaoMissao, self.lote)
+        chat = Lote(ChatMessage, self.lote)
+        self.pontos = {}  # (aluno_id, sala_id) -> [pontos, completadas, corrigidas]
+
+        for sala in salas:
+            for aluno, engajamento in membros[sala.id]:
+                acumulado = self.pontos.setdefault((aluno.id, sala.id), [0, 0, 0])
+                for missao in missoes.get(sala.id, ()):
+                    for _ in range(int(self.rnd.expovariate(1 / (engajamento * 0.5 + 0.01)))):
+                        mensagens.add(MensagemMissao(
+                            missao=missao, usuario=aluno, tipo='comentario',
+                            texto='Dúvida sobre a missão.', data_envio=self._data(missao.data_criacao),
+                        ))
+                    if self.rnd.random() >= engajamento + 0.2:
+                        continue
+                    entrega_em = self._data(missao.data_criacao)
+                    mensagens.add(MensagemMissao(
+                        missao=missao, usuario=aluno, tipo='entrega', texto='Minha entrega.', data_envio=entrega_em,
+                    ))
+                    if self.rnd.random() < 0.85:
+                        pontos = round(missao.pontos * self.rnd.betavariate(5, 2))
+                        correcoes.add(correcaoMissao(
+                            missao=missao, aluno=aluno, professor_id=sala.criador_id,
+                            pontos_atingidos=pontos, data_correcao=self._data(entrega_em),
+                        ))
+                        acumulado[0] += pontos
+                        acumulado[1] += 1 if pontos > 0 else 0
+                        acumulado[2] += 1
+                for _ in range(int(self.rnd.expovariate(1 / (engajamento * 30 + 0.01)))):
+                    chat.add(ChatMessage(sala=sala, usuario=aluno, texto='Olá, turma!', criado_em=self._data(sala.data_criacao)))
+
+        for lote in (mensagens, correcoes, chat):
+            lote.gravar()
+        self._informar(f'{mensagens.total} mensagens de missão, {correcoes.total} correções, {chat.total} mensagens de chat')
+
+    def _trilhas(self, salas, membros, por_sala):
+        trilhas = Trilha.objects.bulk_create(
+            [
+                Trilha(sala=sala, nome=f'Trilha {i + 1}', descricao='-', ordem=i, criador_id=sala.criador_id)
+                for sala in salas
+                for i in range(self.rnd.randint(1, por_sala))
+            ],
+            batch_size=self.lote,
+        )
+        modulos = Modulo.objects.bulk_create(
+            [
+                Modulo(trilha=trilha, titulo=f'Módulo {i + 1}', ordem=i)
+                for trilha in trilhas
+                for i in range(self.rnd.randint(2, 5))
+            ],
+            batch_size=self.lote,
+        )
+        conteudos = ConteudoModulo.objects.bulk_create(
+            [
+                ConteudoModulo(
+                    modulo=modulo, titulo=f'Conteúdo {i + 1}', ordem=i,
+                    tipo=self.rnd.choice([t for t, _ in ConteudoModulo.TIPO_CHOICES]),
+                    duracao_estimada=self.rnd.randint(3, 40),
+                )
+                for modulo in modulos
+                for i in range(self.rnd.randint(3, 8))
+            ],
+            batch_size=self.lote,
+        )
+
+        # conteúdos de cada sala na ordem da trilha: o aluno avança em sequência
+        sala_da_trilha = {t.id: t.sala_id for t in trilhas}
+        sala_do_modulo = {m.id: sala_da_trilha[m.trilha_id] for m in modulos}
+        sequencia = {}
+        for conteudo in conteudos:
+            sequencia.setdefault(sala_do_modulo[conteudo.modulo_id], []).append(conteudo)
+
+        visualizacoes = Lote(VisualizacaoConteudo, self.lote)
+        for sala in salas:
+            conteudos_sala = sequencia.get(sala.id, [])
+            for aluno, engajamento in membros[sala.id]:
+                vistos = int(len(conteudos_sala) * min(1.0, engajamento * 1.5))
+                for posicao, conteudo in enumerate(conteudos_sala[:vistos]):
+                    completo = posicao < vistos - 1 or self.rnd.random() < 0.5
+                    aberto_em = self._data(sala.data_criacao)
+                    visualizacoes.add(VisualizacaoConteudo(
+                        usuario=aluno, conteudo=conteudo,
+                        completo=completo,
+                        tempo_gasto_segundos=int(conteudo.duracao_estimada * 60 * self.rnd.uniform(0.3, 1.5)),
+                        data_visualizacao=aberto_em,
+                        # a conclusão (dia usado pelas estatísticas) vem depois da abertura
+                        ultima_atualizacao=self._data(aberto_em) if completo else aberto_em,
+                    ))
+        visualizacoes.gravar()
+        self._informar(
+            f'{len(trilhas)} trilhas, {len(modulos)} módulos, {len(conteudos)} conteúdos, '
+            f'{visualizacoes.total} visualizações'
+        )
+
+    def _derivados(self, membros):
+        """Contadores, ranking materializado e baldes diários coerentes com as correções."""
+        por_aluno = {}
+        for (aluno_id, _), (pontos, completadas, _) in self.pontos.items():
+            total = por_aluno.setdefault(aluno_id, [0, 0])
+            total[0] += pontos
+            total[1] += completadas
+
+        with transaction.atomic():
+            alunos = {aluno.id: aluno for lista in membros.values() for aluno, _ in lista}
+            for aluno_id, (pontos, completadas) in por_aluno.items():
+                alunos[aluno_id].pontos_totais = pontos
+                alunos[aluno_id].missoes_completadas = completadas
+            Usuario.objects.bulk_update(alunos.values(), ['pontos_totais', 'missoes_completadas'], batch_size=1000)
+
+            participacoes = ParticipacaoSala.objects.filter(
+                usuario_id__in=list(alunos), tipo_na_sala='aluno'
+            ).only('id', 'usuario_id', 'sala_id')
+            atualizar = []
+            ranking = Lote(RankingSala, self.lote)
+            for participacao in participacoes.iterator():
+                pontos, completadas, corrigidas = self.pontos.get((participacao.usuario_id, participacao.sala_id), (0, 0, 0))
+                participacao.pontos_na_sala = pontos
+                participacao.missoes_na_sala = completadas
+                atualizar.append(participacao)
+                ranking.add(RankingSala(
+                    sala_id=participacao.sala_id, aluno_id=participacao.usuario_id,
+                    pontos=pontos, missoes_corrigidas=corrigidas,
+                ))
+            ParticipacaoSala.objects.bulk_update(atualizar, ['pontos_na_sala', 'missoes_na_sala'], batch_size=1000)
+            ranking.gravar()
+
+        baldes = PontuacaoDiaria.reconstruir()
+        progressos = reconstruir_progresso()
+        estatisticas_conteudo, estatisticas_modulo = agregar_estatisticas()
+        self._informar(
+            f'contadores atualizados, {ranking.total} linhas de ranking, {baldes} baldes diários, '
+            f'{progressos} linhas de progresso, '
+            f'{estatisticas_conteudo + estatisticas_modulo} estatísticas diárias de conteúdo'
+        )
@@ -0,0 +1,123 @@
+# core/middleware.py
+"""
+Perfilamento por requisição (opcional).
+
+Ligado com ``PERFILAMENTO=True`` no ambiente. Para cada requisição mede o
+tempo total, o tempo e o número de consultas SQL e conta as consultas com
+o mesmo formato (mesmo SQL, parâmetros diferentes) — a assinatura de um
+N+1. O resultado sai no cabeçalho ``Server-Timing`` (visível na aba Rede
+do navegador) e em uma linha de log JSON no logger ``core.perfilamento``.
+
+Com ``PERFILAMENTO_AMOSTRAGEM`` > 0, essa fração das requisições roda sob
+o cProfile; as que passarem de ``PERFILAMENTO_LENTO_MS`` têm as
+estatísticas gravadas em ``PERFILAMENTO_DIR`` (abra com ``python -m pstats``
+ou snakeviz).
+
+As consultas são contadas com ``connection.execute_wrapper``, que funciona
+com ``DEBUG=False`` e não guarda o histórico de consultas na memória.
+Desligado, o middleware se remove da pilha no startup (``MiddlewareNotUsed``).
+"""
+import cProfile
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('core.perfilamento')
+
+# listas "IN (%s, %s, ...)" de tamanhos diferentes contam como o mesmo formato
+_LISTA_PARAMETROS = re.compile(r'\((?:%s, )+%s\)')
+
+
+def formato_consulta(sql):
+    return _LISTA_PARAMETROS.sub('(%s, ...)', sql)
+
+
+class ColetorConsultas:
+    """``execute_wrapper`` que acumula tempo e formatos das consultas."""
+
+    def __init__(self):
+        self.total = 0
+        self.tempo_ms = 0.0
+        self.formatos = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_ms += (time.perf_counter() - inicio) * 1000
+            self.total += 1
+            self.formatos[formato_consulta(sql)] += 1
+
+    def duplicadas(self, minimo=2):
+        """Formatos executados ``minimo`` vezes ou mais, do mais repetido ao menos."""
+        return [(sql, n) for sql, n in self.formatos.most_common() if n >= minimo]
+
+
+class PerfilamentoMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILAMENTO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.amostragem = getattr(settings, 'PERFILAMENTO_AMOSTRAGEM', 0.0)
+        self.lento_ms = getattr(settings, 'PERFILAMENTO_LENTO_MS', 500)
+        self.repeticoes_n1 = getattr(settings, 'PERFILAMENTO_REPETICOES_N1', 5)
+        self.diretorio = Path(getattr(settings, 'PERFILAMENTO_DIR', settings.BASE_DIR / 'perfis'))
+
+    def __call__(self, request):
+        coletor = ColetorConsultas()
+        perfil = cProfile.Profile() if self.amostragem and random.random() < self.amostragem else None
+
+        inicio = time.perf_counter()
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(coletor))
+            if perfil:
+                perfil.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if perfil:
+                    perfil.disable()
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        duplicadas = coletor.duplicadas()
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'sql;dur={coletor.tempo_ms:.1f};desc="{coletor.total} consultas"',
+            f'dup;desc="{sum(n - 1 for _, n in duplicadas)} repetidas"',
+        ])
+
+        arquivo_perfil = None
+        if perfil and total_ms >= self.lento_ms:
+            arquivo_perfil = self._gravar_perfil(perfil, request)
+
+        n1 = duplicadas and duplicadas[0][1] >= self.repeticoes_n1
+        logger.log(logging.WARNING if n1 else logging.INFO, json.dumps({
+            'metodo': request.method,
+            'caminho': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'sql_ms': round(coletor.tempo_ms, 1),
+            'consultas': coletor.total,
+            'duplicadas': [{'sql': sql[:200], 'vezes': n} for sql, n in duplicadas[:5]],
+            'perfil': str(arquivo_perfil) if arquivo_perfil else None,
+        }, ensure_ascii=False))
+        return response
+
+    def _gravar_perfil(self, perfil, request):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        caminho = re.sub(r'[^\w-]+', '_', request.path).strip('_') or 'raiz'
+        arquivo = self.diretorio / f'{timezone.now():%Y%m%d-%H%M%S-%f}-{request.method}-{caminho[:80]}.prof'
+        perfil.dump_stats(arquivo)
+        return arquivo
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Tarefa')),
+                ('argumentos', models.JSONField(blank=True, default=dict)),
+                ('chave', models.CharField(blank=True, help_text='Só pode existir uma tarefa pendente por chave', max_length=200, null=True, verbose_name='Chave de Idempotência')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=10)),
+                ('tentativas', models.IntegerField(default=0)),
+                ('max_tentativas', models.IntegerField(default=3)),
+                ('executar_apos', models.DateTimeField(verbose_name='Executar Após')),
+                ('erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'ordering': ['executar_apos', 'id'],
+                'indexes': [models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pendente')), fields=('chave',), name='tarefa_chave_pendente_unica')],
+            },
+        ),
+    ]
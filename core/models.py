@@ -0,0 +1,56 @@
+# core/models.py
+from django.db import models
+
+
+# ==============================
+# FILA DE TAREFAS EM SEGUNDO PLANO
+# ==============================
+class Tarefa(models.Model):
+    """
+    Trabalho pesado enfileirado pelas views e signals (concessão de
+    títulos) e executado pelo ``manage.py executar_tarefas``.
+    Usa apenas o banco de dados já existente.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    nome = models.CharField(max_length=100, verbose_name="Tarefa")
+    argumentos = models.JSONField(default=dict, blank=True)
+    chave = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        verbose_name="Chave de Idempotência",
+        help_text="Só pode existir uma tarefa pendente por chave"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.IntegerField(default=0)
+    max_tentativas = models.IntegerField(default=3)
+    executar_apos = models.DateTimeField(verbose_name="Executar Após")
+    erro = models.TextField(blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['executar_apos', 'id']
+        indexes = [
+            models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['chave'],
+                condition=models.Q(status='pendente'),
+                name='tarefa_chave_pendente_unica',
+            ),
+        ]
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+
+    def __str__(self):
+        return f"{self.nome} #{self.id} ({self.get_status_display()})"
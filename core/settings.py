@@ -40,6 +40,8 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     # Whitenoise DEVE vir logo depois do SecurityMiddleware
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Perfilamento por requisição; só fica ativo com PERFILAMENTO=True
+    'core.middleware.PerfilamentoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -105,4 +107,23 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Seu modelo de usuário customizado
-AUTH_USER_MODEL = 'usuarios.Usuario'
\ No newline at end of file
+AUTH_USER_MODEL = 'usuarios.Usuario'
+# Perfilamento por requisição (core/middleware.py): Server-Timing + log JSON.
+# PERFILAMENTO_AMOSTRAGEM é a fração das requisições que roda sob o cProfile.
+PERFILAMENTO = config('PERFILAMENTO', default=False, cast=bool)
+PERFILAMENTO_AMOSTRAGEM = config('PERFILAMENTO_AMOSTRAGEM', default=0.0, cast=float)
+PERFILAMENTO_LENTO_MS = config('PERFILAMENTO_LENTO_MS', default=500, cast=int)
+PERFILAMENTO_DIR = BASE_DIR / 'perfis'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.perfilamento': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        # títulos concedidos pelas tarefas do worker
+        'usuarios.tarefas': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,161 @@
+# core/tarefas.py
+"""
+API da fila de tarefas.
+
+Registrar uma função como tarefa (em ``<app>/tarefas.py``, descoberto
+automaticamente no startup):
+
+    @tarefa('usuarios.conceder_titulo_retroativo')
+    def conceder_titulo_retroativo(titulo_id):
+        ...
+
+Enfileirar a partir de uma view ou signal:
+
+    enfileirar('usuarios.conceder_titulo_retroativo', chave=f'titulo-retroativo:{titulo.id}', titulo_id=titulo.id)
+
+A inserção participa da transação corrente: se ela sofrer rollback, a
+tarefa também desaparece. As tarefas são executadas pelo comando
+``manage.py executar_tarefas``.
+"""
+import datetime
+import logging
+import traceback
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+_registro = {}
+
+
+def tarefa(nome):
+    """Decorator que registra a função como executora da tarefa ``nome``."""
+    def decorator(func):
+        _registro[nome] = func
+        return func
+    return decorator
+
+
+def tarefas_registradas():
+    return dict(_registro)
+
+
+def enfileirar(nome, chave=None, max_tentativas=3, atraso_segundos=0, **argumentos):
+    """
+    Cria uma tarefa pendente e retorna-a.
+
+    Com ``chave``, uma tarefa pendente com a mesma chave é reaproveitada
+    em vez de duplicada (a execução recalcula tudo do banco de qualquer jeito).
+    """
+    if nome not in _registro:
+        raise ValueError(f'Tarefa não registrada: {nome}')
+
+    dados = {
+        'nome': nome,
+        'argumentos': argumentos,
+        'chave': chave,
+        'max_tentativas': max_tentativas,
+        'executar_apos': timezone.now() + datetime.timedelta(seconds=atraso_segundos),
+    }
+    if chave is None:
+        return Tarefa.objects.create(**dados)
+
+    existente = Tarefa.objects.filter(chave=chave, status='pendente').first()
+    if existente is not None:
+        return existente
+    try:
+        with transaction.atomic():
+            return Tarefa.objects.create(**dados)
+    except IntegrityError:
+        # outra requisição enfileirou a mesma chave ao mesmo tempo
+        return Tarefa.objects.get(chave=chave, status='pendente')
+
+
+def _reservar():
+    """Marca a próxima tarefa disponível como 'executando' e retorna-a (ou None).
+
+    A reserva é um UPDATE condicional, seguro entre threads e processos
+    em qualquer banco.
+    """
+    agora = timezone.now()
+    candidatas = Tarefa.objects.filter(status='pendente', executar_apos__lte=agora).values_list('id', flat=True)[:10]
+    for tarefa_id in candidatas:
+        reservada = Tarefa.objects.filter(id=tarefa_id, status='pendente').update(
+            status='executando',
+            iniciado_em=agora,
+            tentativas=F('tentativas') + 1,
+        )
+        if reservada:
+            return Tarefa.objects.get(id=tarefa_id)
+    return None
+
+
+def executar(tarefa_obj, backoff_segundos=30):
+    """Executa uma tarefa já reservada, registrando sucesso, nova tentativa ou falha."""
+    func = _registro.get(tarefa_obj.nome)
+    try:
+        if func is None:
+            raise LookupError(f'Tarefa não registrada: {tarefa_obj.nome}')
+        func(**tarefa_obj.argumentos)
+    except Exception:
+        erro = traceback.format_exc()
+        logger.exception('Tarefa %s #%s falhou (tentativa %s)', tarefa_obj.nome, tarefa_obj.id, tarefa_obj.tentativas)
+        if tarefa_obj.tentativas < tarefa_obj.max_tentativas:
+            atraso = backoff_segundos * (2 ** (tarefa_obj.tentativas - 1))
+            _finalizar(tarefa_obj, 'pendente', erro,
+                       executar_apos=timezone.now() + datetime.timedelta(seconds=atraso))
+        else:
+            _finalizar(tarefa_obj, 'falhou', erro, concluido_em=timezone.now())
+        return False
+
+    _finalizar(tarefa_obj, 'concluida', '', concluido_em=timezone.now())
+    return True
+
+
+def _finalizar(tarefa_obj, status, erro, **campos):
+    try:
+        with transaction.atomic():
+            Tarefa.objects.filter(id=tarefa_obj.id).update(status=status, erro=erro, **campos)
+    except IntegrityError:
+        # voltar para 'pendente' colidiu com uma nova tarefa da mesma chave,
+        # que já fará o mesmo trabalho
+        Tarefa.objects.filter(id=tarefa_obj.id).update(
+            status='concluida', erro=erro, concluido_em=timezone.now()
+        )
+
+
+def executar_proxima(backoff_segundos=30):
+    """Reserva e executa uma tarefa. Retorna False se a fila estiver vazia."""
+    tarefa_obj = _reservar()
+    if tarefa_obj is None:
+        return False
+    executar(tarefa_obj, backoff_segundos)
+    return True
+
+
+def executar_pendentes(limite=None):
+    """Executa as tarefas disponíveis até esvaziar a fila (ou atingir ``limite``)."""
+    executadas = 0
+    while limite is None or executadas < limite:
+        if not executar_proxima():
+            break
+        executadas += 1
+    return executadas
+
+
+def recuperar_travadas(timeout_segundos):
+    """Devolve à fila tarefas 'executando' há mais de ``timeout_segundos`` (worker morto)."""
+    limite = timezone.now() - datetime.timedelta(seconds=timeout_segundos)
+    travadas = Tarefa.objects.filter(status='executando', iniciado_em__lt=limite)
+    recuperadas = 0
+    for tarefa_obj in travadas:
+        if tarefa_obj.tentativas >= tarefa_obj.max_tentativas:
+            _finalizar(tarefa_obj, 'falhou', 'Tempo limite excedido', concluido_em=timezone.now())
+        else:
+            _finalizar(tarefa_obj, 'pendente', 'Tempo limite excedido')
+        recuperadas += 1
+    return recuperadas
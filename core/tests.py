@@ -0,0 +1,119 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from benchmarks.medicao import comparar
+from cursos.models import VisualizacaoConteudo, EstatisticaConteudoDiaria, divergencias_progresso
+from usuarios.models import (
+    Sala, ParticipacaoSala, Missao, ChatMessage, correcaoMissao, RankingSala, divergencias_contadores,
+)
+from . import contagem
+from .middleware import ColetorConsultas
+
+
+class SeedPlatformTests(TestCase):
+    def test_gera_dados_coerentes(self):
+        call_command('seed_platform', usuarios=80, missoes_por_sala=5, stdout=StringIO())
+
+        self.assertEqual(get_user_model().objects.count(), 80)
+        self.assertTrue(correcaoMissao.objects.exists())
+        self.assertTrue(ChatMessage.objects.exists())
+        self.assertEqual(divergencias_contadores(), [])
+        for sala in Sala.objects.all():
+            self.assertEqual(RankingSala.divergencias(sala), [])
+        self.assertEqual(divergencias_progresso(), [])
+
+    def test_conclusoes_espalhadas_no_tempo(self):
+        call_command('seed_platform', usuarios=80, missoes_por_sala=2, stdout=StringIO())
+        completas = VisualizacaoConteudo.objects.filter(completo=True)
+        self.assertFalse(completas.filter(ultima_atualizacao__lt=F('data_visualizacao')).exists())
+        dias = {timezone.localdate(data) for data in completas.values_list('ultima_atualizacao', flat=True)}
+        self.assertGreater(len(dias), 1)
+        dias_com_conclusao = EstatisticaConteudoDiaria.objects.filter(conclusoes__gt=0).values('dia').distinct()
+        self.assertGreater(dias_com_conclusao.count(), 1)
+
+
+class BenchmarkViewsTests(TestCase):
+    def test_grava_e_compara_baseline(self):
+        call_command('seed_platform', usuarios=40, missoes_por_sala=3, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = Path(pasta) / 'baseline.json'
+            call_command('benchmark_views', repeticoes=2, cenarios=['principal', 'chat_missao'],
+                         baseline=str(caminho), gravar_baseline=True, stdout=StringIO())
+            baseline = json.loads(caminho.read_text(encoding='utf-8'))['cenarios']
+
+        self.assertEqual(set(baseline), {'principal', 'chat_missao'})
+        self.assertEqual(baseline['principal']['status'], 200)
+
+        pior = dict(baseline['chat_missao'], consultas=baseline['chat_missao']['consultas'] + 5, status=500)
+        regressoes = comparar({'chat_missao': pior}, baseline, tolerancia=0.5)
+        self.assertEqual(len(regressoes), 2)
+        self.assertEqual(comparar(baseline, baseline, tolerancia=0.5), [])
+
+        # latência só entra no orçamento com latencia=True
+        lenta = {'principal': dict(baseline['principal'], p50_ms=baseline['principal']['p50_ms'] * 3 + 1)}
+        self.assertEqual(comparar(lenta, baseline, tolerancia=0.5), [])
+        self.assertEqual(len(comparar(lenta, baseline, tolerancia=0.5, latencia=True)), 1)
+
+
+class PerfilamentoMiddlewareTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.sala = Sala.objects.create(nome='Sala Teste', criador=self.professor)
+        ParticipacaoSala.objects.create(usuario=self.professor, sala=self.sala, tipo_na_sala='professor')
+        self.missoes = [Missao.objects.create(sala=self.sala, titulo=f'M{i}', descricao='d', pontos=10) for i in range(6)]
+
+    def test_desligado_nao_adiciona_cabecalho(self):
+        self.client.force_login(self.professor)
+        response = self.client.get(reverse('usuarios:pag_principal'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(PERFILAMENTO=True)
+    def test_server_timing_e_log_com_consultas_repetidas(self):
+        self.client.force_login(self.professor)
+        with self.assertLogs('core.perfilamento', 'INFO') as logs:
+            response = self.client.get(reverse('usuarios:pag_principal'))
+
+        cabecalho = response['Server-Timing']
+        self.assertIn('total;dur=', cabecalho)
+        self.assertRegex(cabecalho, r'sql;dur=[\d.]+;desc="\d+ consultas"')
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['caminho'], reverse('usuarios:pag_principal'))
+        self.assertGreater(registro['consultas'], 0)
+
+        coletor = ColetorConsultas()
+        with connection.execute_wrapper(coletor):
+            for missao in self.missoes:
+                list(Missao.objects.filter(pk=missao.pk))
+            list(Missao.objects.filter(pk__in=[1, 2]))
+            list(Missao.objects.filter(pk__in=[1, 2, 3]))
+        self.assertEqual([n for _, n in coletor.duplicadas()], [6, 2])
+
+
+class ContagemEstimadaTests(TestCase):
+    def setUp(self):
+        professor = get_user_model().objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.salas = [Sala.objects.create(nome=f'Sala {i}', criador=professor) for i in range(2)]
+        for i in range(6):
+            ChatMessage.objects.create(sala=self.salas[i % 2], usuario=professor, texto=f'm{i}')
+
+    def test_paginador_estimado_so_sem_filtros_em_tabela_grande(self):
+        total = ChatMessage.objects.count()
+        with mock.patch.object(contagem, 'contagem_estimada', return_value=1_000_000):
+            self.assertEqual(contagem.PaginadorEstimado(ChatMessage.objects.all(), 10).count, 1_000_000)
+            filtrada = ChatMessage.objects.filter(sala=self.salas[0])
+            self.assertEqual(contagem.PaginadorEstimado(filtrada, 10).count, filtrada.count())
+        with mock.patch.object(contagem, 'contagem_estimada', return_value=50):
+            self.assertEqual(contagem.PaginadorEstimado(ChatMessage.objects.all(), 10).count, total)
+        # SQLite não estima
+        self.assertIsNone(contagem.contagem_estimada(ChatMessage))
@@ -4,9 +4,13 @@ from django.contrib import admin
 
 # cursos/admin.py
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from core.contagem import ContagemEstimadaAdmin
 from .models import (
-    Aula, Progresso,  # Antigos
-    Trilha, Modulo, ConteudoModulo, VisualizacaoConteudo  # Novos
+    Aula,  # Antigo
+    Trilha, Modulo, ConteudoModulo, VisualizacaoConteudo,  # Novos
+    EstatisticaConteudoDiaria, EstatisticaModuloDiaria,
 )
 
 # ==============================
@@ -18,13 +22,7 @@ class AulaAdmin(admin.ModelAdmin):
     list_filter = ('sala',)
     search_fields = ('titulo', 'sala__nome')
     readonly_fields = ('criado_em',)
-
-
-@admin.register(Progresso)
-class ProgressoAdmin(admin.ModelAdmin):
-    list_display = ('aluno', 'sala', 'percentual')
-    list_filter = ('sala',)
-    search_fields = ('aluno__email', 'sala__nome')
+    list_select_related = ('sala',)
 
 
 # ==============================
@@ -44,6 +42,7 @@ class TrilhaAdmin(admin.ModelAdmin):
     list_filter = ('sala', 'criado_em')
     search_fields = ('nome', 'sala__nome', 'descricao')
     readonly_fields = ('criado_em', 'atualizado_em')
+    list_select_related = ('sala',)
     
     fieldsets = (
         ('Informações Básicas', {
@@ -62,9 +61,10 @@ class TrilhaAdmin(admin.ModelAdmin):
     inlines = [ModuloInline]
     
     def total_conteudos(self, obj):
-        """Mostra o total de conteúdos na trilha"""
-        return obj.total_conteudos()
+        """Mostra o total de conteúdos na trilha (contador armazenado)"""
+        return obj.qtd_conteudos
     total_conteudos.short_description = 'Total de Conteúdos'
+    total_conteudos.admin_order_field = 'qtd_conteudos'
 
 
 class ConteudoModuloInline(admin.TabularInline):
@@ -80,6 +80,7 @@ class ModuloAdmin(admin.ModelAdmin):
     list_filter = ('trilha__sala', 'trilha')
     search_fields = ('titulo', 'trilha__nome', 'descricao')
     readonly_fields = ('criado_em',)
+    list_select_related = ('trilha__sala',)
     
     fieldsets = (
         ('Informações Básicas', {
@@ -95,9 +96,10 @@ class ModuloAdmin(admin.ModelAdmin):
     inlines = [ConteudoModuloInline]
     
     def total_conteudos(self, obj):
-        """Mostra o total de conteúdos no módulo"""
-        return obj.total_conteudos()
+        """Mostra o total de conteúdos no módulo (contador armazenado)"""
+        return obj.qtd_conteudos
     total_conteudos.short_description = 'Conteúdos'
+    total_conteudos.admin_order_field = 'qtd_conteudos'
 
 
 @admin.register(ConteudoModulo)
@@ -106,6 +108,7 @@ class ConteudoModuloAdmin(admin.ModelAdmin):
     list_filter = ('tipo', 'modulo__trilha__sala', 'modulo__trilha', 'modulo')
     search_fields = ('titulo', 'modulo__titulo', 'conteudo')
     readonly_fields = ('criado_em', 'atualizado_em', 'total_visualizacoes', 'total_completos')
+    list_select_related = ('modulo__trilha__sala',)
     
     fieldsets = (
         ('Informações Básicas', {
@@ -125,23 +128,42 @@ class ConteudoModuloAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Contagens como subconsultas correlacionadas: calculadas só para as
+        # linhas da página, pelo índice (usuario, conteudo), em vez de um
+        # GROUP BY sobre todas as visualizações
+        visualizacoes = VisualizacaoConteudo.objects.filter(conteudo=OuterRef('pk')).order_by()
+        return super().get_queryset(request).annotate(
+            num_visualizacoes=self._contagem(visualizacoes),
+            num_completos=self._contagem(visualizacoes.filter(completo=True)),
+        )
+    
+    @staticmethod
+    def _contagem(consulta):
+        contagem = consulta.values('conteudo').annotate(n=Count('id')).values('n')
+        return Coalesce(Subquery(contagem, output_field=IntegerField()), Value(0))
+    
     def total_visualizacoes(self, obj):
         """Mostra quantos usuários visualizaram"""
-        return VisualizacaoConteudo.objects.filter(conteudo=obj).count()
+        return obj.num_visualizacoes
     total_visualizacoes.short_description = 'Visualizações'
+    total_visualizacoes.admin_order_field = 'num_visualizacoes'
     
     def total_completos(self, obj):
         """Mostra quantos usuários completaram"""
-        return VisualizacaoConteudo.objects.filter(conteudo=obj, completo=True).count()
+        return obj.num_completos
     total_completos.short_description = 'Completados'
+    total_completos.admin_order_field = 'num_completos'
 
 
 @admin.register(VisualizacaoConteudo)
-class VisualizacaoConteudoAdmin(admin.ModelAdmin):
+class VisualizacaoConteudoAdmin(ContagemEstimadaAdmin, admin.ModelAdmin):
     list_display = ('usuario', 'conteudo', 'completo', 'data_visualizacao', 'tempo_gasto_formatado')
     list_filter = ('completo', 'conteudo__modulo__trilha__sala', 'conteudo__tipo')
     search_fields = ('usuario__email', 'usuario__first_name', 'usuario__last_name', 'conteudo__titulo')
     readonly_fields = ('data_visualizacao', 'ultima_atualizacao')
+    list_select_related = ('usuario', 'conteudo')
+    raw_id_fields = ('usuario', 'conteudo')
     date_hierarchy = 'data_visualizacao'
     
     fieldsets = (
@@ -153,6 +175,16 @@ class VisualizacaoConteudoAdmin(admin.ModelAdmin):
         }),
     )
     
+    def save_model(self, request, obj, form, change):
+        """Troca de ``completo`` passa por marcar_completo para manter o progresso armazenado."""
+        if change and 'completo' in form.changed_data:
+            completo = obj.completo
+            obj.completo = not completo
+            super().save_model(request, obj, form, change)
+            obj.marcar_completo(completo)
+        else:
+            super().save_model(request, obj, form, change)
+    
     def tempo_gasto_formatado(self, obj):
         """Formata o tempo gasto em formato legível"""
         if obj.tempo_gasto_segundos == 0:
@@ -160,4 +192,29 @@ class VisualizacaoConteudoAdmin(admin.ModelAdmin):
         minutos = obj.tempo_gasto_segundos // 60
         segundos = obj.tempo_gasto_segundos % 60
         return f"{minutos}m {segundos}s"
-    tempo_gasto_formatado.short_description = 'Tempo Gasto'
\ No newline at end of file
+    tempo_gasto_formatado.short_description = 'Tempo Gasto'
+
+
+# ==============================
+# ESTATÍSTICAS DIÁRIAS (geradas por manage.py agregar_analytics)
+# ==============================
+@admin.register(EstatisticaConteudoDiaria)
+class EstatisticaConteudoDiariaAdmin(admin.ModelAdmin):
+    list_display = ('conteudo', 'dia', 'visualizacoes', 'conclusoes', 'tempo_mediano_segundos')
+    list_filter = ('conteudo__modulo__trilha__sala', 'conteudo__modulo__trilha')
+    search_fields = ('conteudo__titulo',)
+    date_hierarchy = 'dia'
+    list_select_related = ('conteudo',)
+    readonly_fields = ('conteudo', 'dia', 'visualizacoes', 'conclusoes', 'tempo_mediano_segundos')
+
+
+@admin.register(EstatisticaModuloDiaria)
+class EstatisticaModuloDiariaAdmin(admin.ModelAdmin):
+    list_display = ('modulo', 'dia', 'alunos_ativos', 'visualizacoes', 'conclusoes',
+                    'tempo_mediano_segundos', 'abandonos', 'abandono_conteudo')
+    list_filter = ('modulo__trilha__sala', 'modulo__trilha')
+    search_fields = ('modulo__titulo',)
+    date_hierarchy = 'dia'
+    list_select_related = ('modulo__trilha', 'abandono_conteudo')
+    readonly_fields = ('modulo', 'dia', 'visualizacoes', 'conclusoes', 'alunos_ativos',
+                       'tempo_mediano_segundos', 'abandonos', 'abandono_conteudo')
@@ -0,0 +1,216 @@
+# cursos/analytics.py
+"""
+Estatísticas de conteúdo para o professor.
+
+``agregar_estatisticas`` resume ``VisualizacaoConteudo`` por dia em
+``EstatisticaConteudoDiaria`` e ``EstatisticaModuloDiaria``: visualizações
+(primeira abertura no dia), conclusões (marcadas no dia), mediana do tempo
+gasto e o ponto de abandono de cada módulo. Roda periodicamente com
+``manage.py agregar_analytics`` — incremental, refaz só do último dia
+agregado em diante, então os dias anteriores ficam congelados como
+estavam na última execução.
+
+``relatorio_trilha`` soma os resumos de um período para a página da
+trilha; nunca lê as visualizações brutas.
+"""
+import datetime
+import statistics
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    ConteudoModulo, VisualizacaoConteudo, EstatisticaConteudoDiaria, EstatisticaModuloDiaria,
+)
+
+RELATORIO_DIAS = getattr(settings, 'ANALYTICS_RELATORIO_DIAS', 30)
+
+
+def formatar_tempo(segundos):
+    if not segundos:
+        return '-'
+    return f"{segundos // 60}m {segundos % 60}s"
+
+
+def _mediana(valores):
+    return round(statistics.median(valores)) if valores else 0
+
+
+def _mediana_ponderada(pares):
+    """Mediana de ``(valor, peso)``: aproxima a mediana do período a partir das medianas diárias."""
+    pares = sorted((valor, peso) for valor, peso in pares if peso > 0)
+    metade = sum(peso for _, peso in pares) / 2
+    acumulado = 0
+    for valor, peso in pares:
+        acumulado += peso
+        if acumulado >= metade:
+            return valor
+    return 0
+
+
+def _novo_dia_conteudo():
+    return {'visualizacoes': 0, 'conclusoes': 0, 'tempos': []}
+
+
+def _novo_dia_modulo():
+    return {'visualizacoes': 0, 'conclusoes': 0, 'alunos': set(), 'tempo_por_aluno': defaultdict(int)}
+
+
+def _pontos_de_abandono(modulos):
+    """
+    Para cada (módulo, dia), quantos alunos ativos no dia ainda não
+    concluíram o módulo e o conteúdo mais avançado em que a maioria deles
+    parou (empate: o primeiro do módulo). Usa o estado atual das visualizações.
+    """
+    modulo_ids = {modulo_id for modulo_id, _ in modulos}
+    posicoes = {}
+    totais = Counter()
+    for conteudo_id, modulo_id in (
+        ConteudoModulo.objects.filter(modulo_id__in=modulo_ids)
+        .order_by('modulo_id', 'ordem', 'id').values_list('id', 'modulo_id')
+    ):
+        posicoes[conteudo_id] = totais[modulo_id]
+        totais[modulo_id] += 1
+
+    mais_avancado = {}
+    completos = Counter()
+    for usuario_id, conteudo_id, modulo_id, completo in (
+        VisualizacaoConteudo.objects.filter(conteudo__modulo_id__in=modulo_ids)
+        .order_by().values_list('usuario_id', 'conteudo_id', 'conteudo__modulo_id', 'completo')
+        .iterator()
+    ):
+        chave = (usuario_id, modulo_id)
+        atual = mais_avancado.get(chave)
+        if atual is None or posicoes[conteudo_id] > posicoes[atual]:
+            mais_avancado[chave] = conteudo_id
+        if completo:
+            completos[chave] += 1
+
+    resultado = {}
+    for (modulo_id, dia), dados in modulos.items():
+        parados = Counter(
+            mais_avancado[(usuario_id, modulo_id)]
+            for usuario_id in dados['alunos']
+            if completos[(usuario_id, modulo_id)] < totais[modulo_id]
+        )
+        if parados:
+            conteudo_id = min(parados, key=lambda c: (-parados[c], posicoes[c]))
+            resultado[(modulo_id, dia)] = (sum(parados.values()), conteudo_id)
+    return resultado
+
+
+def agregar_estatisticas(desde=None):
+    """
+    Recalcula as estatísticas diárias a partir de ``desde`` (inclusive);
+    sem data, todo o histórico. Retorna (linhas de conteúdo, linhas de módulo).
+    """
+    visualizacoes = VisualizacaoConteudo.objects.all()
+    linhas_conteudo = EstatisticaConteudoDiaria.objects.all()
+    linhas_modulo = EstatisticaModuloDiaria.objects.all()
+    if desde is not None:
+        inicio = timezone.make_aware(datetime.datetime.combine(desde, datetime.time.min))
+        visualizacoes = visualizacoes.filter(
+            Q(data_visualizacao__gte=inicio) | Q(completo=True, ultima_atualizacao__gte=inicio)
+        )
+        linhas_conteudo = linhas_conteudo.filter(dia__gte=desde)
+        linhas_modulo = linhas_modulo.filter(dia__gte=desde)
+
+    conteudos = defaultdict(_novo_dia_conteudo)
+    modulos = defaultdict(_novo_dia_modulo)
+    for usuario_id, conteudo_id, modulo_id, aberto_em, atualizado_em, completo, tempo in (
+        visualizacoes.order_by().values_list(
+            'usuario_id', 'conteudo_id', 'conteudo__modulo_id',
+            'data_visualizacao', 'ultima_atualizacao', 'completo', 'tempo_gasto_segundos',
+        ).iterator()
+    ):
+        dia = timezone.localdate(aberto_em)
+        if desde is None or dia >= desde:
+            conteudo = conteudos[(conteudo_id, dia)]
+            conteudo['visualizacoes'] += 1
+            if tempo:
+                conteudo['tempos'].append(tempo)
+            modulo = modulos[(modulo_id, dia)]
+            modulo['visualizacoes'] += 1
+            modulo['alunos'].add(usuario_id)
+            modulo['tempo_por_aluno'][usuario_id] += tempo
+
+        if completo:
+            dia = timezone.localdate(atualizado_em)
+            if desde is None or dia >= desde:
+                conteudos[(conteudo_id, dia)]['conclusoes'] += 1
+                modulo = modulos[(modulo_id, dia)]
+                modulo['conclusoes'] += 1
+                modulo['alunos'].add(usuario_id)
+
+    abandonos = _pontos_de_abandono(modulos)
+
+    with transaction.atomic():
+        linhas_conteudo.delete()
+        linhas_modulo.delete()
+        criadas_conteudo = EstatisticaConteudoDiaria.objects.bulk_create(
+            (
+                EstatisticaConteudoDiaria(
+                    conteudo_id=conteudo_id,
+                    dia=dia,
+                    visualizacoes=dados['visualizacoes'],
+                    conclusoes=dados['conclusoes'],
+                    tempo_mediano_segundos=_mediana(dados['tempos']),
+                )
+                for (conteudo_id, dia), dados in conteudos.items()
+            ),
+            batch_size=1000,
+        )
+        criadas_modulo = EstatisticaModuloDiaria.objects.bulk_create(
+            (
+                EstatisticaModuloDiaria(
+                    modulo_id=modulo_id,
+                    dia=dia,
+                    visualizacoes=dados['visualizacoes'],
+                    conclusoes=dados['conclusoes'],
+                    alunos_ativos=len(dados['alunos']),
+                    tempo_mediano_segundos=_mediana([t for t in dados['tempo_por_aluno'].values() if t]),
+                    abandonos=abandonos.get((modulo_id, dia), (0, None))[0],
+                    abandono_conteudo_id=abandonos.get((modulo_id, dia), (0, None))[1],
+                )
+                for (modulo_id, dia), dados in modulos.items()
+            ),
+            batch_size=1000,
+        )
+    return len(criadas_conteudo), len(criadas_modulo)
+
+
+def relatorio_trilha(trilha, dias=RELATORIO_DIAS):
+    """
+    Totais dos últimos ``dias`` da trilha, em duas consultas às tabelas de
+    resumo: ``{'desde', 'modulos': {modulo_id: {...}}, 'conteudos': {conteudo_id: {...}}}``.
+    O tempo mediano do período é a mediana das medianas diárias, ponderada
+    pelo movimento de cada dia.
+    """
+    desde = timezone.localdate() - datetime.timedelta(days=dias - 1)
+
+    conteudos = defaultdict(lambda: {'visualizacoes': 0, 'conclusoes': 0, 'tempos': []})
+    for linha in EstatisticaConteudoDiaria.objects.filter(conteudo__modulo__trilha=trilha, dia__gte=desde):
+        dados = conteudos[linha.conteudo_id]
+        dados['visualizacoes'] += linha.visualizacoes
+        dados['conclusoes'] += linha.conclusoes
+        dados['tempos'].append((linha.tempo_mediano_segundos, linha.visualizacoes))
+
+    modulos = defaultdict(lambda: {'visualizacoes': 0, 'conclusoes': 0, 'tempos': [], 'parados': Counter()})
+    for linha in EstatisticaModuloDiaria.objects.filter(modulo__trilha=trilha, dia__gte=desde):
+        dados = modulos[linha.modulo_id]
+        dados['visualizacoes'] += linha.visualizacoes
+        dados['conclusoes'] += linha.conclusoes
+        dados['tempos'].append((linha.tempo_mediano_segundos, linha.alunos_ativos))
+        if linha.abandono_conteudo_id is not None:
+            dados['parados'][linha.abandono_conteudo_id] += linha.abandonos
+
+    for dados in [*conteudos.values(), *modulos.values()]:
+        dados['tempo_mediano'] = formatar_tempo(_mediana_ponderada(dados.pop('tempos')))
+    for dados in modulos.values():
+        parados = dados.pop('parados')
+        dados['abandono_conteudo_id'] = parados.most_common(1)[0][0] if parados else None
+
+    return {'desde': desde, 'modulos': dict(modulos), 'conteudos': dict(conteudos)}
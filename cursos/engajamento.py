@@ -0,0 +1,128 @@
+# cursos/engajamento.py
+"""
+Tempo gasto nos conteúdos (``VisualizacaoConteudo.tempo_gasto_segundos``).
+
+Enquanto a página de um conteúdo está aberta e visível, o navegador envia
+um heartbeat a cada ``HEARTBEAT_SEGUNDOS``. Cada batida só soma segundos
+em um buffer em memória, por (usuário, conteúdo); o buffer é gravado em
+lote — uma ``UPDATE ... SET tempo_gasto_segundos = tempo_gasto_segundos + n``
+por linha — por um timer ``FLUSH_SEGUNDOS`` depois da primeira batida
+pendente, ou antes, quando passa de ``FLUSH_MAX_LINHAS``. Milhares de
+leitores simultâneos viram algumas escritas por minuto, e não uma por batida.
+
+O buffer é por processo, como o registro do stream dos chats: cada worker
+grava o que recebeu, mesmo que pare de receber batidas. Um processo que
+morre sem gravar perde no máximo ``FLUSH_SEGUNDOS`` de tempo, o que é
+aceitável para analytics.
+
+Chaves cuja UPDATE não atinge nenhuma linha (conteúdo sem visualização do
+usuário, ids inventados) passam a ser ignoradas pelo processo, para não
+encher o buffer e forçar gravações inúteis.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, models, transaction
+
+from .models import VisualizacaoConteudo
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SEGUNDOS = getattr(settings, 'ENGAJAMENTO_HEARTBEAT_SEGUNDOS', 30)
+FLUSH_SEGUNDOS = getattr(settings, 'ENGAJAMENTO_FLUSH_SEGUNDOS', 60)
+FLUSH_MAX_LINHAS = getattr(settings, 'ENGAJAMENTO_FLUSH_MAX_LINHAS', 500)
+
+# Uma batida nunca vale mais que isso (aba suspensa, relógio do cliente)
+MAX_SEGUNDOS_POR_BATIDA = HEARTBEAT_SEGUNDOS * 2
+
+# Limite da lista de chaves sem linha; ao passar, a lista recomeça
+MAX_CHAVES_SEM_LINHA = 10_000
+
+
+class BufferTempo:
+    """Acumula segundos por (usuario_id, conteudo_id) e grava em lote. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendentes = defaultdict(int)
+        self._sem_linha = set()
+        self._timer = None
+
+    def _armar_timer(self):
+        # chamado com o lock
+        if self._timer is None:
+            self._timer = threading.Timer(FLUSH_SEGUNDOS, self._gravar_pelo_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _gravar_pelo_timer(self):
+        try:
+            self.gravar()
+        finally:
+            connections.close_all()  # conexões desta thread
+
+    def registrar(self, usuario_id, conteudo_id, segundos):
+        """Soma a batida no buffer. Retorna False se ela foi descartada."""
+        segundos = max(0, min(int(segundos), MAX_SEGUNDOS_POR_BATIDA))
+        chave = (usuario_id, conteudo_id)
+        with self._lock:
+            if not segundos or chave in self._sem_linha:
+                return False
+            self._pendentes[chave] += segundos
+            self._armar_timer()
+            cheio = len(self._pendentes) >= FLUSH_MAX_LINHAS
+        if cheio:
+            self.gravar()
+        return True
+
+    def pendentes(self):
+        with self._lock:
+            return dict(self._pendentes)
+
+    def gravar(self):
+        """Grava o buffer (uma UPDATE por linha, em uma transação). Retorna as linhas atualizadas."""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, defaultdict(int)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pendentes:
+            return 0
+
+        sem_linha = []
+        try:
+            with transaction.atomic():
+                # ordem fixa: dois workers gravando ao mesmo tempo travam as linhas na mesma ordem
+                for (usuario_id, conteudo_id), segundos in sorted(pendentes.items()):
+                    atualizadas = VisualizacaoConteudo.objects.filter(
+                        usuario_id=usuario_id, conteudo_id=conteudo_id
+                    ).update(tempo_gasto_segundos=models.F('tempo_gasto_segundos') + segundos)
+                    if not atualizadas:
+                        sem_linha.append((usuario_id, conteudo_id))
+        except DatabaseError:
+            logger.exception('Falha ao gravar o tempo gasto de %d visualizações; tentando na próxima', len(pendentes))
+            with self._lock:
+                for chave, segundos in pendentes.items():
+                    self._pendentes[chave] += segundos
+                self._armar_timer()
+            return 0
+
+        gravadas = len(pendentes) - len(sem_linha)
+        logger.info('Tempo gasto gravado em %d de %d visualizações', gravadas, len(pendentes))
+        if sem_linha:
+            logger.warning('%d chave(s) do buffer sem visualização correspondente; ignoradas daqui em diante',
+                           len(sem_linha))
+            with self._lock:
+                if len(self._sem_linha) + len(sem_linha) > MAX_CHAVES_SEM_LINHA:
+                    self._sem_linha.clear()
+                self._sem_linha.update(sem_linha)
+        return gravadas
+
+
+buffer = BufferTempo()
+
+# Grava o que sobrou quando o worker encerra normalmente
+atexit.register(buffer.gravar)
@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from cursos.analytics import agregar_estatisticas
+from cursos.models import EstatisticaModuloDiaria
+
+
+class Command(BaseCommand):
+    help = (
+        'Agrega as visualizações de conteúdo em estatísticas diárias por conteúdo e por módulo. '
+        'Por padrão é incremental: refaz apenas do último dia já agregado em diante. '
+        'Agende para rodar periodicamente (ex.: a cada hora).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Data inicial (AAAA-MM-DD) a recalcular.')
+        parser.add_argument('--dias', type=int, help='Recalcula os últimos N dias.')
+        parser.add_argument('--completo', action='store_true', help='Recalcula todo o histórico.')
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            desde = None
+        elif options['desde']:
+            try:
+                desde = datetime.date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('Use o formato AAAA-MM-DD em --desde.')
+        elif options['dias'] is not None:
+            if options['dias'] < 1:
+                raise CommandError('--dias deve ser maior que zero.')
+            desde = timezone.localdate() - datetime.timedelta(days=options['dias'] - 1)
+        else:
+            desde = EstatisticaModuloDiaria.objects.aggregate(ultimo=Max('dia'))['ultimo']
+
+        linhas_conteudo, linhas_modulo = agregar_estatisticas(desde)
+        escopo = f'desde {desde.isoformat()}' if desde else 'histórico completo'
+        self.stdout.write(self.style.SUCCESS(
+            f'{linhas_conteudo} estatística(s) de conteúdo e {linhas_modulo} de módulo gravada(s) ({escopo}).'
+        ))
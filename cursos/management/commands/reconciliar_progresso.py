@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from cursos.models import divergencias_progresso, reconciliar_progresso
+
+
+class Command(BaseCommand):
+    help = 'Confere o progresso armazenado de trilhas e módulos contra as visualizações e corrige desvios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Apenas verifica divergências, sem corrigir.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            divergencias = divergencias_progresso()
+        else:
+            divergencias = reconciliar_progresso()
+
+        for modelo, chave, armazenado, esperado in divergencias:
+            self.stderr.write(f'{modelo._meta.verbose_name} {chave}: armazenado={armazenado} esperado={esperado}')
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS('Progresso confere com as visualizações.'))
+        elif options['check']:
+            raise CommandError(f'{len(divergencias)} divergência(s) encontrada(s) no progresso.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergencias)} registro(s) de progresso corrigido(s).'))
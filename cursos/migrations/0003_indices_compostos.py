@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cursos', '0002_modulo_conteudomodulo_trilha_modulo_trilha_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visualizacaoconteudo',
+            index=models.Index(fields=['usuario', 'completo', 'conteudo'], name='visualizacao_completo_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def popular_progresso(apps, schema_editor):
+    """Preenche totais e progressos a partir dos conteúdos e visualizações existentes."""
+    ConteudoModulo = apps.get_model('cursos', 'ConteudoModulo')
+    VisualizacaoConteudo = apps.get_model('cursos', 'VisualizacaoConteudo')
+    Modulo = apps.get_model('cursos', 'Modulo')
+    Trilha = apps.get_model('cursos', 'Trilha')
+    ProgressoModulo = apps.get_model('cursos', 'ProgressoModulo')
+    ProgressoTrilha = apps.get_model('cursos', 'ProgressoTrilha')
+
+    conteudos = ConteudoModulo.objects.order_by()
+    for modulo_id, n in conteudos.values_list('modulo_id').annotate(n=Count('id')):
+        Modulo.objects.filter(id=modulo_id).update(qtd_conteudos=n)
+    for trilha_id, n in conteudos.values_list('modulo__trilha_id').annotate(n=Count('id')):
+        Trilha.objects.filter(id=trilha_id).update(qtd_conteudos=n)
+
+    completos = VisualizacaoConteudo.objects.filter(completo=True).order_by()
+    ProgressoModulo.objects.bulk_create(
+        (
+            ProgressoModulo(usuario_id=usuario_id, modulo_id=modulo_id, completos=n)
+            for usuario_id, modulo_id, n in completos.values_list('usuario_id', 'conteudo__modulo_id').annotate(
+                n=Count('id')
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+    ProgressoTrilha.objects.bulk_create(
+        (
+            ProgressoTrilha(usuario_id=usuario_id, trilha_id=trilha_id, completos=n)
+            for usuario_id, trilha_id, n in completos.values_list('usuario_id', 'conteudo__modulo__trilha_id').annotate(
+                n=Count('id')
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cursos', '0003_indices_compostos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modulo',
+            name='qtd_conteudos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='trilha',
+            name='qtd_conteudos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ProgressoModulo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completos', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('modulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progressos', to='cursos.modulo')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progressos_modulo', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Progresso no Módulo',
+                'verbose_name_plural': 'Progressos nos Módulos',
+                'unique_together': {('usuario', 'modulo')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProgressoTrilha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completos', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('trilha', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progressos', to='cursos.trilha')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progressos_trilha', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Progresso na Trilha',
+                'verbose_name_plural': 'Progressos nas Trilhas',
+                'unique_together': {('usuario', 'trilha')},
+            },
+        ),
+        migrations.RunPython(popular_progresso, migrations.RunPython.noop),
+        # Progresso (percentual das aulas antigas por sala) não tem o que
+        # migrar: detalhe_curso recalcula o percentual de Aula.concluida_por.
+        migrations.DeleteModel(
+            name='Progresso',
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cursos', '0004_progresso_armazenado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaConteudoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('visualizacoes', models.IntegerField(default=0)),
+                ('conclusoes', models.IntegerField(default=0)),
+                ('tempo_mediano_segundos', models.IntegerField(default=0)),
+                ('conteudo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estatisticas_diarias', to='cursos.conteudomodulo')),
+            ],
+            options={
+                'verbose_name': 'Estatística Diária de Conteúdo',
+                'verbose_name_plural': 'Estatísticas Diárias de Conteúdos',
+                'indexes': [models.Index(fields=['dia'], name='estat_conteudo_dia_idx')],
+                'unique_together': {('conteudo', 'dia')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EstatisticaModuloDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('visualizacoes', models.IntegerField(default=0)),
+                ('conclusoes', models.IntegerField(default=0)),
+                ('alunos_ativos', models.IntegerField(default=0)),
+                ('tempo_mediano_segundos', models.IntegerField(default=0)),
+                ('abandonos', models.IntegerField(default=0)),
+                ('abandono_conteudo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cursos.conteudomodulo')),
+                ('modulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estatisticas_diarias', to='cursos.modulo')),
+            ],
+            options={
+                'verbose_name': 'Estatística Diária de Módulo',
+                'verbose_name_plural': 'Estatísticas Diárias de Módulos',
+                'indexes': [models.Index(fields=['dia'], name='estat_modulo_dia_idx')],
+                'unique_together': {('modulo', 'dia')},
+            },
+        ),
+    ]
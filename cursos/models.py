@@ -1,7 +1,17 @@
 # cursos/models.py
-from django.db import models
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from usuarios.models import Usuario, Sala, Missao
 
+NAVEGACAO_CACHE_SEGUNDOS = getattr(settings, 'NAVEGACAO_TRILHA_CACHE_SEGUNDOS', 60 * 60)
+
 # ==============================
 # MODELS ANTIGOS (manter por compatibilidade)
 # ==============================
@@ -21,22 +31,16 @@ class Aula(models.Model):
         return f"{self.titulo} (Sala: {self.sala.nome})"
 
 
-class Progresso(models.Model):
-    """DEPRECATED - Manter apenas para compatibilidade"""
-    aluno = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='progressos')
-    sala = models.ForeignKey(Sala, on_delete=models.CASCADE, related_name='progressos')
-    percentual = models.FloatField(default=0.0)
-
-    class Meta:
-        unique_together = ('aluno', 'sala')
-
-    def __str__(self):
-        return f"{self.aluno.email} - {self.sala.nome}: {self.percentual}%"
-
-
 # ==============================
 # NOVO SISTEMA DE TRILHAS
 # ==============================
+def percentual_progresso(total, completos):
+    """Percentual (0-100, uma casa decimal) de ``completos`` sobre ``total``."""
+    if total == 0:
+        return 0
+    return round((completos / total) * 100, 1)
+
+
 class Trilha(models.Model):
     """
     Sequência estruturada de aprendizado dentro de uma sala.
@@ -67,6 +71,9 @@ class Trilha(models.Model):
     atualizado_em = models.DateTimeField(auto_now=True)
     criador = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
     
+    # Mantido pelos signals de ConteudoModulo (ver PROGRESSO ARMAZENADO)
+    qtd_conteudos = models.IntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ['ordem']
         verbose_name = 'Trilha de Aprendizado'
@@ -77,15 +84,13 @@ class Trilha(models.Model):
     
     def total_conteudos(self):
         """Retorna o número total de conteúdos nesta trilha"""
-        return ConteudoModulo.objects.filter(modulo__trilha=self).count()
+        return self.qtd_conteudos
     
     def conteudos_completos_usuario(self, usuario):
         """Retorna quantos conteúdos o usuário completou"""
-        return VisualizacaoConteudo.objects.filter(
-            usuario=usuario,
-            conteudo__modulo__trilha=self,
-            completo=True
-        ).count()
+        return ProgressoTrilha.objects.filter(
+            usuario=usuario, trilha=self
+        ).values_list('completos', flat=True).first() or 0
     
     def progresso_usuario(self, usuario):
         """Retorna o percentual de progresso do usuário (0-100)"""
@@ -93,23 +98,158 @@ class Trilha(models.Model):
         if total == 0:
             return 0
         completos = self.conteudos_completos_usuario(usuario)
-        return round((completos / total) * 100, 1)
-    
-    def esta_desbloqueada_para(self, usuario):
-        """Verifica se a trilha está desbloqueada para o usuário"""
-        # Verificar pontos
-        if self.pontos_necessarios > 0:
-            if usuario.pontos_totais < self.pontos_necessarios:
-                return False
-        
-        # Verificar trilha anterior
-        if self.trilha_anterior:
-            total_anterior = self.trilha_anterior.total_conteudos()
-            completos_anterior = self.trilha_anterior.conteudos_completos_usuario(usuario)
-            if total_anterior > 0 and completos_anterior < total_anterior:
-                return False
+        return percentual_progresso(total, completos)
+    
+    @staticmethod
+    def progresso_em_lote(trilhas, usuario):
+        """
+        Total de conteúdos e quantos o usuário completou, para várias
+        trilhas e as trilhas anteriores delas, em duas consultas.
+        Retorna {trilha_id: (total, completos)}; trilhas sem conteúdo ficam
+        com (0, 0).
+        """
+        ids = set()
+        for trilha in trilhas:
+            ids.add(trilha.id)
+            if trilha.trilha_anterior_id:
+                ids.add(trilha.trilha_anterior_id)
+
+        totais = dict(Trilha.objects.filter(id__in=ids).values_list('id', 'qtd_conteudos'))
+        completos = dict(
+            ProgressoTrilha.objects.filter(usuario=usuario, trilha_id__in=ids).values_list('trilha_id', 'completos')
+        )
+        return {i: (totais.get(i, 0), completos.get(i, 0)) for i in ids}
+    
+    def esta_desbloqueada_para(self, usuario, progresso=None):
+        """
+        Verifica se a trilha está desbloqueada para o usuário, seguindo a
+        cadeia de trilhas anteriores inteira (ver GrafoTrilhas).
+        ``progresso`` é o mapa de ``progresso_em_lote``; sem ele, é lido do
+        progresso armazenado. Número fixo de consultas, qualquer que seja o
+        tamanho da cadeia.
+        """
+        if self.pontos_necessarios > 0 and usuario.pontos_totais < self.pontos_necessarios:
+            return False
+        if not self.trilha_anterior_id:
+            return True  # sem cadeia, nada a consultar
         
-        return True
+        grafo = GrafoTrilhas.da_sala(self.sala_id, incluir=self)
+        if progresso is None:
+            progresso = Trilha.progresso_em_lote(grafo.trilhas.values(), usuario)
+        return grafo.desbloqueio(usuario, progresso)[self.id]
+    
+    @staticmethod
+    def desbloqueio_em_lote(trilhas, usuario, progresso):
+        """``{trilha_id: bool}`` para várias trilhas, sem consultas extras."""
+        return GrafoTrilhas(trilhas).desbloqueio(usuario, progresso)
+    
+    def validar_dependencias(self):
+        """
+        Garante que ``trilha_anterior`` é da mesma sala e não fecha um ciclo
+        (A → B → A). Levanta ValidationError.
+        """
+        if not self.trilha_anterior_id:
+            return
+        if self.trilha_anterior_id == self.id:
+            raise ValidationError({'trilha_anterior': 'Uma trilha não pode depender dela mesma.'})
+        sala_anterior = Trilha.objects.filter(pk=self.trilha_anterior_id).values_list('sala_id', flat=True).first()
+        if sala_anterior != self.sala_id:
+            raise ValidationError({'trilha_anterior': 'A trilha anterior precisa ser da mesma sala.'})
+        GrafoTrilhas.da_sala(self.sala_id, incluir=self).ordem_topologica()
+    
+    def clean(self):
+        super().clean()
+        self.validar_dependencias()
+    
+    def save(self, *args, **kwargs):
+        self.validar_dependencias()
+        super().save(*args, **kwargs)
+
+
+# ==============================
+# GRAFO DE DESBLOQUEIO DAS TRILHAS
+# ==============================
+class GrafoTrilhas:
+    """
+    Dependências ``trilha_anterior`` entre trilhas. Cada trilha tem no máximo
+    uma anterior, então sem ciclos o grafo é uma floresta e a ordem
+    topológica põe toda trilha depois da sua anterior.
+
+    Uma trilha está desbloqueada quando o usuário tem os pontos necessários
+    e a anterior está desbloqueada e completa — em qualquer profundidade.
+    """
+
+    def __init__(self, trilhas):
+        self.trilhas = {trilha.id: trilha for trilha in trilhas}
+
+    @classmethod
+    def da_sala(cls, sala_id, incluir=None):
+        """
+        Grafo de todas as trilhas da sala em uma consulta. ``incluir``
+        substitui a versão do banco de uma trilha (ex.: sendo editada).
+        """
+        trilhas = {
+            t.id: t for t in Trilha.objects.filter(sala_id=sala_id).only(
+                'id', 'sala_id', 'nome', 'ordem', 'pontos_necessarios', 'trilha_anterior_id', 'qtd_conteudos'
+            )
+        }
+        if incluir is not None:
+            trilhas[incluir.id] = incluir
+        return cls(trilhas.values())
+
+    def _ordenar(self):
+        """Kahn: retorna (ids em ordem topológica, ids presos em ciclos)."""
+        dependentes = {}
+        pendentes = {}
+        for trilha in self.trilhas.values():
+            anterior = trilha.trilha_anterior_id
+            if anterior is not None and anterior in self.trilhas:
+                dependentes.setdefault(anterior, []).append(trilha.id)
+                pendentes[trilha.id] = 1
+            else:
+                pendentes[trilha.id] = 0  # raiz (ou anterior fora do grafo)
+
+        fila = deque(sorted(
+            (i for i, n in pendentes.items() if n == 0),
+            key=lambda i: (self.trilhas[i].ordem, i),
+        ))
+        ordem = []
+        while fila:
+            atual = fila.popleft()
+            ordem.append(atual)
+            for dependente in dependentes.get(atual, ()):
+                pendentes[dependente] -= 1
+                if pendentes[dependente] == 0:
+                    fila.append(dependente)
+        em_ciclo = set(self.trilhas) - set(ordem)
+        return ordem, em_ciclo
+
+    def ordem_topologica(self):
+        """Trilhas com cada anterior antes das dependentes. Levanta ValidationError se houver ciclo."""
+        ordem, em_ciclo = self._ordenar()
+        if em_ciclo:
+            nomes = ', '.join(sorted(self.trilhas[i].nome for i in em_ciclo))
+            raise ValidationError({'trilha_anterior': f'As trilhas formariam um ciclo de requisitos: {nomes}.'})
+        return [self.trilhas[i] for i in ordem]
+
+    def desbloqueio(self, usuario, progresso):
+        """
+        ``{trilha_id: bool}`` em uma passada na ordem topológica.
+        ``progresso`` é ``{trilha_id: (total, completos)}``, como o de
+        ``Trilha.progresso_em_lote``. Trilhas presas em ciclo (dados antigos)
+        ficam bloqueadas.
+        """
+        ordem, em_ciclo = self._ordenar()
+        desbloqueada = dict.fromkeys(em_ciclo, False)
+        for trilha_id in ordem:
+            trilha = self.trilhas[trilha_id]
+            livre = not (trilha.pontos_necessarios > 0 and usuario.pontos_totais < trilha.pontos_necessarios)
+            anterior = trilha.trilha_anterior_id
+            if livre and anterior:
+                total, completos = progresso.get(anterior, (0, 0))
+                livre = desbloqueada.get(anterior, True) and not (total > 0 and completos < total)
+            desbloqueada[trilha_id] = livre
+        return desbloqueada
 
 
 class Modulo(models.Model):
@@ -132,6 +272,9 @@ class Modulo(models.Model):
     
     criado_em = models.DateTimeField(auto_now_add=True)
     
+    # Mantido pelos signals de ConteudoModulo (ver PROGRESSO ARMAZENADO)
+    qtd_conteudos = models.IntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ['ordem']
         verbose_name = 'Módulo'
@@ -142,19 +285,20 @@ class Modulo(models.Model):
     
     def total_conteudos(self):
         """Retorna o número de conteúdos neste módulo"""
-        return self.conteudos.count()
+        return self.qtd_conteudos
+    
+    def conteudos_completos_usuario(self, usuario):
+        """Retorna quantos conteúdos do módulo o usuário completou"""
+        return ProgressoModulo.objects.filter(
+            usuario=usuario, modulo=self
+        ).values_list('completos', flat=True).first() or 0
     
     def progresso_usuario(self, usuario):
         """Retorna o percentual de progresso do usuário neste módulo"""
         total = self.total_conteudos()
         if total == 0:
             return 0
-        completos = VisualizacaoConteudo.objects.filter(
-            usuario=usuario,
-            conteudo__modulo=self,
-            completo=True
-        ).count()
-        return round((completos / total) * 100, 1)
+        return percentual_progresso(total, self.conteudos_completos_usuario(usuario))
 
 
 class ConteudoModulo(models.Model):
@@ -275,8 +419,448 @@ class VisualizacaoConteudo(models.Model):
         verbose_name = 'Visualização de Conteúdo'
         verbose_name_plural = 'Visualizações de Conteúdos'
         ordering = ['-data_visualizacao']
+        indexes = [
+            # conteúdos completos do usuário (progresso de trilhas e módulos)
+            models.Index(fields=['usuario', 'completo', 'conteudo'], name='visualizacao_completo_idx'),
+        ]
     
     def __str__(self):
         status = "✓" if self.completo else "⏳"
         return f"{status} {self.usuario.get_nome_exibicao()} - {self.conteudo.titulo}"
-        
\ No newline at end of file
+    
+    def marcar_completo(self, completo=True):
+        """
+        Marca (ou desmarca) o conteúdo como completo e atualiza o progresso
+        armazenado. A troca é condicional no banco, então dois cliques
+        simultâneos contam uma vez só. Retorna True se o estado mudou.
+        """
+        with transaction.atomic():
+            # update() não aciona o auto_now; a data da conclusão entra nas estatísticas diárias
+            mudou = VisualizacaoConteudo.objects.filter(pk=self.pk).exclude(completo=completo).update(
+                completo=completo, ultima_atualizacao=timezone.now()
+            )
+            if mudou:
+                aplicar_progresso_conteudo(self.usuario_id, self.conteudo_id, 1 if completo else -1)
+        self.completo = completo
+        return bool(mudou)
+
+
+# ==============================
+# PROGRESSO ARMAZENADO
+# ==============================
+# ``ProgressoModulo`` / ``ProgressoTrilha`` guardam quantos conteúdos cada
+# usuário completou, e ``qtd_conteudos`` em Modulo/Trilha o total. São
+# atualizados com F() quando o aluno marca um conteúdo (marcar_completo) e
+# pelos signals abaixo quando conteúdos ou visualizações são criados ou
+# excluídos, e quando um conteúdo muda de módulo ou um módulo de trilha.
+# ``manage.py reconciliar_progresso`` detecta e corrige desvios.
+
+class ProgressoModulo(models.Model):
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='progressos_modulo')
+    modulo = models.ForeignKey(Modulo, on_delete=models.CASCADE, related_name='progressos')
+    completos = models.IntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('usuario', 'modulo')
+        verbose_name = 'Progresso no Módulo'
+        verbose_name_plural = 'Progressos nos Módulos'
+
+    def __str__(self):
+        return f"{self.usuario} - {self.modulo.titulo}: {self.completos}"
+
+
+class ProgressoTrilha(models.Model):
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='progressos_trilha')
+    trilha = models.ForeignKey(Trilha, on_delete=models.CASCADE, related_name='progressos')
+    completos = models.IntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('usuario', 'trilha')
+        verbose_name = 'Progresso na Trilha'
+        verbose_name_plural = 'Progressos nas Trilhas'
+
+    def __str__(self):
+        return f"{self.usuario} - {self.trilha.nome}: {self.completos}"
+
+
+def _somar(modelo, delta, **chave):
+    """Soma ``delta`` em ``completos`` da linha, criando-a se faltar."""
+    if not modelo.objects.filter(**chave).update(completos=models.F('completos') + delta) and delta > 0:
+        linha, criada = modelo.objects.get_or_create(defaults={'completos': delta}, **chave)
+        if not criada:
+            modelo.objects.filter(pk=linha.pk).update(completos=models.F('completos') + delta)
+
+
+def aplicar_progresso_conteudo(usuario_id, conteudo_id, delta):
+    """Soma ``delta`` (+1/-1) no progresso do usuário no módulo e na trilha do conteúdo."""
+    ids = ConteudoModulo.objects.filter(pk=conteudo_id).values_list('modulo_id', 'modulo__trilha_id').first()
+    if ids is None:
+        return  # conteúdo já excluído
+    modulo_id, trilha_id = ids
+    _somar(ProgressoModulo, delta, usuario_id=usuario_id, modulo_id=modulo_id)
+    _somar(ProgressoTrilha, delta, usuario_id=usuario_id, trilha_id=trilha_id)
+
+
+def _aplicar_total_conteudos(modulo_id, delta):
+    trilha_id = Modulo.objects.filter(pk=modulo_id).values_list('trilha_id', flat=True).first()
+    if trilha_id is None:
+        return  # módulo excluído junto com o conteúdo
+    Modulo.objects.filter(pk=modulo_id).update(qtd_conteudos=models.F('qtd_conteudos') + delta)
+    Trilha.objects.filter(pk=trilha_id).update(qtd_conteudos=models.F('qtd_conteudos') + delta)
+
+
+def _mover_progresso(modelo, campo, origem, destino, por_usuario):
+    """Passa ``por_usuario`` ({usuario_id: completos}) das linhas de ``origem`` para as de ``destino``."""
+    if origem == destino or not por_usuario:
+        return
+    com_linha = set(
+        modelo.objects.filter(usuario_id__in=por_usuario, **{campo: destino}).values_list('usuario_id', flat=True)
+    )
+    grupos = defaultdict(list)
+    for usuario_id, n in por_usuario.items():
+        grupos[n].append(usuario_id)
+    for n, usuarios in grupos.items():
+        modelo.objects.filter(usuario_id__in=usuarios, **{campo: origem}).update(completos=models.F('completos') - n)
+        modelo.objects.filter(usuario_id__in=usuarios, **{campo: destino}).update(completos=models.F('completos') + n)
+    modelo.objects.bulk_create(
+        [
+            modelo(usuario_id=usuario_id, completos=n, **{campo: destino})
+            for usuario_id, n in por_usuario.items() if usuario_id not in com_linha
+        ],
+        batch_size=1000,
+    )
+
+
+def mover_conteudo(conteudo_id, modulo_origem, trilha_origem, modulo_destino):
+    """Ajusta totais e progresso de quem completou o conteúdo que mudou de módulo."""
+    trilha_destino = Modulo.objects.filter(pk=modulo_destino).values_list('trilha_id', flat=True).first()
+    por_usuario = dict.fromkeys(
+        VisualizacaoConteudo.objects.filter(conteudo_id=conteudo_id, completo=True).values_list('usuario_id', flat=True),
+        1,
+    )
+    with transaction.atomic():
+        Modulo.objects.filter(pk=modulo_origem).update(qtd_conteudos=models.F('qtd_conteudos') - 1)
+        Trilha.objects.filter(pk=trilha_origem).update(qtd_conteudos=models.F('qtd_conteudos') - 1)
+        _aplicar_total_conteudos(modulo_destino, 1)
+        _mover_progresso(ProgressoModulo, 'modulo_id', modulo_origem, modulo_destino, por_usuario)
+        _mover_progresso(ProgressoTrilha, 'trilha_id', trilha_origem, trilha_destino, por_usuario)
+
+
+def mover_modulo(modulo_id, trilha_origem, trilha_destino):
+    """Ajusta totais e progresso das trilhas quando o módulo muda de trilha."""
+    qtd = Modulo.objects.filter(pk=modulo_id).values_list('qtd_conteudos', flat=True).first() or 0
+    por_usuario = dict(
+        ProgressoModulo.objects.filter(modulo_id=modulo_id, completos__gt=0).values_list('usuario_id', 'completos')
+    )
+    with transaction.atomic():
+        Trilha.objects.filter(pk=trilha_origem).update(qtd_conteudos=models.F('qtd_conteudos') - qtd)
+        Trilha.objects.filter(pk=trilha_destino).update(qtd_conteudos=models.F('qtd_conteudos') + qtd)
+        _mover_progresso(ProgressoTrilha, 'trilha_id', trilha_origem, trilha_destino, por_usuario)
+
+
+def progresso_esperado():
+    """
+    Recalcula tudo a partir de ConteudoModulo e VisualizacaoConteudo.
+    Retorna ``(totais_modulo, totais_trilha, por_modulo, por_trilha)``:
+    ``{modulo_id: n}``, ``{trilha_id: n}``, ``{(usuario_id, modulo_id): n}``
+    e ``{(usuario_id, trilha_id): n}``.
+    """
+    totais_modulo = dict(
+        ConteudoModulo.objects.order_by().values_list('modulo_id').annotate(n=models.Count('id'))
+    )
+    totais_trilha = dict(
+        ConteudoModulo.objects.order_by().values_list('modulo__trilha_id').annotate(n=models.Count('id'))
+    )
+    completos = VisualizacaoConteudo.objects.filter(completo=True).order_by()
+    por_modulo = {
+        (usuario_id, modulo_id): n
+        for usuario_id, modulo_id, n in completos.values_list('usuario_id', 'conteudo__modulo_id').annotate(
+            n=models.Count('id')
+        )
+    }
+    por_trilha = {
+        (usuario_id, trilha_id): n
+        for usuario_id, trilha_id, n in completos.values_list('usuario_id', 'conteudo__modulo__trilha_id').annotate(
+            n=models.Count('id')
+        )
+    }
+    return totais_modulo, totais_trilha, por_modulo, por_trilha
+
+
+def divergencias_progresso():
+    """
+    Lista ``(modelo, chave, armazenado, esperado)`` para cada total de
+    Modulo/Trilha ou linha de progresso que difere da fonte. Linhas de
+    progresso que faltam aparecem com ``armazenado`` 0.
+    """
+    totais_modulo, totais_trilha, por_modulo, por_trilha = progresso_esperado()
+    divergencias = []
+    for modelo, totais in ((Modulo, totais_modulo), (Trilha, totais_trilha)):
+        for id_, armazenado in modelo.objects.values_list('id', 'qtd_conteudos').order_by('id').iterator():
+            esperado = totais.get(id_, 0)
+            if armazenado != esperado:
+                divergencias.append((modelo, id_, armazenado, esperado))
+
+    for modelo, campo, esperados in (
+        (ProgressoModulo, 'modulo_id', por_modulo),
+        (ProgressoTrilha, 'trilha_id', por_trilha),
+    ):
+        restantes = dict(esperados)
+        for usuario_id, id_, armazenado in modelo.objects.values_list('usuario_id', campo, 'completos').iterator():
+            esperado = restantes.pop((usuario_id, id_), 0)
+            if armazenado != esperado:
+                divergencias.append((modelo, (usuario_id, id_), armazenado, esperado))
+        for chave, esperado in restantes.items():
+            divergencias.append((modelo, chave, 0, esperado))
+    return divergencias
+
+
+def reconciliar_progresso():
+    """Corrige totais e linhas de progresso divergentes. Retorna as divergências encontradas."""
+    divergencias = divergencias_progresso()
+    with transaction.atomic():
+        for modelo, chave, _, esperado in divergencias:
+            if modelo in (Modulo, Trilha):
+                modelo.objects.filter(id=chave).update(qtd_conteudos=esperado)
+                continue
+            campo = 'modulo_id' if modelo is ProgressoModulo else 'trilha_id'
+            modelo.objects.update_or_create(
+                usuario_id=chave[0], **{campo: chave[1]}, defaults={'completos': esperado}
+            )
+    return divergencias
+
+
+def reconstruir_progresso():
+    """
+    Recria do zero os totais e todas as linhas de progresso, em lote.
+    Para cargas em massa (seed, importações) que não passam pelos signals.
+    Retorna o número de linhas de progresso criadas.
+    """
+    totais_modulo, totais_trilha, por_modulo, por_trilha = progresso_esperado()
+    with transaction.atomic():
+        for modelo, totais in ((Modulo, totais_modulo), (Trilha, totais_trilha)):
+            modelo.objects.update(qtd_conteudos=0)
+            modelo.objects.bulk_update(
+                [modelo(id=id_, qtd_conteudos=n) for id_, n in totais.items()], ['qtd_conteudos'], batch_size=1000
+            )
+        ProgressoModulo.objects.all().delete()
+        ProgressoTrilha.objects.all().delete()
+        criadas = ProgressoModulo.objects.bulk_create(
+            [ProgressoModulo(usuario_id=u, modulo_id=m, completos=n) for (u, m), n in por_modulo.items()],
+            batch_size=1000,
+        )
+        criadas += ProgressoTrilha.objects.bulk_create(
+            [ProgressoTrilha(usuario_id=u, trilha_id=t, completos=n) for (u, t), n in por_trilha.items()],
+            batch_size=1000,
+        )
+    return len(criadas)
+
+
+@receiver(pre_save, sender=ConteudoModulo)
+def guardar_modulo_anterior(sender, instance, **kwargs):
+    """Módulo e trilha de antes do save, para o post_save perceber a mudança."""
+    instance._modulo_anterior = None
+    if instance.pk is not None:
+        instance._modulo_anterior = (
+            ConteudoModulo.objects.filter(pk=instance.pk).values_list('modulo_id', 'modulo__trilha_id').first()
+        )
+
+
+@receiver(pre_save, sender=Modulo)
+def guardar_trilha_anterior(sender, instance, **kwargs):
+    instance._trilha_anterior = None
+    if instance.pk is not None:
+        instance._trilha_anterior = Modulo.objects.filter(pk=instance.pk).values_list('trilha_id', flat=True).first()
+
+
+@receiver(post_save, sender=ConteudoModulo)
+def contar_conteudo_salvo(sender, instance, created, **kwargs):
+    if created:
+        _aplicar_total_conteudos(instance.modulo_id, 1)
+        return
+    anterior = getattr(instance, '_modulo_anterior', None)
+    if anterior is not None and anterior[0] != instance.modulo_id:
+        mover_conteudo(instance.pk, *anterior, instance.modulo_id)
+
+
+@receiver(post_save, sender=Modulo)
+def contar_modulo_movido(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_trilha_anterior', None)
+    if not created and anterior is not None and anterior != instance.trilha_id:
+        mover_modulo(instance.pk, anterior, instance.trilha_id)
+
+
+@receiver(post_delete, sender=ConteudoModulo)
+def descontar_conteudo_excluido(sender, instance, **kwargs):
+    # As visualizações do conteúdo já foram excluídas (e descontadas) antes
+    _aplicar_total_conteudos(instance.modulo_id, -1)
+
+
+@receiver(post_save, sender=VisualizacaoConteudo)
+def contar_visualizacao_criada_completa(sender, instance, created, **kwargs):
+    """Visualização criada já completa (admin, importação); toggles usam marcar_completo."""
+    if created and instance.completo:
+        aplicar_progresso_conteudo(instance.usuario_id, instance.conteudo_id, 1)
+
+
+@receiver(post_delete, sender=VisualizacaoConteudo)
+def descontar_visualizacao_excluida(sender, instance, **kwargs):
+    if instance.completo:
+        aplicar_progresso_conteudo(instance.usuario_id, instance.conteudo_id, -1)
+        
+
+
+# ==============================
+# ÍNDICE DE NAVEGAÇÃO DA TRILHA
+# ==============================
+class NavegacaoTrilha:
+    """
+    Sequência achatada dos conteúdos de uma trilha (módulos em ordem, e os
+    conteúdos de cada módulo em ordem), com o id, módulo, título e tipo de
+    cada um. Fica no cache por ``NAVEGACAO_CACHE_SEGUNDOS`` sob uma chave
+    com ``Trilha.atualizado_em``, que os signals de Modulo e ConteudoModulo
+    avançam no banco: o cache de cada worker deixa de valer assim que a
+    trilha carregada na requisição mostra a mudança. Posição, anterior e
+    próximo são consultas a dicionários.
+    """
+
+    def __init__(self, itens, modulos):
+        self.itens = itens
+        self.modulos = modulos  # {modulo_id: titulo}
+        self.posicoes = {item['id']: i for i, item in enumerate(itens)}
+        self.faixas = {}  # {modulo_id: (início, fim)} em self.itens
+        for i, item in enumerate(itens):
+            inicio, _ = self.faixas.get(item['modulo_id'], (i, i))
+            self.faixas[item['modulo_id']] = (inicio, i + 1)
+
+    @staticmethod
+    def _chave_cache(trilha):
+        return f'navegacao_trilha:{trilha.id}:{int(trilha.atualizado_em.timestamp() * 1_000_000)}'
+
+    @classmethod
+    def da_trilha(cls, trilha):
+        trilha_id = trilha.id
+        dados = cache.get(cls._chave_cache(trilha))
+        if dados is None:
+            dados = {
+                'itens': list(
+                    ConteudoModulo.objects.filter(modulo__trilha_id=trilha_id)
+                    .order_by('modulo__ordem', 'modulo_id', 'ordem', 'id')
+                    .values('id', 'modulo_id', 'titulo', 'tipo')
+                ),
+                'modulos': dict(Modulo.objects.filter(trilha_id=trilha_id).values_list('id', 'titulo')),
+            }
+            cache.set(cls._chave_cache(trilha), dados, NAVEGACAO_CACHE_SEGUNDOS)
+        return cls(dados['itens'], dados['modulos'])
+
+    @staticmethod
+    def invalidar(*trilha_ids):
+        """Avança a versão das trilhas no banco; ids None são ignorados."""
+        trilha_ids = {trilha_id for trilha_id in trilha_ids if trilha_id is not None}
+        if trilha_ids:
+            Trilha.objects.filter(pk__in=trilha_ids).update(atualizado_em=timezone.now())
+
+    def __contains__(self, conteudo_id):
+        return conteudo_id in self.posicoes
+
+    def do_modulo(self, modulo_id):
+        inicio, fim = self.faixas.get(modulo_id, (0, 0))
+        return self.itens[inicio:fim]
+
+    def posicao_no_modulo(self, conteudo_id):
+        """Posição (a partir de 1) do conteúdo dentro do seu módulo."""
+        posicao = self.posicoes[conteudo_id]
+        return posicao - self.faixas[self.itens[posicao]['modulo_id']][0] + 1
+
+    def _vizinho(self, conteudo_id, passo, mesmo_modulo):
+        posicao = self.posicoes[conteudo_id] + passo
+        if not 0 <= posicao < len(self.itens):
+            return None
+        vizinho = self.itens[posicao]
+        if mesmo_modulo and vizinho['modulo_id'] != self.itens[posicao - passo]['modulo_id']:
+            return None
+        return vizinho
+
+    def anterior(self, conteudo_id, mesmo_modulo=True):
+        return self._vizinho(conteudo_id, -1, mesmo_modulo)
+
+    def proximo(self, conteudo_id, mesmo_modulo=True):
+        """Próximo conteúdo; com ``mesmo_modulo=False``, passa para o primeiro do próximo módulo."""
+        return self._vizinho(conteudo_id, 1, mesmo_modulo)
+
+
+@receiver(post_save, sender=Modulo)
+@receiver(post_delete, sender=Modulo)
+def invalidar_navegacao_modulo(sender, instance, **kwargs):
+    # ao mudar de trilha, a de origem também perde o módulo
+    NavegacaoTrilha.invalidar(instance.trilha_id, getattr(instance, '_trilha_anterior', None))
+
+
+@receiver(post_save, sender=ConteudoModulo)
+@receiver(post_delete, sender=ConteudoModulo)
+def invalidar_navegacao_conteudo(sender, instance, **kwargs):
+    trilha_id = Modulo.objects.filter(pk=instance.modulo_id).values_list('trilha_id', flat=True).first()
+    anterior = getattr(instance, '_modulo_anterior', None)
+    # módulo excluído junto: o signal do módulo invalida
+    NavegacaoTrilha.invalidar(trilha_id, anterior[1] if anterior else None)
+
+
+# ==============================
+# ESTATÍSTICAS DE CONTEÚDO (PROFESSOR)
+# ==============================
+# Resumos diários de ``VisualizacaoConteudo`` gerados por
+# ``manage.py agregar_analytics`` (ver cursos/analytics.py). O relatório
+# do professor em detalhe_trilha lê só estas tabelas.
+class EstatisticaConteudoDiaria(models.Model):
+    """
+    Atividade em um conteúdo em um dia: alunos que o abriram pela primeira
+    vez, alunos que o concluíram e a mediana do tempo gasto por quem o abriu.
+    """
+    conteudo = models.ForeignKey(ConteudoModulo, on_delete=models.CASCADE, related_name='estatisticas_diarias')
+    dia = models.DateField()
+    visualizacoes = models.IntegerField(default=0)
+    conclusoes = models.IntegerField(default=0)
+    tempo_mediano_segundos = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('conteudo', 'dia')
+        indexes = [
+            models.Index(fields=['dia'], name='estat_conteudo_dia_idx'),
+        ]
+        verbose_name = 'Estatística Diária de Conteúdo'
+        verbose_name_plural = 'Estatísticas Diárias de Conteúdos'
+
+    def __str__(self):
+        return f"{self.conteudo.titulo} em {self.dia}: {self.visualizacoes} visualizações"
+
+
+class EstatisticaModuloDiaria(models.Model):
+    """
+    Atividade em um módulo em um dia. ``alunos_ativos`` abriram algum
+    conteúdo do módulo no dia; ``abandonos`` são os que ainda não o
+    concluíram, e ``abandono_conteudo`` o conteúdo mais avançado em que
+    a maior parte deles parou (o ponto de abandono do módulo).
+    """
+    modulo = models.ForeignKey(Modulo, on_delete=models.CASCADE, related_name='estatisticas_diarias')
+    dia = models.DateField()
+    visualizacoes = models.IntegerField(default=0)
+    conclusoes = models.IntegerField(default=0)
+    alunos_ativos = models.IntegerField(default=0)
+    tempo_mediano_segundos = models.IntegerField(default=0)
+    abandonos = models.IntegerField(default=0)
+    abandono_conteudo = models.ForeignKey(
+        ConteudoModulo, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    class Meta:
+        unique_together = ('modulo', 'dia')
+        indexes = [
+            models.Index(fields=['dia'], name='estat_modulo_dia_idx'),
+        ]
+        verbose_name = 'Estatística Diária de Módulo'
+        verbose_name_plural = 'Estatísticas Diárias de Módulos'
+
+    def __str__(self):
+        return f"{self.modulo.titulo} em {self.dia}: {self.alunos_ativos} alunos"
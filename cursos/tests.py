@@ -1,11 +1,26 @@
 from django.test import TestCase
 
 # Create your tests here.
+import datetime
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from usuarios.models import Sala
-from .models import Aula, Progresso
+from . import engajamento
+from .models import (
+    Aula, Trilha, Modulo, ConteudoModulo, VisualizacaoConteudo, ProgressoTrilha, GrafoTrilhas, NavegacaoTrilha,
+    EstatisticaConteudoDiaria, EstatisticaModuloDiaria, divergencias_progresso, reconciliar_progresso,
+)
 
 class CursosTests(TestCase):
     def setUp(self):
@@ -30,4 +45,448 @@ class CursosTests(TestCase):
         self.client.login(email='aluno@test.com', password='test123')
         response = self.client.get(reverse('cursos:marcar_aula_concluida', args=[self.aula.id]))
         self.assertRedirects(response, reverse('cursos:detalhe_curso', args=[self.sala.id]))
-        self.assertTrue(self.aula.concluida_por.filter(id=self.user.id).exists())
\ No newline at end of file
+        self.assertTrue(self.aula.concluida_por.filter(id=self.user.id).exists())
+
+
+class ListaTrilhasTests(TestCase):
+    def setUp(self):
+        self.aluno = get_user_model().objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', descricao='Descrição', criador=self.aluno)
+        self.sala.participantes.create(usuario=self.aluno, tipo_na_sala='aluno')
+        self.trilhas = []
+        anterior = None
+        for i in range(4):
+            trilha = Trilha.objects.create(sala=self.sala, nome=f'Trilha {i}', descricao='d', ordem=i, trilha_anterior=anterior)
+            modulo = Modulo.objects.create(trilha=trilha, titulo='Módulo', ordem=0)
+            for j in range(2):
+                ConteudoModulo.objects.create(modulo=modulo, titulo=f'C{j}', tipo='texto', ordem=j)
+            self.trilhas.append(trilha)
+            anterior = trilha
+        # completa a primeira trilha e metade da segunda
+        for conteudo in ConteudoModulo.objects.filter(modulo__trilha__in=self.trilhas[:2]).order_by('modulo__trilha__ordem', 'ordem')[:3]:
+            VisualizacaoConteudo.objects.create(usuario=self.aluno, conteudo=conteudo, completo=True)
+
+    def test_progresso_e_desbloqueio(self):
+        self.client.force_login(self.aluno)
+        response = self.client.get(reverse('cursos:lista_trilhas'))
+        itens = {item['trilha'].id: item for item in response.context['trilhas_com_progresso']}
+
+        for trilha in self.trilhas:
+            trilha.refresh_from_db()
+            item = itens[trilha.id]
+            self.assertEqual(item['progresso'], trilha.progresso_usuario(self.aluno))
+            self.assertEqual(item['completos'], trilha.conteudos_completos_usuario(self.aluno))
+            self.assertEqual(item['desbloqueada'], trilha.esta_desbloqueada_para(self.aluno))
+        self.assertEqual([itens[t.id]['desbloqueada'] for t in self.trilhas], [True, True, False, False])
+        self.assertEqual(itens[self.trilhas[1].id]['progresso'], 50.0)
+
+    def test_consultas_nao_crescem_com_trilhas(self):
+        self.client.force_login(self.aluno)
+        self.client.get(reverse('cursos:lista_trilhas'))
+        with CaptureQueriesContext(connection) as antes:
+            self.client.get(reverse('cursos:lista_trilhas'))
+        for i in range(4, 8):
+            Trilha.objects.create(sala=self.sala, nome=f'Trilha {i}', descricao='d', ordem=i, trilha_anterior=self.trilhas[-1])
+        with CaptureQueriesContext(connection) as depois:
+            self.client.get(reverse('cursos:lista_trilhas'))
+        self.assertEqual(len(antes), len(depois))
+
+
+class ProgressoArmazenadoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.aluno = get_user_model().objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', descricao='Descrição', criador=self.aluno)
+        self.sala.participantes.create(usuario=self.aluno, tipo_na_sala='aluno')
+        self.trilha = Trilha.objects.create(sala=self.sala, nome='Trilha', descricao='d')
+        self.modulo = Modulo.objects.create(trilha=self.trilha, titulo='Módulo', ordem=0)
+        self.conteudos = [
+            ConteudoModulo.objects.create(modulo=self.modulo, titulo=f'C{i}', tipo='texto', ordem=i) for i in range(4)
+        ]
+        self.client.force_login(self.aluno)
+
+    def marcar(self, conteudo):
+        self.client.post(reverse('cursos:visualizar_conteudo', args=[conteudo.id]), {'marcar_completo': '1'})
+
+    def test_toggle_atualiza_progresso(self):
+        self.assertEqual(self.trilha.progresso_usuario(self.aluno), 0)
+        self.marcar(self.conteudos[0])
+        self.marcar(self.conteudos[0])  # repetido não conta duas vezes
+        self.marcar(self.conteudos[1])
+        self.trilha.refresh_from_db()
+        self.modulo.refresh_from_db()
+        self.assertEqual(self.trilha.total_conteudos(), 4)
+        self.assertEqual(self.trilha.conteudos_completos_usuario(self.aluno), 2)
+        self.assertEqual(self.modulo.progresso_usuario(self.aluno), 50.0)
+
+        VisualizacaoConteudo.objects.get(usuario=self.aluno, conteudo=self.conteudos[1]).marcar_completo(False)
+        self.assertEqual(self.trilha.conteudos_completos_usuario(self.aluno), 1)
+        self.assertEqual(divergencias_progresso(), [])
+
+    def test_conteudo_adicionado_e_excluido(self):
+        self.marcar(self.conteudos[0])
+        self.marcar(self.conteudos[1])
+        self.conteudos[0].delete()
+        ConteudoModulo.objects.create(modulo=self.modulo, titulo='Novo', tipo='texto', ordem=9)
+        self.trilha.refresh_from_db()
+        self.assertEqual(self.trilha.total_conteudos(), 4)
+        self.assertEqual(self.trilha.conteudos_completos_usuario(self.aluno), 1)
+
+        Modulo.objects.create(trilha=self.trilha, titulo='Outro', ordem=1)
+        self.modulo.delete()
+        self.trilha.refresh_from_db()
+        self.assertEqual(self.trilha.total_conteudos(), 0)
+        self.assertEqual(divergencias_progresso(), [])
+
+    def test_conteudo_e_modulo_movidos(self):
+        outro = get_user_model().objects.create_user(email='outro@test.com', password='test123', tipo_usuario='aluno')
+        VisualizacaoConteudo.objects.create(usuario=outro, conteudo=self.conteudos[0], completo=True)
+        self.marcar(self.conteudos[0])
+        self.marcar(self.conteudos[1])
+        outra_trilha = Trilha.objects.create(sala=self.sala, nome='Outra', descricao='d')
+        destino = Modulo.objects.create(trilha=outra_trilha, titulo='Destino')
+
+        conteudo = self.conteudos[0]
+        conteudo.modulo = destino
+        conteudo.save()
+        self.assertEqual(divergencias_progresso(), [])
+        self.assertEqual(outra_trilha.conteudos_completos_usuario(self.aluno), 1)
+        self.assertEqual(self.trilha.conteudos_completos_usuario(self.aluno), 1)
+
+        # o módulo leva junto os conteúdos e o progresso de quem os completou
+        self.modulo.refresh_from_db()
+        self.modulo.trilha = outra_trilha
+        self.modulo.save()
+        self.assertEqual(divergencias_progresso(), [])
+        outra_trilha.refresh_from_db()
+        self.assertEqual(outra_trilha.total_conteudos(), 4)
+        self.assertEqual(outra_trilha.conteudos_completos_usuario(self.aluno), 2)
+        self.assertEqual(outra_trilha.conteudos_completos_usuario(outro), 1)
+
+    def test_leitura_em_uma_consulta(self):
+        self.marcar(self.conteudos[0])
+        self.trilha.refresh_from_db()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.trilha.progresso_usuario(self.aluno), 25.0)
+
+    def test_reconciliar(self):
+        self.marcar(self.conteudos[0])
+        ProgressoTrilha.objects.update(completos=3)
+        Trilha.objects.update(qtd_conteudos=0)
+        saida = StringIO()
+        with self.assertRaises(Exception):
+            call_command('reconciliar_progresso', check=True, stdout=saida, stderr=StringIO())
+        self.assertEqual(len(reconciliar_progresso()), 2)
+        self.assertEqual(divergencias_progresso(), [])
+
+
+class GrafoTrilhasTests(TestCase):
+    def setUp(self):
+        self.aluno = get_user_model().objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', descricao='Descrição', criador=self.aluno)
+        self.sala.participantes.create(usuario=self.aluno, tipo_na_sala='aluno')
+        # cadeia a → b → c → d, cada uma com um conteúdo
+        self.cadeia = []
+        anterior = None
+        for nome in 'abcd':
+            trilha = Trilha.objects.create(sala=self.sala, nome=nome, descricao='d', trilha_anterior=anterior)
+            modulo = Modulo.objects.create(trilha=trilha, titulo='Módulo')
+            ConteudoModulo.objects.create(modulo=modulo, titulo='C', tipo='texto')
+            self.cadeia.append(trilha)
+            anterior = trilha
+
+    def completar(self, trilha):
+        conteudo = ConteudoModulo.objects.get(modulo__trilha=trilha)
+        VisualizacaoConteudo.objects.create(usuario=self.aluno, conteudo=conteudo, completo=True)
+
+    def test_ciclo_e_rejeitado(self):
+        a, b, c, d = self.cadeia
+        a.trilha_anterior = d
+        with self.assertRaises(ValidationError):
+            a.save()
+        a.trilha_anterior = a
+        with self.assertRaises(ValidationError):
+            a.full_clean()
+
+        outra_sala = Sala.objects.create(nome='Outra', descricao='d', criador=self.aluno)
+        with self.assertRaises(ValidationError):
+            Trilha.objects.create(sala=outra_sala, nome='x', descricao='d', trilha_anterior=a)
+
+    def test_ordem_topologica(self):
+        Trilha.objects.filter(pk=self.cadeia[0].pk).update(ordem=9)
+        ordem = [t.nome for t in GrafoTrilhas.da_sala(self.sala.id).ordem_topologica()]
+        self.assertEqual(ordem, ['a', 'b', 'c', 'd'])
+
+    def test_desbloqueio_segue_a_cadeia_inteira(self):
+        a, b, c, d = self.cadeia
+        # c completa sem b completa: d continua bloqueada, porque c está bloqueada
+        self.completar(a)
+        self.completar(c)
+        self.assertEqual([t.esta_desbloqueada_para(self.aluno) for t in self.cadeia], [True, True, False, False])
+
+        self.completar(b)
+        with self.assertNumQueries(3):
+            self.assertTrue(d.esta_desbloqueada_para(self.aluno))
+
+    def test_ciclo_antigo_fica_bloqueado(self):
+        a, b, c, d = self.cadeia
+        Trilha.objects.filter(pk=a.pk).update(trilha_anterior=d)  # dado antigo, sem passar pelo save
+        a.refresh_from_db()
+        self.assertFalse(a.esta_desbloqueada_para(self.aluno))
+        with self.assertRaises(ValidationError):
+            GrafoTrilhas.da_sala(self.sala.id).ordem_topologica()
+
+
+class DetalheTrilhaTests(TestCase):
+    def setUp(self):
+        self.aluno = get_user_model().objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', descricao='Descrição', criador=self.aluno)
+        self.sala.participantes.create(usuario=self.aluno, tipo_na_sala='aluno')
+        self.trilha = Trilha.objects.create(sala=self.sala, nome='Trilha', descricao='d')
+        self.adicionar_modulo(3)
+        self.client.force_login(self.aluno)
+
+    def adicionar_modulo(self, n_conteudos):
+        modulo = Modulo.objects.create(trilha=self.trilha, titulo='Módulo', ordem=Modulo.objects.count())
+        conteudos = [ConteudoModulo.objects.create(modulo=modulo, titulo=f'C{i}', tipo='texto', ordem=i) for i in range(n_conteudos)]
+        VisualizacaoConteudo.objects.create(usuario=self.aluno, conteudo=conteudos[0], completo=True)
+        if n_conteudos > 1:
+            VisualizacaoConteudo.objects.create(usuario=self.aluno, conteudo=conteudos[1])
+
+    def test_status_e_progresso(self):
+        response = self.client.get(reverse('cursos:detalhe_trilha', args=[self.trilha.id]))
+        self.assertEqual(response.status_code, 200)
+        item = response.context['modulos_com_progresso'][0]
+        self.assertEqual([(c['visualizado'], c['completo']) for c in item['conteudos']],
+                         [(True, True), (True, False), (False, False)])
+        self.assertEqual((item['completos'], item['total'], item['progresso']), (1, 3, 33.3))
+        self.trilha.refresh_from_db()
+        self.assertEqual(response.context['progresso_geral'], self.trilha.progresso_usuario(self.aluno))
+
+    def test_consultas_nao_crescem_com_conteudos(self):
+        url = reverse('cursos:detalhe_trilha', args=[self.trilha.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as antes:
+            self.client.get(url)
+        self.adicionar_modulo(6)
+        self.adicionar_modulo(2)
+        with CaptureQueriesContext(connection) as depois:
+            self.client.get(url)
+        self.assertEqual(len(antes), len(depois))
+
+
+class NavegacaoConteudoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.aluno = get_user_model().objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', descricao='Descrição', criador=self.aluno)
+        self.sala.participantes.create(usuario=self.aluno, tipo_na_sala='aluno')
+        self.trilha = Trilha.objects.create(sala=self.sala, nome='Trilha', descricao='d')
+        self.m1 = Modulo.objects.create(trilha=self.trilha, titulo='M1', ordem=0)
+        self.m2 = Modulo.objects.create(trilha=self.trilha, titulo='M2', ordem=1)
+        self.c = [ConteudoModulo.objects.create(modulo=self.m1, titulo=f'A{i}', tipo='texto', ordem=i) for i in range(3)]
+        self.c += [ConteudoModulo.objects.create(modulo=self.m2, titulo=f'B{i}', tipo='texto', ordem=i) for i in range(2)]
+        self.client.force_login(self.aluno)
+
+    def url(self, conteudo):
+        return reverse('cursos:visualizar_conteudo', args=[conteudo.id])
+
+    def navegacao(self, trilha=None):
+        # a versão do índice vem da trilha carregada, como na view
+        return NavegacaoTrilha.da_trilha(Trilha.objects.get(pk=(trilha or self.trilha).pk))
+
+    def test_indice(self):
+        nav = self.navegacao()
+        self.assertEqual([i['titulo'] for i in nav.do_modulo(self.m1.id)], ['A0', 'A1', 'A2'])
+        self.assertEqual(nav.posicao_no_modulo(self.c[4].id), 2)
+        self.assertIsNone(nav.proximo(self.c[2].id))
+        self.assertEqual(nav.proximo(self.c[2].id, mesmo_modulo=False)['id'], self.c[3].id)
+        self.assertIsNone(nav.anterior(self.c[3].id))
+        trilha = Trilha.objects.get(pk=self.trilha.pk)
+        with self.assertNumQueries(0):
+            NavegacaoTrilha.da_trilha(trilha)
+
+    def test_pagina_e_sidebar(self):
+        VisualizacaoConteudo.objects.create(usuario=self.aluno, conteudo=self.c[0], completo=True)
+        response = self.client.get(self.url(self.c[1]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['posicao_atual'], 2)
+        self.assertEqual(response.context['anterior']['id'], self.c[0].id)
+        self.assertEqual(response.context['proximo']['id'], self.c[2].id)
+        self.assertEqual([(i['visualizado'], i['completo']) for i in response.context['conteudos_modulo']],
+                         [(True, True), (True, False), (False, False)])
+
+        response = self.client.post(self.url(self.c[1]), {'marcar_incompleto': '1'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_completar_avanca_para_o_proximo_modulo(self):
+        response = self.client.post(self.url(self.c[2]), {'marcar_completo': '1'})
+        self.assertRedirects(response, self.url(self.c[3]))
+        response = self.client.post(self.url(self.c[4]), {'marcar_completo': '1'})
+        self.assertRedirects(response, reverse('cursos:detalhe_trilha', args=[self.trilha.id]), fetch_redirect_response=False)
+
+    def test_indice_invalidado_ao_mudar_conteudos(self):
+        self.navegacao()
+        novo = ConteudoModulo.objects.create(modulo=self.m1, titulo='A3', tipo='texto', ordem=3)
+        self.assertEqual(self.navegacao().proximo(self.c[2].id)['id'], novo.id)
+        self.m2.delete()
+        self.assertIsNone(self.navegacao().proximo(novo.id, mesmo_modulo=False))
+
+    def test_indice_de_outro_worker_nao_e_servido(self):
+        self.navegacao()
+        # outro worker exclui o próximo conteúdo: o cache deste não é apagado,
+        # mas a versão da trilha no banco muda e a chave antiga deixa de valer
+        with mock.patch.object(cache, 'delete'):
+            self.c[1].delete()
+        self.assertEqual(self.navegacao().proximo(self.c[0].id)['id'], self.c[2].id)
+        response = self.client.post(self.url(self.c[0]), {'marcar_completo': '1'})
+        self.assertRedirects(response, self.url(self.c[2]))
+
+    def test_conteudo_movido_sai_da_trilha_de_origem(self):
+        outra = Trilha.objects.create(sala=self.sala, nome='Outra', descricao='d')
+        destino = Modulo.objects.create(trilha=outra, titulo='Destino')
+        self.navegacao()
+        self.navegacao(outra)
+        self.c[2].modulo = destino
+        self.c[2].save()
+        self.assertNotIn(self.c[2].id, self.navegacao())
+        self.assertIn(self.c[2].id, self.navegacao(outra))
+
+        self.m2.trilha = outra
+        self.m2.save()
+        self.assertNotIn(self.c[3].id, self.navegacao())
+        self.assertIn(self.c[3].id, self.navegacao(outra))
+
+    def test_consultas_nao_crescem_com_conteudos(self):
+        self.client.get(self.url(self.c[0]))
+        with CaptureQueriesContext(connection) as antes:
+            self.client.get(self.url(self.c[0]))
+        for i in range(3, 10):
+            ConteudoModulo.objects.create(modulo=self.m1, titulo=f'A{i}', tipo='texto', ordem=i)
+        self.client.get(self.url(self.c[0]))
+        with CaptureQueriesContext(connection) as depois:
+            self.client.get(self.url(self.c[0]))
+        self.assertEqual(len(antes), len(depois))
+
+
+class HeartbeatConteudoTests(TestCase):
+    def setUp(self):
+        self.aluno = get_user_model().objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', descricao='Descrição', criador=self.aluno)
+        trilha = Trilha.objects.create(sala=self.sala, nome='Trilha', descricao='d')
+        modulo = Modulo.objects.create(trilha=trilha, titulo='Módulo')
+        self.conteudos = [ConteudoModulo.objects.create(modulo=modulo, titulo=f'C{i}', tipo='texto', ordem=i) for i in range(3)]
+        for conteudo in self.conteudos:
+            VisualizacaoConteudo.objects.create(usuario=self.aluno, conteudo=conteudo)
+        engajamento.buffer.gravar()  # descarta sobras de outros testes
+
+    def tempos(self):
+        return list(VisualizacaoConteudo.objects.order_by('conteudo__ordem').values_list('tempo_gasto_segundos', flat=True))
+
+    def test_batidas_acumulam_e_gravam_em_lote(self):
+        self.client.force_login(self.aluno)
+        url = reverse('cursos:heartbeat_conteudo', args=[self.conteudos[0].id])
+        for _ in range(3):
+            response = self.client.post(url, {'segundos': 30})
+            self.assertEqual(response.status_code, 204)
+        self.client.post(reverse('cursos:heartbeat_conteudo', args=[self.conteudos[1].id]), {'segundos': 10_000})
+        self.assertEqual(self.tempos(), [0, 0, 0])
+
+        # uma UPDATE por linha, independente do número de batidas
+        with self.assertNumQueries(2 + 2):  # savepoint + 2 updates + release
+            self.assertEqual(engajamento.buffer.gravar(), 2)
+        self.assertEqual(self.tempos(), [90, engajamento.MAX_SEGUNDOS_POR_BATIDA, 0])
+
+    def test_so_aceita_post(self):
+        self.client.force_login(self.aluno)
+        url = reverse('cursos:heartbeat_conteudo', args=[self.conteudos[0].id])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, {'segundos': 'x'}).status_code, 400)
+
+    def test_grava_ao_passar_do_limite_de_linhas(self):
+        buffer = engajamento.BufferTempo()
+        with mock.patch.object(engajamento, 'FLUSH_MAX_LINHAS', 2):
+            buffer.registrar(self.aluno.id, self.conteudos[0].id, 5)
+            self.assertEqual(self.tempos(), [0, 0, 0])
+            buffer.registrar(self.aluno.id, self.conteudos[2].id, 7)
+        self.assertEqual(self.tempos(), [5, 0, 7])
+        self.assertEqual(buffer.pendentes(), {})
+
+    def test_timer_grava_sem_novas_batidas(self):
+        buffer = engajamento.BufferTempo()
+        gravou = threading.Event()
+        with mock.patch.object(engajamento, 'FLUSH_SEGUNDOS', 0.05), \
+                mock.patch.object(buffer, 'gravar', side_effect=lambda: gravou.set()):
+            buffer.registrar(self.aluno.id, self.conteudos[0].id, 5)
+            self.assertTrue(gravou.wait(2))
+
+    def test_chave_sem_visualizacao_passa_a_ser_ignorada(self):
+        buffer = engajamento.BufferTempo()
+        buffer.registrar(self.aluno.id, self.conteudos[0].id, 5)
+        buffer.registrar(self.aluno.id, 999_999, 5)
+        with self.assertLogs('cursos.engajamento', 'INFO') as logs:
+            self.assertEqual(buffer.gravar(), 1)
+        self.assertIn('1 de 2', logs.output[0])
+        self.assertFalse(buffer.registrar(self.aluno.id, 999_999, 5))
+        self.assertTrue(buffer.registrar(self.aluno.id, self.conteudos[0].id, 5))
+        buffer.gravar()
+        self.assertEqual(self.tempos(), [10, 0, 0])
+
+
+class AnalyticsConteudoTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.sala = Sala.objects.create(nome='Sala', descricao='Descrição', criador=self.professor)
+        self.sala.participantes.create(usuario=self.professor, tipo_na_sala='professor')
+        self.trilha = Trilha.objects.create(sala=self.sala, nome='Trilha', descricao='d')
+        self.modulo = Modulo.objects.create(trilha=self.trilha, titulo='Módulo')
+        self.conteudos = [ConteudoModulo.objects.create(modulo=self.modulo, titulo=f'C{i}', tipo='texto', ordem=i) for i in range(3)]
+
+        # um aluno conclui o módulo; dois param no C1 e um no C0
+        for i, vistos in enumerate([3, 2, 2, 1]):
+            aluno = Usuario.objects.create_user(email=f'aluno{i}@test.com', password='test123', tipo_usuario='aluno')
+            self.sala.participantes.create(usuario=aluno, tipo_na_sala='aluno')
+            for conteudo in self.conteudos[:vistos]:
+                v = VisualizacaoConteudo.objects.create(usuario=aluno, conteudo=conteudo, tempo_gasto_segundos=60 * (i + 1))
+                if vistos == 3:
+                    v.marcar_completo()
+
+    def test_agrega_conteudos_e_modulo_do_dia(self):
+        call_command('agregar_analytics', '--completo', stdout=StringIO())
+        hoje = timezone.localdate()
+
+        primeiro = EstatisticaConteudoDiaria.objects.get(conteudo=self.conteudos[0], dia=hoje)
+        self.assertEqual((primeiro.visualizacoes, primeiro.conclusoes, primeiro.tempo_mediano_segundos), (4, 1, 150))
+
+        modulo = EstatisticaModuloDiaria.objects.get(modulo=self.modulo, dia=hoje)
+        self.assertEqual((modulo.visualizacoes, modulo.conclusoes, modulo.alunos_ativos), (8, 3, 4))
+        self.assertEqual(modulo.tempo_mediano_segundos, 240)
+        self.assertEqual((modulo.abandonos, modulo.abandono_conteudo), (3, self.conteudos[1]))
+
+    def test_incremental_mantem_dias_anteriores(self):
+        anteontem = timezone.localdate() - datetime.timedelta(days=2)
+        EstatisticaModuloDiaria.objects.create(modulo=self.modulo, dia=anteontem, visualizacoes=5)
+        call_command('agregar_analytics', '--dias', '1', stdout=StringIO())
+        call_command('agregar_analytics', stdout=StringIO())  # refaz do último dia agregado (hoje)
+        self.assertEqual(EstatisticaModuloDiaria.objects.get(dia=anteontem).visualizacoes, 5)
+        self.assertEqual(EstatisticaModuloDiaria.objects.get(dia=timezone.localdate()).visualizacoes, 8)
+
+    def test_relatorio_do_professor_le_so_os_resumos(self):
+        call_command('agregar_analytics', '--completo', stdout=StringIO())
+        VisualizacaoConteudo.objects.all().delete()
+
+        self.client.force_login(self.professor)
+        response = self.client.get(reverse('cursos:detalhe_trilha', args=[self.trilha.id]))
+        item = response.context['modulos_com_progresso'][0]
+        self.assertEqual((item['relatorio']['visualizacoes'], item['relatorio']['conclusoes']), (8, 3))
+        self.assertEqual(item['relatorio']['abandono_conteudo'], self.conteudos[1])
+        self.assertEqual([c['relatorio']['visualizacoes'] for c in item['conteudos']], [4, 3, 1])
+        self.assertContains(response, 'maior abandono em')
+
+    def test_aluno_nao_ve_relatorio(self):
+        aluno = get_user_model().objects.get(email='aluno1@test.com')
+        self.client.force_login(aluno)
+        response = self.client.get(reverse('cursos:detalhe_trilha', args=[self.trilha.id]))
+        self.assertIsNone(response.context['modulos_com_progresso'][0]['relatorio'])
+        self.assertNotContains(response, 'maior abandono em')
@@ -19,6 +19,7 @@ urlpatterns = [
     path('trilhas/', views.lista_trilhas, name='lista_trilhas'),
     path('trilha/<int:trilha_id>/', views.detalhe_trilha, name='detalhe_trilha'),
     path('conteudo/<int:conteudo_id>/', views.visualizar_conteudo, name='visualizar_conteudo'),
+    path('conteudo/<int:conteudo_id>/heartbeat/', views.heartbeat_conteudo, name='heartbeat_conteudo'),
     
     # Criação (professores)
     path('sala/<int:sala_id>/criar-trilha/', views.criar_trilha, name='criar_trilha'),
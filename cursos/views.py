@@ -2,12 +2,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Q, Prefetch
-from django.http import JsonResponse, HttpResponseForbidden
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed,
+)
 from usuarios.models import Sala, ParticipacaoSala, Missao
+from usuarios.acesso import participacao_na_sala
+from . import engajamento
+from .analytics import relatorio_trilha
 from .models import (
-    Trilha, Modulo, ConteudoModulo, VisualizacaoConteudo,
-    Aula, Progresso  # Mantidos para compatibilidade
+    Trilha, Modulo, ConteudoModulo, VisualizacaoConteudo, NavegacaoTrilha, percentual_progresso,
+    Aula  # Mantido para compatibilidade
 )
 
 # ==============================
@@ -25,12 +31,9 @@ def detalhe_curso(request, sala_id):
     sala = get_object_or_404(Sala, id=sala_id, participantes__usuario=request.user)
     aulas = sala.aulas.order_by('ordem')
     
-    progresso, created = Progresso.objects.get_or_create(aluno=request.user, sala=sala)
     percentual = (
         aulas.filter(concluida_por=request.user).count() / aulas.count() * 100
     ) if aulas.count() else 0
-    progresso.percentual = percentual
-    progresso.save()
     
     return render(request, 'cursos/detalhe_curso.html', {
         'sala': sala,
@@ -61,24 +64,25 @@ def lista_trilhas(request):
     salas_ids = participacoes.values_list('sala_id', flat=True)
     
     # Buscar trilhas dessas salas
-    trilhas = Trilha.objects.filter(
-        sala_id__in=salas_ids
-    ).select_related('sala', 'trilha_anterior').prefetch_related(
-        Prefetch('modulos', queryset=Modulo.objects.prefetch_related('conteudos'))
-    ).order_by('sala__nome', 'ordem')
+    trilhas = list(
+        Trilha.objects.filter(sala_id__in=salas_ids)
+        .select_related('sala', 'trilha_anterior')
+        .annotate(num_modulos=Count('modulos'))
+        .order_by('sala__nome', 'ordem')
+    )
+    
+    # Progresso de todas as trilhas (e das anteriores) em duas consultas;
+    # o desbloqueio sai do mesmo mapa, seguindo as cadeias inteiras
+    progresso = Trilha.progresso_em_lote(trilhas, request.user)
+    desbloqueio = Trilha.desbloqueio_em_lote(trilhas, request.user, progresso)
     
-    # Calcular progresso e status de cada trilha
     trilhas_com_progresso = []
     for trilha in trilhas:
-        total_conteudos = trilha.total_conteudos()
-        conteudos_completos = trilha.conteudos_completos_usuario(request.user)
-        progresso = trilha.progresso_usuario(request.user)
-        desbloqueada = trilha.esta_desbloqueada_para(request.user)
-        
+        total_conteudos, conteudos_completos = progresso[trilha.id]
         trilhas_com_progresso.append({
             'trilha': trilha,
-            'progresso': progresso,
-            'desbloqueada': desbloqueada,
+            'progresso': percentual_progresso(total_conteudos, conteudos_completos),
+            'desbloqueada': desbloqueio[trilha.id],
             'total_conteudos': total_conteudos,
             'completos': conteudos_completos,
         })
@@ -100,11 +104,7 @@ def detalhe_trilha(request, trilha_id):
     )
     
     # Verificar acesso à sala
-    participacao = ParticipacaoSala.objects.filter(
-        usuario=request.user,
-        sala=trilha.sala
-    ).first()
-    
+    participacao = participacao_na_sala(request, trilha.sala_id)
     if not participacao:
         messages.error(request, 'Você não tem acesso a esta trilha.')
         return redirect('cursos:lista_trilhas')
@@ -122,50 +122,72 @@ def detalhe_trilha(request, trilha_id):
         
         messages.warning(request, ' e '.join(mensagem_bloqueio) + '.')
     
-    # Buscar módulos com suas informações
-    modulos = trilha.modulos.prefetch_related('conteudos', 'missoes').all()
+    # Módulos, conteúdos e missões em três consultas
+    modulos = trilha.modulos.prefetch_related('conteudos', 'missoes')
+    
+    # Visualizações do usuário na trilha inteira, de uma vez
+    visualizacoes = {
+        v.conteudo_id: v
+        for v in VisualizacaoConteudo.objects.filter(
+            usuario=request.user, conteudo__modulo__trilha=trilha
+        ).only('conteudo_id', 'completo', 'data_visualizacao')
+    }
+    
+    # Relatório da turma (só professor), lido das estatísticas diárias
+    relatorio = relatorio_trilha(trilha) if participacao.is_professor else None
     
     modulos_com_progresso = []
+    total_trilha = completos_trilha = 0
     for modulo in modulos:
         conteudos_info = []
         
         for conteudo in modulo.conteudos.all():
-            visualizacao = VisualizacaoConteudo.objects.filter(
-                usuario=request.user,
-                conteudo=conteudo
-            ).first()
+            visualizacao = visualizacoes.get(conteudo.id)
             
             conteudos_info.append({
                 'conteudo': conteudo,
                 'visualizado': visualizacao is not None,
                 'completo': visualizacao.completo if visualizacao else False,
                 'data_visualizacao': visualizacao.data_visualizacao if visualizacao else None,
+                'relatorio': relatorio['conteudos'].get(conteudo.id) if relatorio else None,
             })
         
         # Calcular progresso do módulo
         total = len(conteudos_info)
         completos = sum(1 for c in conteudos_info if c['completo'])
-        progresso = round((completos / total * 100), 1) if total > 0 else 0
+        total_trilha += total
+        completos_trilha += completos
+        missoes = list(modulo.missoes.all())
+        
+        relatorio_modulo = relatorio['modulos'].get(modulo.id) if relatorio else None
+        if relatorio_modulo and relatorio_modulo['abandono_conteudo_id']:
+            relatorio_modulo['abandono_conteudo'] = next(
+                (c['conteudo'] for c in conteudos_info if c['conteudo'].id == relatorio_modulo['abandono_conteudo_id']),
+                None,
+            )
         
         modulos_com_progresso.append({
             'modulo': modulo,
             'conteudos': conteudos_info,
-            'progresso': progresso,
+            'progresso': percentual_progresso(total, completos),
             'total': total,
             'completos': completos,
-            'missoes': modulo.missoes.all(),
+            'missoes': missoes,
+            'total_missoes': len(missoes),
+            'relatorio': relatorio_modulo,
         })
     
-    # Calcular progresso geral da trilha
-    progresso_geral = trilha.progresso_usuario(request.user)
+    # Progresso geral da trilha, somado dos módulos
+    progresso_geral = percentual_progresso(total_trilha, completos_trilha)
     
     context = {
         'trilha': trilha,
         'modulos_com_progresso': modulos_com_progresso,
         'desbloqueada': desbloqueada,
         'progresso_geral': progresso_geral,
-        'is_professor': participacao.tipo_na_sala == 'professor',
+        'is_professor': participacao.is_professor,
         'participacao': participacao,
+        'relatorio_desde': relatorio['desde'] if relatorio else None,
     }
     
     return render(request, 'cursos/detalhe_trilha.html', context)
@@ -185,11 +207,7 @@ def visualizar_conteudo(request, conteudo_id):
     trilha = conteudo.modulo.trilha
     
     # Verificar acesso
-    participacao = ParticipacaoSala.objects.filter(
-        usuario=request.user,
-        sala=trilha.sala
-    ).first()
-    
+    participacao = participacao_na_sala(request, trilha.sala_id)
     if not participacao:
         messages.error(request, 'Acesso negado.')
         return redirect('cursos:lista_trilhas')
@@ -205,47 +223,44 @@ def visualizar_conteudo(request, conteudo_id):
         conteudo=conteudo
     )
     
+    # Ordem dos conteúdos da trilha (cache pela versão da trilha). Se o índice
+    # veio montado antes de uma mudança concorrente, relê a versão da trilha
+    navegacao = NavegacaoTrilha.da_trilha(trilha)
+    if conteudo.id not in navegacao:
+        trilha.refresh_from_db(fields=['atualizado_em'])
+        navegacao = NavegacaoTrilha.da_trilha(trilha)
+    
     # Processar POST (marcar como completo/incompleto)
     if request.method == 'POST':
         if 'marcar_completo' in request.POST:
-            visualizacao.completo = True
-            visualizacao.save()
+            visualizacao.marcar_completo()
             messages.success(request, '✓ Conteúdo marcado como completo!')
             
-            # Redirecionar para próximo conteúdo
-            proximo = conteudo.proximo_conteudo()
+            # Redirecionar para o próximo conteúdo (ou o primeiro do próximo módulo)
+            proximo = navegacao.proximo(conteudo.id, mesmo_modulo=False)
             if proximo:
-                return redirect('cursos:visualizar_conteudo', conteudo_id=proximo.id)
+                if proximo['modulo_id'] != conteudo.modulo_id:
+                    messages.info(request, f'Próximo módulo: {navegacao.modulos[proximo["modulo_id"]]}')
+                return redirect('cursos:visualizar_conteudo', conteudo_id=proximo['id'])
             else:
-                # Verificar se tem próximo módulo
-                proximo_modulo = Modulo.objects.filter(
-                    trilha=trilha,
-                    ordem__gt=conteudo.modulo.ordem
-                ).first()
-                
-                if proximo_modulo and proximo_modulo.conteudos.exists():
-                    primeiro_conteudo = proximo_modulo.conteudos.first()
-                    messages.info(request, f'Próximo módulo: {proximo_modulo.titulo}')
-                    return redirect('cursos:visualizar_conteudo', conteudo_id=primeiro_conteudo.id)
-                else:
-                    messages.success(request, '🎉 Parabéns! Você completou toda a trilha!')
-                    return redirect('cursos:detalhe_trilha', trilha_id=trilha.id)
+                messages.success(request, '🎉 Parabéns! Você completou toda a trilha!')
+                return redirect('cursos:detalhe_trilha', trilha_id=trilha.id)
         
         elif 'marcar_incompleto' in request.POST:
-            visualizacao.completo = False
-            visualizacao.save()
+            visualizacao.marcar_completo(False)
             messages.info(request, 'Conteúdo marcado como incompleto.')
     
-    # Buscar todos os conteúdos do módulo para navegação
-    conteudos_modulo = conteudo.modulo.conteudos.all()
-    
-    # Identificar posição atual
-    posicao_atual = list(conteudos_modulo).index(conteudo) + 1
-    total_conteudos = conteudos_modulo.count()
-    
-    # Conteúdo anterior e próximo
-    anterior = conteudo.conteudo_anterior()
-    proximo = conteudo.proximo_conteudo()
+    # Conteúdos do módulo para a barra lateral, com o status do usuário
+    itens_modulo = navegacao.do_modulo(conteudo.modulo_id)
+    status = dict(
+        VisualizacaoConteudo.objects.filter(
+            usuario=request.user, conteudo_id__in=[item['id'] for item in itens_modulo]
+        ).values_list('conteudo_id', 'completo')
+    )
+    conteudos_modulo = [
+        {**item, 'visualizado': item['id'] in status, 'completo': status.get(item['id'], False)}
+        for item in itens_modulo
+    ]
     
     context = {
         'conteudo': conteudo,
@@ -253,15 +268,35 @@ def visualizar_conteudo(request, conteudo_id):
         'modulo': conteudo.modulo,
         'visualizacao': visualizacao,
         'conteudos_modulo': conteudos_modulo,
-        'posicao_atual': posicao_atual,
-        'total_conteudos': total_conteudos,
-        'anterior': anterior,
-        'proximo': proximo,
+        'posicao_atual': navegacao.posicao_no_modulo(conteudo.id),
+        'total_conteudos': len(itens_modulo),
+        'anterior': navegacao.anterior(conteudo.id),
+        'proximo': navegacao.proximo(conteudo.id),
+        'heartbeat_segundos': engajamento.HEARTBEAT_SEGUNDOS,
     }
     
     return render(request, 'cursos/visualizar_conteudo.html', context)
 
 
+@login_required
+def heartbeat_conteudo(request, conteudo_id):
+    """
+    Batida enviada pela página do conteúdo enquanto está aberta e visível.
+    Só acumula no buffer em memória (ver cursos/engajamento.py); a gravação
+    é em lote. Sem consulta ao banco aqui: a UPDATE do lote só atinge a
+    visualização do próprio usuário, criada ao abrir a página, e o buffer
+    passa a descartar as chaves que não atingiram nenhuma linha.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        segundos = int(request.POST.get('segundos', 0))
+    except ValueError:
+        return HttpResponseBadRequest('segundos inválido')
+    engajamento.buffer.registrar(request.user.id, conteudo_id, segundos)
+    return HttpResponse(status=204)
+
+
 @login_required
 def criar_trilha(request, sala_id):
     """
@@ -275,11 +310,7 @@ def criar_trilha(request, sala_id):
         return HttpResponseForbidden('Esta ação só é permitida dentro do contexto de uma sala específica.')
 
     # Verificar se é professor ATUALMENTE
-    is_professor = ParticipacaoSala.objects.filter(
-        usuario=request.user,
-        sala=sala,
-        tipo_na_sala='professor'
-    ).exists()
+    is_professor = participacao_na_sala(request, sala.id, papel='professor') is not None
 
     if not is_professor:
         messages.error(request, 'Apenas professores desta sala podem criar trilhas.')
@@ -299,15 +330,19 @@ def criar_trilha(request, sala_id):
         # Criar trilha
         ordem_atual = Trilha.objects.filter(sala=sala).count()
         
-        trilha = Trilha.objects.create(
-            sala=sala,
-            nome=nome,
-            descricao=descricao,
-            pontos_necessarios=pontos_necessarios,
-            trilha_anterior_id=trilha_anterior_id,
-            ordem=ordem_atual,
-            criador=request.user
-        )
+        try:
+            trilha = Trilha.objects.create(
+                sala=sala,
+                nome=nome,
+                descricao=descricao,
+                pontos_necessarios=pontos_necessarios,
+                trilha_anterior_id=trilha_anterior_id,
+                ordem=ordem_atual,
+                criador=request.user
+            )
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return redirect('usuarios:sala_virtual', sala_id=sala_id)
         
         messages.success(request, f'✓ Trilha "{nome}" criada com sucesso!')
         return redirect('cursos:detalhe_trilha', trilha_id=trilha.id)
@@ -325,11 +360,7 @@ def criar_modulo(request, trilha_id):
         return HttpResponseForbidden('Esta ação só é permitida dentro do contexto de uma sala específica.')
 
     # Verificar permissão (professor ativo)
-    is_professor = ParticipacaoSala.objects.filter(
-        usuario=request.user,
-        sala=trilha.sala,
-        tipo_na_sala='professor'
-    ).exists()
+    is_professor = participacao_na_sala(request, trilha.sala_id, papel='professor') is not None
 
     if not is_professor:
         messages.error(request, 'Você não é mais professor nesta sala. A trilha está em modo somente leitura.')
@@ -369,11 +400,7 @@ def adicionar_conteudo(request, modulo_id):
         return HttpResponseForbidden('Esta ação só é permitida dentro do contexto de uma sala específica.')
 
     # Verificar permissão (professor ativo)
-    is_professor = ParticipacaoSala.objects.filter(
-        usuario=request.user,
-        sala=trilha.sala,
-        tipo_na_sala='professor'
-    ).exists()
+    is_professor = participacao_na_sala(request, trilha.sala_id, papel='professor') is not None
 
     if not is_professor:
         messages.error(request, 'Você não é mais professor nesta sala. A trilha está em modo somente leitura.')
@@ -420,11 +447,7 @@ def excluir_conteudo(request, conteudo_id):
         return HttpResponseForbidden('Esta ação só é permitida dentro do contexto de uma sala específica.')
 
     # Verificar permissão (professor ativo)
-    is_professor = ParticipacaoSala.objects.filter(
-        usuario=request.user,
-        sala=trilha.sala,
-        tipo_na_sala='professor'
-    ).exists()
+    is_professor = participacao_na_sala(request, trilha.sala_id, papel='professor') is not None
 
     if not is_professor:
         messages.error(request, 'Você não é mais professor nesta sala. A trilha está em modo somente leitura.')
@@ -1,5 +1,5 @@
 // chat_missao.js
-// Depende das variáveis globais: MISSÃO_CHAT_MESSAGES_URL, CURRENT_USER_ID
+// Depende das variáveis globais: MISSÃO_CHAT_MESSAGES_URL, MISSAO_CHAT_STREAM_URL, CURRENT_USER_ID
 
 function getCookie(name) {
     const value = `; ${document.cookie}`;
@@ -7,15 +7,31 @@ function getCookie(name) {
     if (parts.length === 2) return parts.pop().split(';').shift();
 }
 
-function renderMessages(container, messages) {
-    container.innerHTML = '';
+// id da última mensagem recebida (cursor enviado como ?after_id=)
+let lastMessageId = null;
+let fetchEmAndamento = false;
+
+function renderEmpty(container) {
+    const empty = document.createElement('div');
+    empty.id = 'missao-chat-empty';
+    empty.className = 'text-center text-muted py-5';
+    empty.innerHTML = '<i class="bi bi-chat-dots fs-4 opacity-50"></i><p class="mt-2">Nenhuma mensagem ainda</p>';
+    container.appendChild(empty);
+}
+
+function appendMessages(container, messages) {
+    const primeiraCarga = lastMessageId === null;
+    // ignora o que já foi exibido (stream e fetch podem entregar a mesma mensagem)
+    messages = messages.filter(m => primeiraCarga || m.id > lastMessageId);
     if (messages.length === 0) {
-        const empty = document.createElement('div');
-        empty.className = 'text-center text-muted py-5';
-        empty.innerHTML = '<i class="bi bi-chat-dots fs-4 opacity-50"></i><p class="mt-2">Nenhuma mensagem ainda</p>';
-        container.appendChild(empty);
+        if (primeiraCarga) renderEmpty(container);
         return;
     }
+    lastMessageId = messages[messages.length - 1].id;
+    const empty = document.getElementById('missao-chat-empty');
+    if (empty) empty.remove();
+    // só rola para baixo se o usuário já estava no fim da conversa
+    const estavaNoFim = container.scrollHeight - container.scrollTop - container.clientHeight < 40;
     messages.forEach(m => {
         const item = document.createElement('div');
         item.className = 'chat-message mb-3';
@@ -84,18 +100,58 @@ function renderMessages(container, messages) {
         item.appendChild(bubble);
         container.appendChild(item);
     });
-    // rolar para baixo
-    container.scrollTop = container.scrollHeight;
+    if (estavaNoFim || primeiraCarga) {
+        container.scrollTop = container.scrollHeight;
+    }
+}
+
+let pollingTimer = null;
+
+function startPolling(container) {
+    if (pollingTimer) return;
+    pollingTimer = setInterval(() => fetchMessages(container), 3000);
+}
+
+// Abre o stream SSE a partir do cursor atual. Se o navegador não suportar
+// EventSource ou o servidor responder sem stream, volta para o polling.
+function startStream(container) {
+    if (!window.EventSource || typeof MISSAO_CHAT_STREAM_URL === 'undefined') {
+        startPolling(container);
+        return;
+    }
+    let url = MISSAO_CHAT_STREAM_URL;
+    if (lastMessageId !== null) {
+        url += `?after_id=${lastMessageId}`;
+    }
+    const source = new EventSource(url);
+    source.addEventListener('mensagem', (event) => {
+        appendMessages(container, [JSON.parse(event.data)]);
+    });
+    source.onerror = () => {
+        // CLOSED = servidor recusou o stream; CONNECTING = o navegador reconecta sozinho
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling(container);
+        }
+    };
 }
 
 async function fetchMessages(container) {
+    if (fetchEmAndamento) return;
+    fetchEmAndamento = true;
     try {
-        const res = await fetch(MISSAO_CHAT_MESSAGES_URL, { credentials: 'same-origin' });
+        let url = MISSAO_CHAT_MESSAGES_URL;
+        if (lastMessageId !== null) {
+            url += `?after_id=${lastMessageId}`;
+        }
+        const res = await fetch(url, { credentials: 'same-origin' });
         if (!res.ok) return;
         const data = await res.json();
-        renderMessages(container, data);
+        appendMessages(container, data.mensagens);
+        lastMessageId = Math.max(lastMessageId || 0, data.cursor);
     } catch (err) {
         console.error('Erro ao buscar mensagens', err);
+    } finally {
+        fetchEmAndamento = false;
     }
 }
 
@@ -103,10 +159,8 @@ function initMissaoChat() {
     const container = document.getElementById('missao-chat-messages');
     if (!container) return;
 
-    // buscar mensagens imediatamente
-    fetchMessages(container);
-    // polling
-    setInterval(() => fetchMessages(container), 3000);
+    // buscar o histórico e depois receber só as novas via stream (ou polling)
+    fetchMessages(container).then(() => startStream(container));
 }
 
 // Automatic init when script é carregado (espera que variáveis globais existam)
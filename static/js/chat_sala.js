@@ -1,5 +1,5 @@
 // chat_sala.js
-// Depende das variáveis globais: CHAT_MESSAGES_URL, CURRENT_USER_ID, CURRENT_USER_NAME
+// Depende das variáveis globais: CHAT_MESSAGES_URL, CHAT_STREAM_URL, CURRENT_USER_ID, CURRENT_USER_NAME
 
 function getCookie(name) {
     const value = `; ${document.cookie}`;
@@ -7,8 +7,18 @@ function getCookie(name) {
     if (parts.length === 2) return parts.pop().split(';').shift();
 }
 
-function renderMessages(container, messages) {
-    container.innerHTML = '';
+// id da última mensagem recebida (cursor enviado como ?after_id=)
+let lastMessageId = null;
+let fetchEmAndamento = false;
+
+function appendMessages(container, messages) {
+    const primeiraCarga = lastMessageId === null;
+    // ignora o que já foi exibido (stream e fetch podem entregar a mesma mensagem)
+    messages = messages.filter(m => primeiraCarga || m.id > lastMessageId);
+    if (messages.length === 0) return;
+    lastMessageId = messages[messages.length - 1].id;
+    // só rola para baixo se o usuário já estava no fim da conversa
+    const estavaNoFim = container.scrollHeight - container.scrollTop - container.clientHeight < 40;
     messages.forEach(m => {
         const item = document.createElement('div');
         item.className = 'chat-message mb-2';
@@ -22,18 +32,58 @@ function renderMessages(container, messages) {
         item.appendChild(text);
         container.appendChild(item);
     });
-    // rolar para baixo
-    container.scrollTop = container.scrollHeight;
+    if (estavaNoFim || primeiraCarga) {
+        container.scrollTop = container.scrollHeight;
+    }
+}
+
+let pollingTimer = null;
+
+function startPolling(container) {
+    if (pollingTimer) return;
+    pollingTimer = setInterval(() => fetchMessages(container), 3000);
+}
+
+// Abre o stream SSE a partir do cursor atual. Se o navegador não suportar
+// EventSource ou o servidor responder sem stream, volta para o polling.
+function startStream(container) {
+    if (!window.EventSource || typeof CHAT_STREAM_URL === 'undefined') {
+        startPolling(container);
+        return;
+    }
+    let url = CHAT_STREAM_URL;
+    if (lastMessageId !== null) {
+        url += `?after_id=${lastMessageId}`;
+    }
+    const source = new EventSource(url);
+    source.addEventListener('mensagem', (event) => {
+        appendMessages(container, [JSON.parse(event.data)]);
+    });
+    source.onerror = () => {
+        // CLOSED = servidor recusou o stream; CONNECTING = o navegador reconecta sozinho
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling(container);
+        }
+    };
 }
 
 async function fetchMessages(container) {
+    if (fetchEmAndamento) return;
+    fetchEmAndamento = true;
     try {
-        const res = await fetch(CHAT_MESSAGES_URL, { credentials: 'same-origin' });
+        let url = CHAT_MESSAGES_URL;
+        if (lastMessageId !== null) {
+            url += `?after_id=${lastMessageId}`;
+        }
+        const res = await fetch(url, { credentials: 'same-origin' });
         if (!res.ok) return;
         const data = await res.json();
-        renderMessages(container, data);
+        appendMessages(container, data.mensagens);
+        lastMessageId = Math.max(lastMessageId || 0, data.cursor);
     } catch (err) {
         console.error('Erro ao buscar mensagens', err);
+    } finally {
+        fetchEmAndamento = false;
     }
 }
 
@@ -53,7 +103,7 @@ async function sendMessage(inputEl, container) {
         });
         if (res.status === 201) {
             inputEl.value = '';
-            // recarregar mensagens
+            // buscar apenas as mensagens novas (inclui a enviada)
             await fetchMessages(container);
         } else {
             console.error('Erro ao enviar mensagem', res.status);
@@ -69,10 +119,8 @@ function initSalaChat() {
     const sendBtn = document.getElementById('sala-chat-send');
     if (!container || !input || !sendBtn) return;
 
-    // buscar mensagens imediatamente
-    fetchMessages(container);
-    // polling
-    setInterval(() => fetchMessages(container), 3000);
+    // buscar o histórico e depois receber só as novas via stream (ou polling)
+    fetchMessages(container).then(() => startStream(container));
 
     sendBtn.addEventListener('click', (e) => {
         e.preventDefault();
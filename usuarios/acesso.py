@@ -0,0 +1,84 @@
+# usuarios/acesso.py
+"""
+Controle de acesso às salas.
+
+O papel do usuário em cada sala vem de ``ParticipacaoSala.papeis_do_usuario``
+(cache por usuário), então verificar a participação não consulta o banco
+na maioria das requisições.
+
+Views que recebem ``sala_id`` usam o decorator:
+
+    @login_required
+    @participacao_requerida(papel='professor', mensagem='Apenas professores...')
+    def postar_missao(request, sala_id):
+        request.sala, request.participacao
+
+Views em que a sala vem de outro objeto (missão, trilha, conteúdo) usam
+``participacao_na_sala(request, sala)``.
+"""
+from functools import wraps
+
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+
+from .models import Sala, ParticipacaoSala
+
+
+class PapelNaSala:
+    """Participação do usuário na sala como lida do cache (sem ir ao banco)."""
+
+    def __init__(self, sala_id, tipo_na_sala):
+        self.sala_id = sala_id
+        self.tipo_na_sala = tipo_na_sala
+
+    @property
+    def is_professor(self):
+        return self.tipo_na_sala == 'professor'
+
+    def get_tipo_na_sala_display(self):
+        return dict(ParticipacaoSala.TIPO_CHOICES).get(self.tipo_na_sala, self.tipo_na_sala)
+
+
+def papel_na_sala(usuario, sala_id):
+    """Retorna o ``tipo_na_sala`` do usuário na sala, ou None se não participa."""
+    return ParticipacaoSala.papeis_do_usuario(usuario).get(sala_id)
+
+
+def participacao_na_sala(request, sala, papel=None):
+    """
+    Resolve a participação do usuário logado em ``sala`` (objeto ou id) e a
+    guarda em ``request.participacao``. Retorna None se ele não participa
+    ou não tem o ``papel`` exigido.
+    """
+    sala_id = getattr(sala, 'id', sala)
+    tipo = papel_na_sala(request.user, sala_id)
+    if tipo is None or (papel is not None and tipo != papel):
+        return None
+    request.participacao = PapelNaSala(sala_id, tipo)
+    return request.participacao
+
+
+def participacao_requerida(papel=None, mensagem='Você não tem acesso a esta sala.',
+                           destino='usuarios:pag_principal', json=False):
+    """
+    Decorator para views com ``sala_id``: confere a participação (ou o
+    ``papel``) antes de tocar no banco e anexa ``request.sala`` e
+    ``request.participacao``.
+
+    Sem acesso: responde 403 em JSON (``json=True``) ou exibe ``mensagem`` e
+    redireciona para ``destino``. Um ``destino`` chamável recebe o
+    ``sala_id`` e retorna a URL.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, sala_id, *args, **kwargs):
+            if participacao_na_sala(request, sala_id, papel) is None:
+                if json:
+                    return JsonResponse({'error': mensagem}, status=403)
+                messages.error(request, mensagem)
+                return redirect(destino(sala_id) if callable(destino) else destino)
+            request.sala = get_object_or_404(Sala, id=sala_id)
+            return view(request, sala_id, *args, **kwargs)
+        return wrapper
+    return decorator
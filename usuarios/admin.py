@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from usuarios.models import Usuario, Sala, Missao, AnexoMissao, MensagemMissao, correcaoMissao, ChatMessage
+from django.db.models import Count
+from core.contagem import ContagemEstimadaAdmin
+from usuarios.models import Usuario, Sala, Missao, AnexoMissao, MensagemMissao, correcaoMissao, ChatMessage, RankingSala, PontuacaoDiaria
 
 # Register your models here.
 
@@ -40,10 +42,72 @@ class UsuarioAdminConfig(UserAdmin):
 admin.site.register(Usuario, UsuarioAdminConfig)
 
 # Registrar outros modelos
-admin.site.register(Sala)
-admin.site.register(Missao)
-admin.site.register(AnexoMissao)
-admin.site.register(MensagemMissao)
-admin.site.register(correcaoMissao)
-admin.site.register(ChatMessage)
+# Todas as listagens trazem as FKs usadas no __str__ com select_related;
+# as tabelas que crescem sem limite paginam com contagem estimada.
+class SalaAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'codigo', 'criador', 'total_participantes', 'data_criacao')
+    search_fields = ('nome', 'codigo')
+    list_select_related = ('criador',)
+    raw_id_fields = ('criador',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_participantes=Count('participantes'))
+
+    def total_participantes(self, obj):
+        return obj.num_participantes
+    total_participantes.short_description = 'Participantes'
+    total_participantes.admin_order_field = 'num_participantes'
+
+
+class MissaoAdmin(admin.ModelAdmin):
+    list_display = ('titulo', 'sala', 'pontos', 'data_criacao')
+    list_filter = ('sala',)
+    search_fields = ('titulo', 'sala__nome')
+    list_select_related = ('sala',)
+
+
+class AnexoMissaoAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'missao', 'data_upload')
+    list_select_related = ('missao',)
+    raw_id_fields = ('missao',)
+
+
+class MensagemMissaoAdmin(ContagemEstimadaAdmin, admin.ModelAdmin):
+    list_display = ('__str__', 'tipo', 'data_envio')
+    list_filter = ('tipo',)
+    list_select_related = ('usuario', 'missao')
+    raw_id_fields = ('missao', 'usuario')
+
+
+class CorrecaoMissaoAdmin(admin.ModelAdmin):
+    list_display = ('missao', 'aluno', 'professor', 'pontos_atingidos', 'data_correcao')
+    list_select_related = ('missao', 'aluno', 'professor')
+    raw_id_fields = ('missao', 'aluno', 'professor')
+
+
+class ChatMessageAdmin(ContagemEstimadaAdmin, admin.ModelAdmin):
+    list_display = ('__str__', 'criado_em')
+    list_select_related = ('usuario', 'sala')
+    raw_id_fields = ('sala', 'usuario')
+
+
+class RankingSalaAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'missoes_corrigidas', 'atualizado_em')
+    list_select_related = ('aluno', 'sala')
+    raw_id_fields = ('sala', 'aluno')
+
+
+class PontuacaoDiariaAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'correcoes')
+    list_select_related = ('aluno', 'sala')
+    raw_id_fields = ('sala', 'aluno')
+
+
+admin.site.register(Sala, SalaAdmin)
+admin.site.register(Missao, MissaoAdmin)
+admin.site.register(AnexoMissao, AnexoMissaoAdmin)
+admin.site.register(MensagemMissao, MensagemMissaoAdmin)
+admin.site.register(correcaoMissao, CorrecaoMissaoAdmin)
+admin.site.register(ChatMessage, ChatMessageAdmin)
+admin.site.register(RankingSala, RankingSalaAdmin)
+admin.site.register(PontuacaoDiaria, PontuacaoDiariaAdmin)
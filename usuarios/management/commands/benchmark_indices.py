@@ -0,0 +1,148 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+
+from cursos.models import Trilha, VisualizacaoConteudo
+from usuarios.models import Missao, MensagemMissao, correcaoMissao, ChatMessage
+
+# Índices avaliados: (modelo, nome do índice em Meta.indexes)
+INDICES = [
+    (Missao, 'missao_sala_data_idx'),
+    (MensagemMissao, 'mensagem_missao_cursor_idx'),
+    (MensagemMissao, 'mensagem_missao_entrega_idx'),
+    (correcaoMissao, 'correcao_aluno_missao_idx'),
+    (ChatMessage, 'chat_sala_cursor_idx'),
+    (ChatMessage, 'chat_sala_criado_idx'),
+    (VisualizacaoConteudo, 'visualizacao_completo_idx'),
+]
+
+
+def consultas(amostra):
+    """As consultas quentes das views, com ids tirados do próprio banco."""
+    sala_id, missao_id, aluno_id, trilha_id = (
+        amostra['sala'], amostra['missao'], amostra['aluno'], amostra['trilha']
+    )
+    return [
+        ('chat_sala_incremental',
+         ChatMessage.objects.filter(sala_id=sala_id, id__gt=amostra['cursor_chat']).order_by('id')[:100]),
+        ('chat_sala_historico',
+         ChatMessage.objects.filter(sala_id=sala_id).order_by('criado_em')[:100]),
+        ('chat_missao_incremental',
+         MensagemMissao.objects.filter(missao_id=missao_id, id__gt=amostra['cursor_missao']).order_by('id')[:100]),
+        ('ultima_entrega_do_aluno',
+         MensagemMissao.objects.filter(missao_id=missao_id, tipo='entrega', usuario_id=aluno_id)
+         .order_by('-data_envio')[:1]),
+        ('alunos_com_entrega',
+         MensagemMissao.objects.filter(missao_id=missao_id, tipo='entrega').values('usuario_id').distinct()),
+        ('missoes_completadas_do_aluno',
+         correcaoMissao.objects.filter(aluno_id=aluno_id, pontos_atingidos__gt=0)
+         .values('aluno_id').annotate(total=Count('id'))),
+        ('pontos_do_aluno_na_sala',
+         correcaoMissao.objects.filter(aluno_id=aluno_id, missao__sala_id=sala_id)
+         .values('aluno_id').annotate(total=Sum('pontos_atingidos'))),
+        ('conteudos_completos_na_trilha',
+         VisualizacaoConteudo.objects.filter(usuario_id=aluno_id, completo=True, conteudo__modulo__trilha_id=trilha_id)
+         .values('usuario_id').annotate(total=Count('id'))),
+        ('missoes_da_sala',
+         Missao.objects.filter(sala_id=sala_id).order_by('-data_criacao')[:20]),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede as consultas quentes com e sem os índices compostos, mostrando '
+        'tempos e planos (EXPLAIN). Remove e recria os índices: use em um banco de desenvolvimento.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semear', type=int, metavar='USUARIOS',
+                            help='Roda seed_platform com esse número de usuários antes de medir.')
+        parser.add_argument('--repeticoes', type=int, default=30, help='Execuções de cada consulta.')
+        parser.add_argument('--planos', action='store_true', help='Mostra os planos de execução.')
+        parser.add_argument('--forcar', action='store_true', help='Permite rodar com DEBUG=False.')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['forcar']:
+            raise CommandError('Este comando remove índices temporariamente. Use --forcar fora do DEBUG.')
+
+        if options['semear']:
+            call_command('seed_platform', usuarios=options['semear'], stdout=self.stdout)
+
+        amostra = self._amostra()
+        self.stdout.write(f'Banco: {connection.vendor}')
+
+        depois = self._medir(amostra, options['repeticoes'])
+        self._remover_indices()
+        try:
+            antes = self._medir(amostra, options['repeticoes'])
+        finally:
+            self._criar_indices()
+
+        for nome, (tempo_depois, plano_depois) in depois.items():
+            tempo_antes, plano_antes = antes[nome]
+            ganho = tempo_antes / tempo_depois if tempo_depois else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(nome))
+            self.stdout.write(f'  antes:  {tempo_antes:8.3f} ms')
+            self.stdout.write(f'  depois: {tempo_depois:8.3f} ms  ({ganho:.1f}x)')
+            if options['planos']:
+                self.stdout.write('  plano antes:\n    ' + plano_antes.replace('\n', '\n    '))
+                self.stdout.write('  plano depois:\n    ' + plano_depois.replace('\n', '\n    '))
+
+    # ------------------------------
+    # Medição
+    # ------------------------------
+    def _amostra(self):
+        """Escolhe a sala, missão, aluno e trilha com mais dados para medir."""
+        missao = (
+            Missao.objects.annotate(n=Count('mensagens')).order_by('-n').values('id', 'sala_id').first()
+        )
+        if missao is None:
+            raise CommandError('Banco sem dados. Rode manage.py seed_platform ou use --semear.')
+        aluno_id = (
+            MensagemMissao.objects.filter(missao_id=missao['id'], tipo='entrega')
+            .values_list('usuario_id', flat=True).first()
+        )
+        trilha_id = Trilha.objects.filter(sala_id=missao['sala_id']).values_list('id', flat=True).first()
+        ids_chat = ChatMessage.objects.filter(sala_id=missao['sala_id']).order_by('-id').values_list('id', flat=True)
+        ids_missao = MensagemMissao.objects.filter(missao_id=missao['id']).order_by('-id').values_list('id', flat=True)
+        return {
+            'sala': missao['sala_id'],
+            'missao': missao['id'],
+            'aluno': aluno_id,
+            'trilha': trilha_id,
+            # cursores perto do fim, como um cliente que está em dia
+            'cursor_chat': (list(ids_chat[10:11]) or [0])[0],
+            'cursor_missao': (list(ids_missao[10:11]) or [0])[0],
+        }
+
+    def _medir(self, amostra, repeticoes):
+        resultados = {}
+        for nome, queryset in consultas(amostra):
+            list(queryset.all())  # aquece o cache do banco
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                list(queryset.all())
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nome] = (statistics.median(tempos), queryset.explain())
+        return resultados
+
+    def _indices(self):
+        for modelo, nome in INDICES:
+            indice = next(i for i in modelo._meta.indexes if i.name == nome)
+            yield modelo, indice
+
+    def _remover_indices(self):
+        with connection.schema_editor() as editor:
+            for modelo, indice in self._indices():
+                editor.remove_index(modelo, indice)
+
+    def _criar_indices(self):
+        with connection.schema_editor() as editor:
+            for modelo, indice in self._indices():
+                editor.add_index(modelo, indice)
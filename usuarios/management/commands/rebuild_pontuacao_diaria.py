@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from usuarios.models import PontuacaoDiaria
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula os baldes de pontuação diária a partir das correções. '
+        'Por padrão é incremental: refaz apenas do último dia já registrado em diante.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Data inicial (AAAA-MM-DD) a recalcular.')
+        parser.add_argument('--dias', type=int, help='Recalcula os últimos N dias.')
+        parser.add_argument('--completo', action='store_true', help='Recalcula todo o histórico.')
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            desde = None
+        elif options['desde']:
+            try:
+                desde = datetime.date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('Use o formato AAAA-MM-DD em --desde.')
+        elif options['dias'] is not None:
+            if options['dias'] < 1:
+                raise CommandError('--dias deve ser maior que zero.')
+            desde = timezone.localdate() - datetime.timedelta(days=options['dias'] - 1)
+        else:
+            desde = PontuacaoDiaria.objects.aggregate(ultimo=Max('dia'))['ultimo']
+
+        baldes = PontuacaoDiaria.reconstruir(desde)
+        escopo = f'desde {desde.isoformat()}' if desde else 'histórico completo'
+        self.stdout.write(self.style.SUCCESS(f'{baldes} balde(s) diário(s) gravado(s) ({escopo}).'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from usuarios.models import Sala, RankingSala
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o ranking materializado das salas a partir das correções e confere se bate com a fonte.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sala', type=int, action='append', dest='salas',
+                            help='ID da sala (pode repetir). Padrão: todas as salas.')
+        parser.add_argument('--check', action='store_true',
+                            help='Apenas verifica divergências, sem reconstruir.')
+
+    def handle(self, *args, **options):
+        salas = Sala.objects.order_by('id')
+        if options['salas']:
+            salas = salas.filter(id__in=options['salas'])
+
+        total_divergencias = 0
+        for sala in salas:
+            if not options['check']:
+                linhas = RankingSala.reconstruir(sala)
+                self.stdout.write(f'Sala {sala.id} ({sala.nome}): {linhas} linha(s) reconstruída(s)')
+
+            divergencias = RankingSala.divergencias(sala)
+            for aluno_id, armazenado, esperado in divergencias:
+                self.stderr.write(
+                    f'Sala {sala.id}, aluno {aluno_id}: armazenado={armazenado} esperado={esperado}'
+                )
+            total_divergencias += len(divergencias)
+
+        if total_divergencias:
+            raise CommandError(f'{total_divergencias} divergência(s) encontrada(s) no ranking.')
+        self.stdout.write(self.style.SUCCESS('Ranking confere com as correções.'))
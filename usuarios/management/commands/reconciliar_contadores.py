@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from usuarios.models import Usuario, divergencias_contadores, reconciliar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Confere os contadores de missões e pontos de usuários e participações contra as correções e corrige desvios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Apenas verifica divergências, sem corrigir.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            divergencias = divergencias_contadores()
+        else:
+            divergencias = reconciliar_contadores()
+
+        for modelo, id_, armazenado, esperado in divergencias:
+            nome = 'Usuário' if modelo is Usuario else 'Participação'
+            self.stderr.write(f'{nome} {id_}: armazenado={armazenado} esperado={esperado}')
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS('Contadores conferem com as correções.'))
+        elif options['check']:
+            raise CommandError(f'{len(divergencias)} divergência(s) encontrada(s) nos contadores.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergencias)} contador(es) corrigido(s).'))
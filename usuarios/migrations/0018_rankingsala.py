@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def popular_ranking(apps, schema_editor):
+    """Preenche o ranking com as correções já existentes."""
+    ParticipacaoSala = apps.get_model('usuarios', 'ParticipacaoSala')
+    correcaoMissao = apps.get_model('usuarios', 'correcaoMissao')
+    RankingSala = apps.get_model('usuarios', 'RankingSala')
+
+    linhas = {
+        (sala_id, aluno_id): RankingSala(sala_id=sala_id, aluno_id=aluno_id)
+        for sala_id, aluno_id in ParticipacaoSala.objects.filter(tipo_na_sala='aluno')
+        .values_list('sala_id', 'usuario_id')
+    }
+    agregados = (
+        correcaoMissao.objects.values('missao__sala_id', 'aluno_id')
+        .annotate(pontos=Sum('pontos_atingidos'), total=Count('id'))
+    )
+    for a in agregados:
+        linha = linhas.get((a['missao__sala_id'], a['aluno_id']))
+        if linha is not None:
+            linha.pontos = a['pontos'] or 0
+            linha.missoes_corrigidas = a['total']
+    RankingSala.objects.bulk_create(linhas.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0017_titulo_usuario_foto_participacaosala_titulos_sala_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingSala',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontos', models.IntegerField(default=0)),
+                ('missoes_corrigidas', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings_sala', to=settings.AUTH_USER_MODEL)),
+                ('sala', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranking', to='usuarios.sala')),
+            ],
+            options={
+                'verbose_name': 'Ranking da Sala',
+                'verbose_name_plural': 'Rankings das Salas',
+                'ordering': ['-pontos', 'id'],
+                'indexes': [models.Index(fields=['sala', '-pontos', 'id'], name='ranking_sala_pontos_idx')],
+                'unique_together': {('sala', 'aluno')},
+            },
+        ),
+        migrations.RunPython(popular_ranking, migrations.RunPython.noop),
+    ]
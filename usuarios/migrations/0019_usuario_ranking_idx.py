@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('usuarios', '0018_rankingsala'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-pontos_totais', 'id'], name='usuario_ranking_idx'),
+        ),
+    ]
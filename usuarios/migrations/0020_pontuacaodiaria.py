@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def popular_pontuacao_diaria(apps, schema_editor):
+    """Gera os baldes diários a partir das correções já existentes."""
+    correcaoMissao = apps.get_model('usuarios', 'correcaoMissao')
+    PontuacaoDiaria = apps.get_model('usuarios', 'PontuacaoDiaria')
+
+    agregados = (
+        correcaoMissao.objects
+        .annotate(dia=TruncDate('data_correcao', tzinfo=timezone.get_current_timezone()))
+        .values('missao__sala_id', 'aluno_id', 'dia')
+        .annotate(total_pontos=Sum('pontos_atingidos'), total_correcoes=Count('id'))
+        .order_by()
+    )
+    PontuacaoDiaria.objects.bulk_create(
+        [
+            PontuacaoDiaria(
+                sala_id=a['missao__sala_id'],
+                aluno_id=a['aluno_id'],
+                dia=a['dia'],
+                pontos=a['total_pontos'] or 0,
+                correcoes=a['total_correcoes'],
+            )
+            for a in agregados
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0019_usuario_ranking_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PontuacaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('pontos', models.IntegerField(default=0)),
+                ('correcoes', models.IntegerField(default=0)),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pontuacoes_diarias', to=settings.AUTH_USER_MODEL)),
+                ('sala', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pontuacoes_diarias', to='usuarios.sala')),
+            ],
+            options={
+                'verbose_name': 'Pontuação Diária',
+                'verbose_name_plural': 'Pontuações Diárias',
+                'indexes': [models.Index(fields=['sala', 'dia'], name='pontuacao_sala_dia_idx'), models.Index(fields=['dia'], name='pontuacao_dia_idx')],
+                'unique_together': {('sala', 'aluno', 'dia')},
+            },
+        ),
+        migrations.RunPython(popular_pontuacao_diaria, migrations.RunPython.noop),
+    ]
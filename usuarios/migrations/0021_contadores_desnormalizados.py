@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:10
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def popular_contadores(apps, schema_editor):
+    """Preenche os contadores a partir das correções já existentes."""
+    correcaoMissao = apps.get_model('usuarios', 'correcaoMissao')
+    Usuario = apps.get_model('usuarios', 'Usuario')
+    ParticipacaoSala = apps.get_model('usuarios', 'ParticipacaoSala')
+
+    completada = Count('id', filter=Q(pontos_atingidos__gt=0))
+    for linha in correcaoMissao.objects.order_by().values('aluno_id').annotate(missoes=completada):
+        Usuario.objects.filter(id=linha['aluno_id']).update(missoes_completadas=linha['missoes'])
+
+    agregados = correcaoMissao.objects.order_by().values('aluno_id', 'missao__sala_id').annotate(
+        pontos=Sum('pontos_atingidos'), missoes=completada,
+    )
+    for linha in agregados:
+        ParticipacaoSala.objects.filter(usuario_id=linha['aluno_id'], sala_id=linha['missao__sala_id']).update(
+            pontos_na_sala=linha['pontos'] or 0, missoes_na_sala=linha['missoes'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0020_pontuacaodiaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participacaosala',
+            name='missoes_na_sala',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='participacaosala',
+            name='pontos_na_sala',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='missoes_completadas',
+            field=models.IntegerField(default=0, verbose_name='Missões Completadas'),
+        ),
+        migrations.RunPython(popular_contadores, migrations.RunPython.noop),
+    ]
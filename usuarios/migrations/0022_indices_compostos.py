@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0021_contadores_desnormalizados'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sala', 'id'], name='chat_sala_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sala', 'criado_em'], name='chat_sala_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='correcaomissao',
+            index=models.Index(fields=['aluno', 'missao', 'pontos_atingidos'], name='correcao_aluno_missao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensagemmissao',
+            index=models.Index(fields=['missao', 'id'], name='mensagem_missao_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensagemmissao',
+            index=models.Index(fields=['missao', 'tipo', 'usuario', '-data_envio'], name='mensagem_missao_entrega_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='missao',
+            index=models.Index(fields=['sala', '-data_criacao'], name='missao_sala_data_idx'),
+        ),
+    ]
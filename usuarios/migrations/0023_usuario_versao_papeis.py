@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0022_indices_compostos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='versao_papeis',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,11 +1,23 @@
 # usuarios/models.py
 
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+import datetime
 import random
 import string
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.functions import Coalesce, RowNumber, TruncDate
+from django.utils import timezone
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.conf import settings
+from django.core.cache import cache
+from core.tarefas import enfileirar
+from . import streaming
+
+# Validade do mapa {sala_id: papel} de cada usuário no cache. A chave leva
+# ``Usuario.versao_papeis``, então uma mudança vale em todos os processos
+# já na próxima requisição; o prazo só limita a memória ocupada.
+PAPEIS_SALA_CACHE_SEGUNDOS = getattr(settings, 'PAPEIS_SALA_CACHE_SEGUNDOS', 60)
 
 
 # ==============================
@@ -19,6 +31,8 @@ from django.dispatch import receiver
 # - MensagemMissao: Mensagens no chat específico da missão (comentários, entregas, correções)
 # - correcaoMissao: Registros de correção das missões pelos professores
 # - ChatMessage: Mensagens gerais do chat da sala virtual
+# - RankingSala: Ranking materializado por sala (pontos e missões corrigidas por aluno)
+# - PontuacaoDiaria: Pontos por (sala, aluno, dia) para rankings semanais/mensais/semestrais
 # - CustomUserManager: Manager customizado para criação de usuários
 
 
@@ -40,6 +54,13 @@ class CustomUserManager(BaseUserManager):
         extra_fields.setdefault('is_superuser', True)
         return self.create_user(email, password, tipo_usuario, **extra_fields)
 
+    def ranking_global(self):
+        """Usuários ativos em ordem de pontos (desempate pelo id).
+
+        A ordenação bate com o índice parcial ``usuario_ranking_idx``.
+        """
+        return self.filter(is_active=True).order_by('-pontos_totais', 'id')
+
 
 class Usuario(AbstractUser):
     tipo_usuario = models.CharField(
@@ -56,6 +77,9 @@ class Usuario(AbstractUser):
     username = None  # Removido
     email = models.EmailField(unique=True, verbose_name='E-mail')
     pontos_totais = models.IntegerField(default=0, verbose_name="Pontos Totais")
+    missoes_completadas = models.IntegerField(default=0, verbose_name="Missões Completadas")
+    # Avança a cada entrada, saída ou troca de papel em uma sala (chave do cache de papéis)
+    versao_papeis = models.PositiveIntegerField(default=0, editable=False)
     foto = models.ImageField(upload_to='perfis/', blank=True, null=True, verbose_name="Foto de Perfil")
     titulos_globais = models.ManyToManyField('Titulo', blank=True, related_name='usuarios_com_titulo', limit_choices_to={'tipo': 'global'})
 
@@ -75,20 +99,50 @@ class Usuario(AbstractUser):
 
     def verificar_titulos_globais(self):
         """Verifica e concede títulos globais baseados nos pontos totais e missões completadas."""
-        titulos_possiveis = Titulo.objects.filter(tipo='global')
-        for titulo in titulos_possiveis:
-            if (self.pontos_totais >= titulo.pontos_necessarios and
-                self.missoes_completadas_globais() >= titulo.missoes_necessarias and
-                titulo not in self.titulos_globais.all()):
-                self.titulos_globais.add(titulo)
+        return conceder_titulos_globais(self)
 
     def missoes_completadas_globais(self):
-        """Conta missões completadas em todas as salas."""
-        return correcaoMissao.objects.filter(aluno=self, pontos_atingidos__gt=0).count()
+        """Missões completadas em todas as salas (contador mantido a cada correção)."""
+        return self.missoes_completadas
+
+    def _acima_no_ranking(self):
+        return models.Q(pontos_totais__gt=self.pontos_totais) | models.Q(
+            pontos_totais=self.pontos_totais, id__lt=self.id
+        )
+
+    def _abaixo_no_ranking(self):
+        return models.Q(pontos_totais__lt=self.pontos_totais) | models.Q(
+            pontos_totais=self.pontos_totais, id__gt=self.id
+        )
+
+    def posicao_global(self):
+        """Posição no ranking global: conta (pelo índice) quem está acima."""
+        return Usuario.objects.ranking_global().filter(self._acima_no_ranking()).count() + 1
+
+    def vizinhos_ranking(self, janela=2):
+        """
+        Retorna ``(acima, abaixo)``: até ``janela`` usuários imediatamente
+        acima e abaixo no ranking global, ambos em ordem de ranking.
+        """
+        ranking = Usuario.objects.ranking_global()
+        acima = list(
+            ranking.filter(self._acima_no_ranking())
+            .order_by('pontos_totais', '-id')[:janela]
+        )
+        acima.reverse()
+        abaixo = list(ranking.filter(self._abaixo_no_ranking())[:janela])
+        return acima, abaixo
 
     class Meta:
         verbose_name = 'Usuário'
         verbose_name_plural = 'Usuários'
+        indexes = [
+            models.Index(
+                fields=['-pontos_totais', 'id'],
+                name='usuario_ranking_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
 
 # ==============================
@@ -143,6 +197,26 @@ class Sala(models.Model):
         """Retorna todos os usuários que são alunos nesta sala"""
         return Usuario.objects.filter(participacao__sala=self, participacao__tipo_na_sala='aluno')
 
+    def ranking_alunos(self):
+        """
+        Ranking dos alunos da sala em uma única consulta agrupada.
+        Cada participação vem anotada com ``pontos_sala`` (soma das correções
+        nas missões desta sala) e ``missoes_entregues`` (correções recebidas).
+        """
+        correcoes_da_sala = models.Q(usuario__correcoes_recebidas__missao__sala=self)
+        return (
+            self.participantes.filter(tipo_na_sala='aluno')
+            .select_related('usuario')
+            .annotate(
+                pontos_sala=Coalesce(
+                    models.Sum('usuario__correcoes_recebidas__pontos_atingidos', filter=correcoes_da_sala),
+                    0,
+                ),
+                missoes_entregues=models.Count('usuario__correcoes_recebidas', filter=correcoes_da_sala),
+            )
+            .order_by('-pontos_sala', 'id')
+        )
+
     def __str__(self):
         return f"{self.nome} (Código: {self.codigo})"
 
@@ -161,6 +235,8 @@ class ParticipacaoSala(models.Model):
     tipo_na_sala = models.CharField(max_length=10, choices=TIPO_CHOICES, default='aluno')
     data_entrada = models.DateTimeField(auto_now_add=True)
     titulos_sala = models.ManyToManyField(Titulo, blank=True, related_name='participacoes_com_titulo', limit_choices_to={'tipo': 'sala'})
+    pontos_na_sala = models.IntegerField(default=0)
+    missoes_na_sala = models.IntegerField(default=0)
 
     class Meta:
         unique_together = ('usuario', 'sala')
@@ -172,22 +248,42 @@ class ParticipacaoSala(models.Model):
 
     def verificar_titulos_sala(self):
         """Verifica e concede títulos específicos da sala."""
-        titulos_possiveis = Titulo.objects.filter(tipo='sala')
-        pontos_na_sala = self.calcular_pontos_na_sala()
-        missoes_completadas_sala = self.missoes_completadas_na_sala()
-        for titulo in titulos_possiveis:
-            if (pontos_na_sala >= titulo.pontos_necessarios and
-                missoes_completadas_sala >= titulo.missoes_necessarias and
-                titulo not in self.titulos_sala.all()):
-                self.titulos_sala.add(titulo)
+        return conceder_titulos_sala(self)
 
     def calcular_pontos_na_sala(self):
-        """Calcula pontos ganhos nesta sala."""
-        return correcaoMissao.objects.filter(aluno=self.usuario, missao__sala=self.sala).aggregate(models.Sum('pontos_atingidos'))['pontos_atingidos__sum'] or 0
+        """Pontos ganhos nesta sala (contador mantido a cada correção)."""
+        return self.pontos_na_sala
 
     def missoes_completadas_na_sala(self):
-        """Conta missões completadas nesta sala."""
-        return correcaoMissao.objects.filter(aluno=self.usuario, missao__sala=self.sala, pontos_atingidos__gt=0).count()
+        """Missões completadas nesta sala (contador mantido a cada correção)."""
+        return self.missoes_na_sala
+
+    @staticmethod
+    def _chave_cache_papeis(usuario):
+        return f'papeis_salas:{usuario.id}:{usuario.versao_papeis}'
+
+    @classmethod
+    def papeis_do_usuario(cls, usuario):
+        """
+        Retorna ``{sala_id: tipo_na_sala}`` das salas do usuário.
+        Guardado no próprio objeto (uma consulta por requisição, no máximo) e no
+        cache sob a ``versao_papeis`` do usuário, que entrar, sair ou mudar de
+        papel avança no banco: o ``request.user`` de cada requisição, em
+        qualquer worker, já traz a versão nova e não acha o mapa antigo.
+        """
+        papeis = getattr(usuario, '_papeis_salas', None)
+        if papeis is None:
+            chave = cls._chave_cache_papeis(usuario)
+            papeis = cache.get(chave)
+            if papeis is None:
+                papeis = dict(cls.objects.filter(usuario_id=usuario.id).values_list('sala_id', 'tipo_na_sala'))
+                cache.set(chave, papeis, PAPEIS_SALA_CACHE_SEGUNDOS)
+            usuario._papeis_salas = papeis
+        return papeis
+
+    @staticmethod
+    def invalidar_papeis(usuario_id):
+        Usuario.objects.filter(id=usuario_id).update(versao_papeis=models.F('versao_papeis') + 1)
 
 
 # ==============================
@@ -211,9 +307,39 @@ class Missao(models.Model):
     def __str__(self):
         return self.titulo
 
+    def ultimas_entregas(self):
+        """
+        A entrega mais recente de cada aluno, com o aluno (``select_related``)
+        e a correção já feita anotada em ``pontos_corrigidos`` /
+        ``data_correcao`` (None se ainda não corrigida), em uma consulta.
+
+        No PostgreSQL usa ``DISTINCT ON (usuario_id)``, que percorre o índice
+        (missao, tipo, usuario, -data_envio); nos outros bancos, ROW_NUMBER()
+        por aluno.
+        """
+        correcao = correcaoMissao.objects.filter(missao=self, aluno=models.OuterRef('usuario_id'))
+        entregas = (
+            self.mensagens.filter(tipo='entrega')
+            .select_related('usuario')
+            .annotate(
+                pontos_corrigidos=models.Subquery(correcao.values('pontos_atingidos')[:1]),
+                data_correcao=models.Subquery(correcao.values('data_correcao')[:1]),
+            )
+        )
+        mais_recente_primeiro = [models.F('data_envio').desc(), models.F('id').desc()]
+        if connections[entregas.db].vendor == 'postgresql':
+            return entregas.order_by('usuario_id', *mais_recente_primeiro).distinct('usuario_id')
+        return entregas.annotate(
+            ordem_do_aluno=models.Window(RowNumber(), partition_by=models.F('usuario_id'), order_by=mais_recente_primeiro)
+        ).filter(ordem_do_aluno=1)
+
     class Meta:
         verbose_name = 'Missão'
         verbose_name_plural = 'Missões'
+        indexes = [
+            # missões da sala, das mais recentes
+            models.Index(fields=['sala', '-data_criacao'], name='missao_sala_data_idx'),
+        ]
 
 
 # ==============================
@@ -254,10 +380,28 @@ class MensagemMissao(models.Model):
     def __str__(self):
         return f"{self.usuario} em {self.missao.titulo[:30]}"
 
+    def para_dict(self):
+        """Representação JSON usada pela API e pelo stream do chat."""
+        return {
+            'id': self.id,
+            'usuario_id': self.usuario_id,
+            'usuario_nome': self.usuario.get_nome_exibicao(),
+            'texto': self.texto,
+            'arquivo': self.arquivo.url if self.arquivo else None,
+            'tipo': self.tipo,
+            'data_envio': self.data_envio.isoformat(),
+        }
+
     class Meta:
         ordering = ['data_envio']
         verbose_name = 'Mensagem da Missão'
         verbose_name_plural = 'Mensagens das Missões'
+        indexes = [
+            # chat incremental / stream: missao=? AND id > cursor ORDER BY id
+            models.Index(fields=['missao', 'id'], name='mensagem_missao_cursor_idx'),
+            # entregas: já entregou? quem entregou? última entrega de cada aluno
+            models.Index(fields=['missao', 'tipo', 'usuario', '-data_envio'], name='mensagem_missao_entrega_idx'),
+        ]
         
 # ==============================
 # CORREÇÃO DA MISSÃO]
@@ -275,6 +419,11 @@ class correcaoMissao(models.Model):
         unique_together = ('missao', 'aluno')
         verbose_name = 'Correção da Missão'
         verbose_name_plural = 'Correções das Missões'
+        indexes = [
+            # cobre os agregados por aluno (missões completadas) e por
+            # aluno e sala (via missao): não precisa ler a tabela
+            models.Index(fields=['aluno', 'missao', 'pontos_atingidos'], name='correcao_aluno_missao_idx'),
+        ]
 
 
 class ChatMessage(models.Model):
@@ -287,10 +436,540 @@ class ChatMessage(models.Model):
         ordering = ['criado_em']
         verbose_name = 'Mensagem de Chat'
         verbose_name_plural = 'Mensagens de Chat'
+        indexes = [
+            # chat incremental / stream: sala=? AND id > cursor ORDER BY id
+            models.Index(fields=['sala', 'id'], name='chat_sala_cursor_idx'),
+            # histórico da sala na ordenação padrão
+            models.Index(fields=['sala', 'criado_em'], name='chat_sala_criado_idx'),
+        ]
 
     def __str__(self):
         return f"{self.usuario.get_nome_exibicao()} @ {self.sala.nome}: {self.texto[:30]}"
 
+    def para_dict(self):
+        """Representação JSON usada pela API e pelo stream do chat."""
+        return {
+            'id': self.id,
+            'usuario_id': self.usuario_id,
+            'usuario_nome': self.usuario.get_nome_exibicao(),
+            'texto': self.texto,
+            'criado_em': self.criado_em.isoformat(),
+        }
+
+
+# ==============================
+# MOTOR DE CONCESSÃO DE TÍTULOS
+# ==============================
+# Calcula as estatísticas do aluno uma vez, escolhe os títulos elegíveis com
+# uma única consulta de limiar (excluindo os já conquistados) e grava as
+# linhas da tabela intermediária com um único bulk_create.
+
+def titulos_elegiveis(tipo, pontos, missoes):
+    """Títulos do tipo cujos requisitos são atendidos por ``pontos`` e ``missoes``."""
+    return Titulo.objects.filter(
+        tipo=tipo,
+        pontos_necessarios__lte=pontos,
+        missoes_necessarias__lte=missoes,
+    )
+
+
+def conceder_titulos_globais(usuario, missoes=None):
+    """Concede ao usuário os títulos globais que ele já merece. Retorna os novos."""
+    if missoes is None:
+        missoes = usuario.missoes_completadas_globais()
+    novos = list(
+        titulos_elegiveis('global', usuario.pontos_totais, missoes)
+        .exclude(usuarios_com_titulo=usuario)
+    )
+    if novos:
+        Through = Usuario.titulos_globais.through
+        Through.objects.bulk_create(
+            [Through(usuario_id=usuario.id, titulo_id=titulo.id) for titulo in novos],
+            ignore_conflicts=True,
+        )
+    return novos
+
+
+def conceder_titulos_sala(participacao, pontos=None, missoes=None):
+    """Concede à participação os títulos de sala que ela já merece. Retorna os novos."""
+    if pontos is None or missoes is None:
+        pontos, missoes = participacao.pontos_na_sala, participacao.missoes_na_sala
+    novos = list(
+        titulos_elegiveis('sala', pontos, missoes)
+        .exclude(participacoes_com_titulo=participacao)
+    )
+    if novos:
+        Through = ParticipacaoSala.titulos_sala.through
+        Through.objects.bulk_create(
+            [Through(participacaosala_id=participacao.id, titulo_id=titulo.id) for titulo in novos],
+            ignore_conflicts=True,
+        )
+    return novos
+
+
+# Linhas por INSERT na concessão retroativa
+TAMANHO_LOTE_TITULOS = 1000
+
+
+def _inserir_em_lotes(Through, ids, criar_linha):
+    """Insere as linhas da tabela intermediária em lotes. Retorna o total inserido."""
+    # Os ids são lidos por completo antes de inserir: a consulta de elegíveis
+    # exclui quem já tem o título e não deve ver as linhas sendo gravadas.
+    ids = list(ids)
+    for inicio in range(0, len(ids), TAMANHO_LOTE_TITULOS):
+        Through.objects.bulk_create(
+            [criar_linha(id_) for id_ in ids[inicio:inicio + TAMANHO_LOTE_TITULOS]],
+            ignore_conflicts=True,
+        )
+    return len(ids)
+
+
+def usuarios_elegiveis_titulo(titulo):
+    """Usuários que atendem um título global e ainda não o possuem (uma consulta)."""
+    return (
+        Usuario.objects.filter(
+            pontos_totais__gte=titulo.pontos_necessarios,
+            missoes_completadas__gte=titulo.missoes_necessarias,
+        )
+        .exclude(titulos_globais=titulo)
+    )
+
+
+def participacoes_elegiveis_titulo(titulo):
+    """Participações de alunos que atendem um título de sala e ainda não o possuem."""
+    return (
+        ParticipacaoSala.objects.filter(
+            tipo_na_sala='aluno',
+            pontos_na_sala__gte=titulo.pontos_necessarios,
+            missoes_na_sala__gte=titulo.missoes_necessarias,
+        )
+        .exclude(titulos_sala=titulo)
+    )
+
+
+def conceder_titulo_retroativo(titulo):
+    """Concede um título recém-criado a todos que já o merecem. Retorna quantos ganharam."""
+    if titulo.tipo == 'global':
+        Through = Usuario.titulos_globais.through
+        ids = usuarios_elegiveis_titulo(titulo).values_list('id', flat=True)
+        return _inserir_em_lotes(
+            Through, ids,
+            lambda usuario_id: Through(usuario_id=usuario_id, titulo_id=titulo.id),
+        )
+
+    Through = ParticipacaoSala.titulos_sala.through
+    ids = participacoes_elegiveis_titulo(titulo).values_list('id', flat=True)
+    return _inserir_em_lotes(
+        Through, ids,
+        lambda participacao_id: Through(participacaosala_id=participacao_id, titulo_id=titulo.id),
+    )
+
+
+# ==============================
+# CONTADORES DESNORMALIZADOS
+# ==============================
+# ``Usuario.missoes_completadas`` e ``ParticipacaoSala.pontos_na_sala`` /
+# ``missoes_na_sala`` são atualizados com F() pelos signals de
+# ``correcaoMissao``, na mesma transação da correção (view ou admin).
+# ``manage.py reconciliar_contadores`` detecta e corrige desvios.
+
+def aplicar_contadores_correcao(aluno_id, sala_id, delta_pontos, delta_completadas):
+    """Soma a variação de uma correção nos contadores do aluno e da participação."""
+    if not delta_pontos and not delta_completadas:
+        return
+    Usuario.objects.filter(id=aluno_id).update(
+        pontos_totais=models.F('pontos_totais') + delta_pontos,
+        missoes_completadas=models.F('missoes_completadas') + delta_completadas,
+    )
+    ParticipacaoSala.objects.filter(usuario_id=aluno_id, sala_id=sala_id).update(
+        pontos_na_sala=models.F('pontos_na_sala') + delta_pontos,
+        missoes_na_sala=models.F('missoes_na_sala') + delta_completadas,
+    )
+
+
+def contadores_esperados():
+    """
+    Recalcula os contadores a partir de ``correcaoMissao`` com duas consultas agrupadas.
+    Retorna ``({aluno_id: missoes}, {(aluno_id, sala_id): (pontos, missoes)})``.
+    """
+    completada = models.Count('id', filter=models.Q(pontos_atingidos__gt=0))
+    por_usuario = {
+        linha['aluno_id']: linha['missoes']
+        for linha in correcaoMissao.objects.order_by().values('aluno_id').annotate(missoes=completada)
+    }
+    por_participacao = {
+        (linha['aluno_id'], linha['missao__sala_id']): (linha['pontos'], linha['missoes'])
+        for linha in correcaoMissao.objects.order_by().values('aluno_id', 'missao__sala_id').annotate(
+            pontos=Coalesce(models.Sum('pontos_atingidos'), 0),
+            missoes=completada,
+        )
+    }
+    return por_usuario, por_participacao
+
+
+def divergencias_contadores():
+    """
+    Lista ``(modelo, id, armazenado, esperado)`` para cada usuário ou
+    participação cujo contador difere da fonte.
+    """
+    por_usuario, por_participacao = contadores_esperados()
+    divergencias = []
+    for usuario_id, armazenado in Usuario.objects.values_list('id', 'missoes_completadas').order_by('id').iterator():
+        esperado = por_usuario.get(usuario_id, 0)
+        if armazenado != esperado:
+            divergencias.append((Usuario, usuario_id, armazenado, esperado))
+
+    participacoes = ParticipacaoSala.objects.values_list(
+        'id', 'usuario_id', 'sala_id', 'pontos_na_sala', 'missoes_na_sala'
+    ).order_by('id')
+    for participacao_id, usuario_id, sala_id, pontos, missoes in participacoes.iterator():
+        esperado = por_participacao.get((usuario_id, sala_id), (0, 0))
+        if (pontos, missoes) != esperado:
+            divergencias.append((ParticipacaoSala, participacao_id, (pontos, missoes), esperado))
+    return divergencias
+
+
+def reconciliar_contadores():
+    """Corrige os contadores divergentes. Retorna as divergências encontradas."""
+    divergencias = divergencias_contadores()
+    with transaction.atomic():
+        for modelo, id_, _, esperado in divergencias:
+            if modelo is Usuario:
+                Usuario.objects.filter(id=id_).update(missoes_completadas=esperado)
+            else:
+                ParticipacaoSala.objects.filter(id=id_).update(
+                    pontos_na_sala=esperado[0], missoes_na_sala=esperado[1]
+                )
+    return divergencias
+
+
+# ==============================
+# RANKING MATERIALIZADO DA SALA
+# ==============================
+class RankingSala(models.Model):
+    """
+    Pontuação de cada aluno em uma sala, mantida a cada correção.
+    Evita reagregar ``correcaoMissao`` da sala inteira a cada visita.
+    Pode ser reconstruída com ``manage.py rebuild_ranking_sala``.
+    """
+    sala = models.ForeignKey(Sala, on_delete=models.CASCADE, related_name='ranking')
+    aluno = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='rankings_sala')
+    pontos = models.IntegerField(default=0)
+    missoes_corrigidas = models.IntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('sala', 'aluno')
+        ordering = ['-pontos', 'id']
+        indexes = [
+            models.Index(fields=['sala', '-pontos', 'id'], name='ranking_sala_pontos_idx'),
+        ]
+        verbose_name = 'Ranking da Sala'
+        verbose_name_plural = 'Rankings das Salas'
+
+    def __str__(self):
+        return f"{self.aluno} @ {self.sala.nome}: {self.pontos} pts"
+
+    @classmethod
+    def aplicar_correcao(cls, sala_id, aluno_id, delta_pontos, delta_correcoes):
+        """
+        Soma a variação de uma correção na linha (sala, aluno).
+        Deve ser chamado dentro da mesma transação que grava a correção.
+        """
+        atualizadas = cls.objects.filter(sala_id=sala_id, aluno_id=aluno_id).update(
+            pontos=models.F('pontos') + delta_pontos,
+            missoes_corrigidas=models.F('missoes_corrigidas') + delta_correcoes,
+        )
+        if not atualizadas:
+            # Linha ausente (ex.: participação anterior ao ranking): recalcula da fonte
+            sala = Sala.objects.filter(pk=sala_id).first()
+            if sala is not None:  # sala sendo excluída em cascata
+                cls.reconstruir(sala, alunos=[aluno_id])
+
+    @classmethod
+    def calcular(cls, sala, alunos=None):
+        """Retorna ``{aluno_id: (pontos, missoes_corrigidas)}`` a partir das correções."""
+        participantes = sala.ranking_alunos()
+        if alunos is not None:
+            participantes = participantes.filter(usuario__in=alunos)
+        return {
+            p.usuario_id: (p.pontos_sala, p.missoes_entregues)
+            for p in participantes
+        }
+
+    @classmethod
+    def reconstruir(cls, sala, alunos=None):
+        """Apaga e recria as linhas da sala (ou só dos alunos indicados)."""
+        esperado = cls.calcular(sala, alunos)
+        with transaction.atomic():
+            linhas = cls.objects.filter(sala=sala)
+            if alunos is not None:
+                linhas = linhas.filter(aluno__in=alunos)
+            linhas.delete()
+            cls.objects.bulk_create([
+                cls(sala=sala, aluno_id=aluno_id, pontos=pontos, missoes_corrigidas=missoes)
+                for aluno_id, (pontos, missoes) in esperado.items()
+            ])
+        return len(esperado)
+
+    @classmethod
+    def divergencias(cls, sala):
+        """Lista ``(aluno_id, armazenado, esperado)`` onde a tabela difere da fonte."""
+        esperado = cls.calcular(sala)
+        armazenado = {
+            aluno_id: (pontos, missoes)
+            for aluno_id, pontos, missoes in cls.objects.filter(sala=sala)
+            .values_list('aluno_id', 'pontos', 'missoes_corrigidas')
+        }
+        return [
+            (aluno_id, armazenado.get(aluno_id), esperado.get(aluno_id))
+            for aluno_id in sorted(set(esperado) | set(armazenado))
+            if armazenado.get(aluno_id) != esperado.get(aluno_id)
+        ]
+
+
+# ==============================
+# PONTUAÇÃO DIÁRIA (rankings por período)
+# ==============================
+PERIODOS_RANKING = [
+    ('semana', 'Esta semana'),
+    ('mes', 'Este mês'),
+    ('semestre', 'Este semestre'),
+]
+
+
+def inicio_periodo(periodo, hoje=None):
+    """Primeiro dia do período ('semana', 'mes' ou 'semestre') que contém ``hoje``."""
+    hoje = hoje or timezone.localdate()
+    if periodo == 'semana':
+        return hoje - datetime.timedelta(days=hoje.weekday())
+    if periodo == 'mes':
+        return hoje.replace(day=1)
+    if periodo == 'semestre':
+        return hoje.replace(month=1 if hoje.month <= 6 else 7, day=1)
+    raise ValueError(f'Período desconhecido: {periodo}')
+
+
+class PontuacaoDiaria(models.Model):
+    """
+    Pontos de um aluno em uma sala somados por dia de correção.
+    Um ranking "desta semana" vira uma varredura curta de (sala, dia)
+    em vez de reagregar todas as correções.
+    Pode ser recalculada com ``manage.py rebuild_pontuacao_diaria``.
+    """
+    sala = models.ForeignKey(Sala, on_delete=models.CASCADE, related_name='pontuacoes_diarias')
+    aluno = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='pontuacoes_diarias')
+    dia = models.DateField()
+    pontos = models.IntegerField(default=0)
+    correcoes = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('sala', 'aluno', 'dia')
+        indexes = [
+            models.Index(fields=['sala', 'dia'], name='pontuacao_sala_dia_idx'),
+            models.Index(fields=['dia'], name='pontuacao_dia_idx'),
+        ]
+        verbose_name = 'Pontuação Diária'
+        verbose_name_plural = 'Pontuações Diárias'
+
+    def __str__(self):
+        return f"{self.aluno} @ {self.sala.nome} em {self.dia}: {self.pontos} pts"
+
+    @classmethod
+    def aplicar_correcao(cls, sala_id, aluno_id, data_correcao, delta_pontos, delta_correcoes):
+        """
+        Soma a variação de uma correção no balde do dia em que ela foi feita.
+        Deve ser chamado dentro da mesma transação que grava a correção.
+        """
+        chave = {'sala_id': sala_id, 'aluno_id': aluno_id, 'dia': timezone.localdate(data_correcao)}
+        incremento = {
+            'pontos': models.F('pontos') + delta_pontos,
+            'correcoes': models.F('correcoes') + delta_correcoes,
+        }
+        if cls.objects.filter(**chave).update(**incremento) or delta_correcoes < 0:
+            return  # correção excluída sem balde: não há o que descontar
+        try:
+            with transaction.atomic():
+                cls.objects.create(**chave, pontos=delta_pontos, correcoes=delta_correcoes)
+        except IntegrityError:
+            # outra correção do aluno no mesmo dia criou o balde ao mesmo tempo
+            cls.objects.filter(**chave).update(**incremento)
+
+    @classmethod
+    def ranking(cls, inicio, sala=None):
+        """
+        Alunos ordenados pelos pontos somados desde ``inicio`` (na sala ou
+        global). O global, como ``Usuario.objects.ranking_global()``, só
+        inclui contas ativas.
+        """
+        baldes = cls.objects.filter(dia__gte=inicio)
+        if sala is not None:
+            baldes = baldes.filter(sala=sala)
+        else:
+            baldes = baldes.filter(aluno__is_active=True)
+        return (
+            baldes.values('aluno_id')
+            .annotate(pontos_periodo=models.Sum('pontos'), correcoes_periodo=models.Sum('correcoes'))
+            .order_by('-pontos_periodo', 'aluno_id')
+        )
+
+    @classmethod
+    def posicao(cls, usuario, inicio, sala=None):
+        """Posição do usuário no ranking do período (1 se ainda não pontuou e ninguém pontuou)."""
+        ranking = cls.ranking(inicio, sala)
+        meus = ranking.filter(aluno_id=usuario.id).values_list('pontos_periodo', flat=True).first() or 0
+        acima = ranking.filter(
+            models.Q(pontos_periodo__gt=meus) | models.Q(pontos_periodo=meus, aluno_id__lt=usuario.id)
+        )
+        return acima.count() + 1
+
+    @classmethod
+    def reconstruir(cls, desde=None):
+        """
+        Recalcula os baldes a partir de ``desde`` (inclusive); sem data, tudo.
+        Retorna a quantidade de baldes gravados.
+        """
+        correcoes = correcaoMissao.objects.all()
+        baldes = cls.objects.all()
+        if desde is not None:
+            inicio = timezone.make_aware(datetime.datetime.combine(desde, datetime.time.min))
+            correcoes = correcoes.filter(data_correcao__gte=inicio)
+            baldes = baldes.filter(dia__gte=desde)
+
+        agregados = (
+            correcoes.annotate(dia=TruncDate('data_correcao', tzinfo=timezone.get_current_timezone()))
+            .values('missao__sala_id', 'aluno_id', 'dia')
+            .annotate(total_pontos=models.Sum('pontos_atingidos'), total_correcoes=models.Count('id'))
+            .order_by()
+        )
+        with transaction.atomic():
+            baldes.delete()
+            criados = cls.objects.bulk_create(
+                (
+                    cls(
+                        sala_id=a['missao__sala_id'],
+                        aluno_id=a['aluno_id'],
+                        dia=a['dia'],
+                        pontos=a['total_pontos'] or 0,
+                        correcoes=a['total_correcoes'],
+                    )
+                    for a in agregados.iterator()
+                ),
+                batch_size=1000,
+            )
+        return len(criados)
+
+
+# ==============================
+# SIGNALS DOS CONTADORES DA CORREÇÃO
+# ==============================
+# Criar, editar (inclusive pelo admin) ou excluir uma correção aplica a
+# diferença em todos os contadores derivados dela: os do aluno e da
+# participação, o ranking da sala e o balde do dia.
+
+def aplicar_variacao_correcao(sala_id, aluno_id, data_correcao, pontos_antes, pontos_depois, delta_correcoes):
+    diferenca = pontos_depois - pontos_antes
+    completadas = int(pontos_depois > 0) - int(pontos_antes > 0)
+    aplicar_contadores_correcao(aluno_id, sala_id, diferenca, completadas)
+    RankingSala.aplicar_correcao(sala_id, aluno_id, diferenca, delta_correcoes)
+    PontuacaoDiaria.aplicar_correcao(sala_id, aluno_id, data_correcao, diferenca, delta_correcoes)
+
+
+@receiver(pre_save, sender=correcaoMissao)
+def guardar_correcao_anterior(sender, instance, **kwargs):
+    """Sala, aluno e pontos de antes do save, para o post_save aplicar só a diferença."""
+    instance._correcao_anterior = None
+    if instance.pk is not None:
+        instance._correcao_anterior = correcaoMissao.objects.filter(pk=instance.pk).values_list(
+            'missao__sala_id', 'aluno_id', 'pontos_atingidos',
+        ).first()
+
+
+@receiver(post_save, sender=correcaoMissao)
+def contar_correcao_salva(sender, instance, created, **kwargs):
+    sala_id = instance.missao.sala_id
+    anterior = None if created else getattr(instance, '_correcao_anterior', None)
+    with transaction.atomic():
+        if anterior is None:
+            aplicar_variacao_correcao(sala_id, instance.aluno_id, instance.data_correcao, 0, instance.pontos_atingidos, 1)
+        elif anterior[:2] == (sala_id, instance.aluno_id):
+            aplicar_variacao_correcao(
+                sala_id, instance.aluno_id, instance.data_correcao, anterior[2], instance.pontos_atingidos, 0,
+            )
+        else:
+            # trocou de aluno ou de missão (admin): sai de um, entra no outro
+            aplicar_variacao_correcao(anterior[0], anterior[1], instance.data_correcao, anterior[2], 0, -1)
+            aplicar_variacao_correcao(sala_id, instance.aluno_id, instance.data_correcao, 0, instance.pontos_atingidos, 1)
+
+
+@receiver(post_delete, sender=correcaoMissao)
+def descontar_correcao_excluida(sender, instance, **kwargs):
+    with transaction.atomic():
+        aplicar_variacao_correcao(
+            instance.missao.sala_id, instance.aluno_id, instance.data_correcao, instance.pontos_atingidos, 0, -1,
+        )
+
+
+# ==============================
+# SIGNALS DO RANKING DA SALA
+# ==============================
+@receiver(post_save, sender=ParticipacaoSala)
+def sincronizar_linha_ranking(sender, instance, created, **kwargs):
+    """
+    Todo aluno que entra na sala aparece no ranking, mesmo com 0 pontos.
+    Na troca de papel, quem deixa de ser aluno sai do ranking e quem volta
+    a ser aluno tem a linha recalculada das correções.
+    """
+    linha = RankingSala.objects.filter(sala_id=instance.sala_id, aluno_id=instance.usuario_id)
+    if instance.tipo_na_sala != 'aluno':
+        if not created:
+            linha.delete()
+    elif created:
+        RankingSala.objects.get_or_create(sala_id=instance.sala_id, aluno_id=instance.usuario_id)
+    elif not linha.exists():
+        RankingSala.reconstruir(instance.sala, alunos=[instance.usuario_id])
+
+
+@receiver(post_delete, sender=ParticipacaoSala)
+def remover_linha_ranking(sender, instance, **kwargs):
+    RankingSala.objects.filter(sala_id=instance.sala_id, aluno_id=instance.usuario_id).delete()
+
+
+@receiver(post_save, sender=ParticipacaoSala)
+@receiver(post_delete, sender=ParticipacaoSala)
+def invalidar_cache_papeis(sender, instance, **kwargs):
+    """Entrada, saída ou troca de papel: avança a versão do mapa de salas do usuário."""
+    ParticipacaoSala.invalidar_papeis(instance.usuario_id)
+    # o mesmo objeto (ex.: request.user) segue em uso nesta requisição: sem
+    # a versão nova, um save() dele devolveria a antiga ao banco
+    usuario = ParticipacaoSala._meta.get_field('usuario').get_cached_value(instance, None)
+    if usuario is not None:
+        versao = Usuario.objects.filter(id=usuario.id).values_list('versao_papeis', flat=True).first()
+        if versao is not None:  # usuário sendo excluído em cascata
+            usuario.versao_papeis = versao
+        usuario._papeis_salas = None
+
+
+# ==============================
+# SIGNALS PARA O STREAM DOS CHATS (SSE)
+# ==============================
+@receiver(post_save, sender=ChatMessage)
+def publicar_chat_message(sender, instance, created, **kwargs):
+    """Envia a nova mensagem da sala para as conexões SSE abertas."""
+    if not created:
+        return
+    payload = instance.para_dict()
+    transaction.on_commit(lambda: streaming.registro.publicar(streaming.chave_sala(instance.sala_id), payload))
+
+
+@receiver(post_save, sender=MensagemMissao)
+def publicar_mensagem_missao(sender, instance, created, **kwargs):
+    """Envia a nova mensagem da missão para as conexões SSE abertas."""
+    if not created:
+        return
+    payload = instance.para_dict()
+    transaction.on_commit(lambda: streaming.registro.publicar(streaming.chave_missao(instance.missao_id), payload))
+
 
 # ==============================
 # SIGNALS PARA CONCESSÃO AUTOMÁTICA DE TÍTULOS
@@ -298,90 +977,32 @@ class ChatMessage(models.Model):
 @receiver(post_save, sender=correcaoMissao)
 def conceder_titulos_apos_correcao(sender, instance, created, **kwargs):
     """
-    Após corrigir uma missão, verifica se o aluno ganhou títulos.
-    Verifica tanto títulos globais quanto títulos da sala.
+    Após corrigir uma missão, enfileira a verificação de títulos do aluno
+    (globais e da sala). Executada por ``manage.py executar_tarefas``.
     """
     if not created:
         return  # Só executar em criação, não em update
-    
-    aluno = instance.aluno
-    sala = instance.missao.sala
-
-    # VERIFICAR TÍTULOS GLOBAIS
-    titulos_globais = Titulo.objects.filter(tipo='global')
-    for titulo in titulos_globais:
-        # Verificar se já possui
-        if titulo in aluno.titulos_globais.all():
-            continue
-        
-        # Verificar requisitos
-        missoes_completadas = aluno.missoes_completadas_globais()
-        if aluno.pontos_totais >= titulo.pontos_necessarios and \
-           missoes_completadas >= titulo.missoes_necessarias:
-            aluno.titulos_globais.add(titulo)
-            print(f"✨ {aluno.get_nome_exibicao()} conquistou o título global: {titulo.nome}")
-
-    # VERIFICAR TÍTULOS DA SALA
-    try:
-        participacao = ParticipacaoSala.objects.get(usuario=aluno, sala=sala)
-        titulos_sala = Titulo.objects.filter(tipo='sala')
-        
-        for titulo in titulos_sala:
-            # Verificar se já possui
-            if titulo in participacao.titulos_sala.all():
-                continue
-            
-            # Verificar requisitos
-            pontos_na_sala = participacao.calcular_pontos_na_sala()
-            missoes_na_sala = participacao.missoes_completadas_na_sala()
-            
-            if pontos_na_sala >= titulo.pontos_necessarios and \
-               missoes_na_sala >= titulo.missoes_necessarias:
-                participacao.titulos_sala.add(titulo)
-                print(f"🏆 {aluno.get_nome_exibicao()} conquistou o título da sala '{sala.nome}': {titulo.nome}")
-    
-    except ParticipacaoSala.DoesNotExist:
-        pass
+
+    sala_id = instance.missao.sala_id
+    enfileirar(
+        'usuarios.conceder_titulos_aluno',
+        chave=f'titulos-aluno:{instance.aluno_id}:{sala_id}',
+        aluno_id=instance.aluno_id,
+        sala_id=sala_id,
+    )
 
 
 @receiver(post_save, sender=Titulo)
 def verificar_titulos_retroativos(sender, instance, created, **kwargs):
     """
-    Quando um novo título é criado, verifica se algum usuário 
-    já atende os requisitos e concede o título automaticamente.
+    Quando um novo título é criado, enfileira a concessão automática
+    para os usuários que já atendem os requisitos.
     """
     if not created:
         return
-    
-    if instance.tipo == 'global':
-        # Verificar todos os usuários
-        usuarios = Usuario.objects.all()
-        novos_titulos = 0
-        
-        for usuario in usuarios:
-            missoes_completadas = usuario.missoes_completadas_globais()
-            
-            if usuario.pontos_totais >= instance.pontos_necessarios and \
-               missoes_completadas >= instance.missoes_necessarias:
-                usuario.titulos_globais.add(instance)
-                novos_titulos += 1
-        
-        if novos_titulos > 0:
-            print(f"📢 {novos_titulos} usuário(s) conquistaram o título '{instance.nome}' retroativamente!")
-    
-    else:  # titulo de sala
-        # Verificar todas as participações em salas
-        participacoes = ParticipacaoSala.objects.filter(tipo_na_sala='aluno')
-        novos_titulos = 0
-        
-        for participacao in participacoes:
-            pontos_na_sala = participacao.calcular_pontos_na_sala()
-            missoes_na_sala = participacao.missoes_completadas_na_sala()
-            
-            if pontos_na_sala >= instance.pontos_necessarios and \
-               missoes_na_sala >= instance.missoes_necessarias:
-                participacao.titulos_sala.add(instance)
-                novos_titulos += 1
-        
-        if novos_titulos > 0:
-            print(f"📢 {novos_titulos} aluno(s) conquistaram o título de sala '{instance.nome}' retroativamente!")
\ No newline at end of file
+
+    enfileirar(
+        'usuarios.conceder_titulo_retroativo',
+        chave=f'titulo-retroativo:{instance.id}',
+        titulo_id=instance.id,
+    )
@@ -0,0 +1,100 @@
+# usuarios/streaming.py
+"""
+Fan-out em memória para o stream (SSE) dos chats.
+
+Cada conexão SSE registra uma fila asyncio sob uma chave ('sala', id) ou
+('missao', id). Quando uma mensagem é salva, o signal chama ``publicar``,
+que entrega o payload a todas as filas daquela chave.
+
+O registro é por processo: com vários workers do gunicorn
+(``WEB_CONCURRENCY``) ou vários dynos, uma mensagem salva em um processo
+não chega às filas dos outros. Por isso cada stream também relê o banco a
+partir do seu cursor a cada heartbeat (``CHAT_SSE_HEARTBEAT_SEGUNDOS``) e a
+cada mensagem que chega pela fila: mensagens de outros processos chegam
+com no máximo esse atraso, e os eventos saem sempre em ordem de id, para
+o cliente e o ``Last-Event-ID`` nunca pularem uma mensagem. Ao reconectar,
+o cliente envia ``Last-Event-ID`` e recebe do banco o que perdeu.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+# Tamanho máximo da fila de cada conexão. Um cliente lento que encher a
+# fila é desconectado e recupera o atraso pelo banco ao reconectar.
+TAMANHO_FILA = 100
+
+# Sentinela colocada na fila para encerrar o stream de um cliente lento.
+ENCERRAR = object()
+
+
+class Assinatura:
+    """Uma conexão SSE aguardando mensagens de uma chave."""
+
+    def __init__(self, chave):
+        self.chave = chave
+        self.loop = asyncio.get_running_loop()
+        self.fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+
+    def _entregar(self, payload):
+        # Executa dentro do loop da conexão
+        if self.fila.full():
+            # descarta o que houver e pede para o cliente reconectar
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(ENCERRAR)
+            return
+        self.fila.put_nowait(payload)
+
+
+class RegistroStream:
+    """Registro thread-safe de assinaturas por chave."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinaturas = defaultdict(set)
+
+    def assinar(self, chave):
+        assinatura = Assinatura(chave)
+        with self._lock:
+            self._assinaturas[chave].add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.chave)
+            if assinaturas is None:
+                return
+            assinaturas.discard(assinatura)
+            if not assinaturas:
+                del self._assinaturas[assinatura.chave]
+
+    def publicar(self, chave, payload):
+        """Entrega o payload para todas as conexões da chave.
+
+        Pode ser chamado de qualquer thread (views síncronas, signals).
+        """
+        with self._lock:
+            assinaturas = list(self._assinaturas.get(chave, ()))
+        for assinatura in assinaturas:
+            try:
+                assinatura.loop.call_soon_threadsafe(assinatura._entregar, payload)
+            except RuntimeError:
+                # loop já encerrado: a conexão morreu sem cancelar
+                self.cancelar(assinatura)
+
+    def total_conexoes(self, chave=None):
+        with self._lock:
+            if chave is not None:
+                return len(self._assinaturas.get(chave, ()))
+            return sum(len(a) for a in self._assinaturas.values())
+
+
+registro = RegistroStream()
+
+
+def chave_sala(sala_id):
+    return ('sala', sala_id)
+
+
+def chave_missao(missao_id):
+    return ('missao', missao_id)
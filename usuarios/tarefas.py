@@ -0,0 +1,44 @@
+# usuarios/tarefas.py
+"""Tarefas da fila executadas fora do ciclo da requisição (ver core.tarefas)."""
+import logging
+
+from core.tarefas import tarefa
+from .models import (
+    Usuario, ParticipacaoSala, Titulo,
+    conceder_titulos_globais, conceder_titulos_sala, conceder_titulo_retroativo,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@tarefa('usuarios.conceder_titulos_aluno')
+def conceder_titulos_aluno(aluno_id, sala_id):
+    """Concede os títulos globais e da sala que o aluno passou a merecer."""
+    aluno = Usuario.objects.filter(id=aluno_id).first()
+    if aluno is None:
+        return
+
+    for titulo in conceder_titulos_globais(aluno):
+        logger.info('%s conquistou o título global: %s', aluno.get_nome_exibicao(), titulo.nome)
+
+    participacao = ParticipacaoSala.objects.filter(usuario=aluno, sala_id=sala_id).select_related('sala').first()
+    if participacao is not None:
+        for titulo in conceder_titulos_sala(participacao):
+            logger.info("%s conquistou o título da sala '%s': %s",
+                        aluno.get_nome_exibicao(), participacao.sala.nome, titulo.nome)
+
+
+@tarefa('usuarios.conceder_titulo_retroativo')
+def conceder_titulo_retroativo_tarefa(titulo_id):
+    """Concede um título recém-criado a todos que já atendem os requisitos."""
+    titulo = Titulo.objects.filter(id=titulo_id).first()
+    if titulo is None:
+        return  # título excluído antes da execução
+
+    novos_titulos = conceder_titulo_retroativo(titulo)
+    if novos_titulos > 0:
+        if titulo.tipo == 'global':
+            logger.info("%d usuário(s) conquistaram o título '%s' retroativamente", novos_titulos, titulo.nome)
+        else:
+            logger.info("%d aluno(s) conquistaram o título de sala '%s' retroativamente", novos_titulos, titulo.nome)
+
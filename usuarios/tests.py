@@ -1,4 +1,700 @@
+import asyncio
+import datetime
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from core.models import Tarefa
+from core.tarefas import enfileirar, executar_pendentes
+from . import streaming, views
+from .models import (
+    Sala, ParticipacaoSala, Missao, MensagemMissao, ChatMessage, correcaoMissao, RankingSala,
+    PontuacaoDiaria, Titulo, inicio_periodo, conceder_titulos_globais, conceder_titulo_retroativo,
+    divergencias_contadores, reconciliar_contadores,
+)
+
+
+class ChatIncrementalTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.aluno = Usuario.objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala Teste', criador=self.professor)
+        ParticipacaoSala.objects.create(usuario=self.professor, sala=self.sala, tipo_na_sala='professor')
+        ParticipacaoSala.objects.create(usuario=self.aluno, sala=self.sala, tipo_na_sala='aluno')
+        self.missao = Missao.objects.create(sala=self.sala, titulo='Missão 1', descricao='Descrição', pontos=10)
+        self.client.login(email='aluno@test.com', password='test123')
+
+    def test_sala_messages_retorna_apenas_mensagens_novas(self):
+        m1 = ChatMessage.objects.create(sala=self.sala, usuario=self.aluno, texto='primeira')
+        url = reverse('usuarios:sala_messages', args=[self.sala.id])
+
+        data = self.client.get(url).json()
+        self.assertEqual([m['id'] for m in data['mensagens']], [m1.id])
+        self.assertEqual(data['cursor'], m1.id)
+
+        m2 = ChatMessage.objects.create(sala=self.sala, usuario=self.professor, texto='segunda')
+        data = self.client.get(url, {'after_id': data['cursor']}).json()
+        self.assertEqual([m['id'] for m in data['mensagens']], [m2.id])
+        self.assertEqual(data['cursor'], m2.id)
+
+        data = self.client.get(url, {'after_id': data['cursor']}).json()
+        self.assertEqual(data['mensagens'], [])
+        self.assertEqual(data['cursor'], m2.id)
+
+    def test_missao_messages_com_cursor(self):
+        m1 = MensagemMissao.objects.create(missao=self.missao, usuario=self.aluno, texto='oi')
+        m2 = MensagemMissao.objects.create(missao=self.missao, usuario=self.professor, texto='olá')
+        url = reverse('usuarios:missao_messages', args=[self.missao.id])
+
+        data = self.client.get(url, {'after_id': m1.id}).json()
+        self.assertEqual([m['id'] for m in data['mensagens']], [m2.id])
+        self.assertEqual(data['cursor'], m2.id)
+
+    def test_cursor_invalido(self):
+        url = reverse('usuarios:sala_messages', args=[self.sala.id])
+        response = self.client.get(url, {'after_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_sem_asgi_usa_json_do_polling(self):
+        m1 = ChatMessage.objects.create(sala=self.sala, usuario=self.aluno, texto='oi')
+        url = reverse('usuarios:sala_stream', args=[self.sala.id])
+        response = self.client.get(url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual([m['id'] for m in response.json()['mensagens']], [m1.id])
+
+
+class AcessoSalaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.aluno = Usuario.objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', criador=self.professor)
+        self.participacao = ParticipacaoSala.objects.create(usuario=self.aluno, sala=self.sala, tipo_na_sala='aluno')
+        self.url = reverse('usuarios:sala_messages', args=[self.sala.id])
+        self.client.login(email='aluno@test.com', password='test123')
+
+    def _queries_participacao(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        return response, [q for q in ctx.captured_queries if 'usuarios_participacaosala' in q['sql']]
+
+    def test_participacao_vem_do_cache_depois_da_primeira_requisicao(self):
+        response, queries = self._queries_participacao()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self._queries_participacao()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_sair_da_sala_invalida_o_cache(self):
+        self.client.get(self.url)
+        self.participacao.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_mapa_antigo_no_cache_de_outro_worker_nao_vale(self):
+        self.client.get(self.url)
+        chave_antiga = ParticipacaoSala._chave_cache_papeis(self.aluno)
+        self.participacao.delete()
+        # o cache local de outro processo ainda tem o mapa de antes da saída
+        cache.set(chave_antiga, {self.sala.id: 'aluno'})
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_troca_de_papel_invalida_o_cache(self):
+        postar = reverse('usuarios:postar_missao', args=[self.sala.id])
+        dados = {'titulo': 'Nova', 'descricao': '-', 'pontos': 10}
+
+        self.client.post(postar, dados)
+        self.assertFalse(Missao.objects.filter(sala=self.sala).exists())
+
+        self.participacao.tipo_na_sala = 'professor'
+        self.participacao.save()
+        self.client.post(postar, dados)
+        self.assertTrue(Missao.objects.filter(sala=self.sala).exists())
+
+
+class RegistroStreamTests(TestCase):
+    async def test_publicar_de_outra_thread_entrega_para_assinantes_da_chave(self):
+        registro = streaming.RegistroStream()
+        assinatura = registro.assinar(streaming.chave_sala(1))
+        outra = registro.assinar(streaming.chave_sala(2))
+
+        await asyncio.to_thread(registro.publicar, streaming.chave_sala(1), {'id': 7})
+
+        payload = await asyncio.wait_for(assinatura.fila.get(), timeout=1)
+        self.assertEqual(payload, {'id': 7})
+        self.assertTrue(outra.fila.empty())
+
+        registro.cancelar(assinatura)
+        registro.cancelar(outra)
+        self.assertEqual(registro.total_conexoes(), 0)
+
+    async def test_stream_rele_o_banco_a_cada_heartbeat(self):
+        from unittest import mock
+        from asgiref.sync import sync_to_async
+
+        professor = await get_user_model().objects.acreate(email='prof@test.com', tipo_usuario='professor')
+        sala = await Sala.objects.acreate(nome='Sala', criador=professor)
+        queryset = ChatMessage.objects.filter(sala_id=sala.id).select_related('usuario')
+
+        with mock.patch.object(views, 'SSE_HEARTBEAT_SEGUNDOS', 0.05):
+            eventos = views._eventos_sse(streaming.chave_sala(sala.id), queryset, None)
+            self.assertEqual(await anext(eventos), 'retry: 3000\n\n')
+            # salva sem passar pelo fan-out deste processo (o on_commit não
+            # roda no TestCase), como uma mensagem postada em outro worker
+            mensagem = await sync_to_async(ChatMessage.objects.create)(sala=sala, usuario=professor, texto='outro worker')
+            evento = await asyncio.wait_for(anext(eventos), timeout=2)
+            await eventos.aclose()
+        self.assertTrue(evento.startswith(f'id: {mensagem.id}\n'))
+        self.assertIn('outro worker', evento)
+
+    async def test_stream_envia_em_ordem_de_id_com_mensagem_de_outro_worker(self):
+        from asgiref.sync import sync_to_async
+
+        professor = await get_user_model().objects.acreate(email='prof@test.com', tipo_usuario='professor')
+        sala = await Sala.objects.acreate(nome='Sala', criador=professor)
+        queryset = ChatMessage.objects.filter(sala_id=sala.id).select_related('usuario')
+        criar = sync_to_async(ChatMessage.objects.create)
+
+        eventos = views._eventos_sse(streaming.chave_sala(sala.id), queryset, None)
+        self.assertEqual(await anext(eventos), 'retry: 3000\n\n')
+        # mensagem deste processo chega ao vivo; depois aparece no banco uma
+        # de id menor, salva por outro worker (sem passar pelo fan-out)
+        ao_vivo = await criar(id=10, sala=sala, usuario=professor, texto='ao vivo')
+        streaming.registro.publicar(streaming.chave_sala(sala.id), ao_vivo.para_dict())
+        await criar(id=5, sala=sala, usuario=professor, texto='outro worker')
+        recebidos = [await asyncio.wait_for(anext(eventos), timeout=2) for _ in range(2)]
+        await eventos.aclose()
+
+        # mesma regra do chat_sala.js/chat_missao.js: guarda só o maior id visto
+        ultimo_id, exibidas = 0, []
+        for evento in recebidos:
+            mensagem = json.loads(evento.split('data: ', 1)[1])
+            if mensagem['id'] > ultimo_id:
+                exibidas.append(mensagem['texto'])
+                ultimo_id = mensagem['id']
+        self.assertEqual(exibidas, ['outro worker', 'ao vivo'])
+        self.assertEqual([evento.split('\n', 1)[0] for evento in recebidos], ['id: 5', 'id: 10'])
+
+
+class RankingSalaTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.sala = Sala.objects.create(nome='Sala Ranking', criador=self.professor)
+        ParticipacaoSala.objects.create(usuario=self.professor, sala=self.sala, tipo_na_sala='professor')
+        self.outra_sala = Sala.objects.create(nome='Outra Sala', criador=self.professor)
+        self.missao_outra_sala = Missao.objects.create(sala=self.outra_sala, titulo='Fora', descricao='-', pontos=50)
+        self.total_alunos = 0
+
+    def _popular(self, n_alunos, n_missoes):
+        Usuario = get_user_model()
+        missoes = [
+            Missao.objects.create(sala=self.sala, titulo=f'M{i}', descricao='-', pontos=10)
+            for i in range(n_missoes)
+        ]
+        for _ in range(n_alunos):
+            self.total_alunos += 1
+            aluno = Usuario.objects.create_user(
+                email=f'aluno{self.total_alunos}@test.com', password='test123', tipo_usuario='aluno'
+            )
+            ParticipacaoSala.objects.create(usuario=aluno, sala=self.sala, tipo_na_sala='aluno')
+            for missao in missoes:
+                correcaoMissao.objects.create(
+                    missao=missao, aluno=aluno, professor=self.professor, pontos_atingidos=self.total_alunos
+                )
+
+    def _contar_queries_sala_virtual(self):
+        self.client.login(email='prof@test.com', password='test123')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('usuarios:sala_virtual', args=[self.sala.id]))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response
+
+    def test_ranking_soma_apenas_correcoes_da_sala(self):
+        self._popular(n_alunos=2, n_missoes=3)
+        aluno2 = get_user_model().objects.get(email='aluno2@test.com')
+        correcaoMissao.objects.create(
+            missao=self.missao_outra_sala, aluno=aluno2, professor=self.professor, pontos_atingidos=50
+        )
+        ranking = list(self.sala.ranking_alunos())
+        self.assertEqual([p.usuario.email for p in ranking], ['aluno2@test.com', 'aluno1@test.com'])
+        self.assertEqual([p.pontos_sala for p in ranking], [6, 3])
+        self.assertEqual([p.missoes_entregues for p in ranking], [3, 3])
+
+    def test_quantidade_de_queries_nao_cresce_com_a_sala(self):
+        self._popular(n_alunos=2, n_missoes=2)
+        self._contar_queries_sala_virtual()  # aquece o cache de papéis do professor
+        queries_pequena, _ = self._contar_queries_sala_virtual()
+
+        self._popular(n_alunos=8, n_missoes=6)
+        queries_grande, response = self._contar_queries_sala_virtual()
+
+        self.assertEqual(queries_pequena, queries_grande)
+        self.assertEqual(len(response.context['ranking_sala']), 10)
+        self.assertEqual(response.context['ranking_sala'][0]['posicao'], 1)
+
+    def test_correcao_atualiza_ranking_materializado(self):
+        self._popular(n_alunos=1, n_missoes=0)
+        aluno = get_user_model().objects.get(email='aluno1@test.com')
+        missao = Missao.objects.create(sala=self.sala, titulo='Nova', descricao='-', pontos=10)
+        self.client.login(email='prof@test.com', password='test123')
+        url = reverse('usuarios:chat_missao', args=[missao.id])
+
+        self.client.post(url, {'corrigir': '1', 'aluno_id': aluno.id, 'pontos_atingidos': 7})
+        self.client.post(url, {'corrigir': '1', 'aluno_id': aluno.id, 'pontos_atingidos': 4})
+
+        linha = RankingSala.objects.get(sala=self.sala, aluno=aluno)
+        self.assertEqual((linha.pontos, linha.missoes_corrigidas), (4, 1))
+        aluno.refresh_from_db()
+        self.assertEqual(aluno.pontos_totais, 4)
+        self.assertEqual(RankingSala.divergencias(self.sala), [])
+        balde = PontuacaoDiaria.objects.get(sala=self.sala, aluno=aluno)
+        self.assertEqual((balde.pontos, balde.correcoes), (4, 1))
+
+    def test_comando_reconstroi_e_verifica_ranking(self):
+        self._popular(n_alunos=3, n_missoes=2)
+        # desvio como o de uma carga em massa que não passa pelos signals
+        RankingSala.objects.filter(sala=self.sala).update(pontos=0)
+        self.assertNotEqual(RankingSala.divergencias(self.sala), [])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ranking_sala', '--check', stdout=StringIO(), stderr=StringIO())
+
+        call_command('rebuild_ranking_sala', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(RankingSala.divergencias(self.sala), [])
+        primeiro = self.sala.ranking.first()
+        self.assertEqual((primeiro.aluno.email, primeiro.pontos), ('aluno3@test.com', 6))
+
+    def test_troca_de_papel_sai_e_volta_ao_ranking(self):
+        self._popular(n_alunos=2, n_missoes=2)
+        RankingSala.reconstruir(self.sala)
+        participacao = ParticipacaoSala.objects.get(sala=self.sala, usuario__email='aluno1@test.com')
+
+        participacao.tipo_na_sala = 'professor'
+        participacao.save()
+        self.assertFalse(self.sala.ranking.filter(aluno_id=participacao.usuario_id).exists())
+        self.assertEqual(self.sala.ranking.count(), 1)
+
+        participacao.tipo_na_sala = 'aluno'
+        participacao.save()
+        self.assertEqual(self.sala.ranking.get(aluno_id=participacao.usuario_id).pontos, 2)
+        self.assertEqual(RankingSala.divergencias(self.sala), [])
+
+
+class ContadoresTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.aluno = Usuario.objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', criador=self.professor)
+        ParticipacaoSala.objects.create(usuario=self.professor, sala=self.sala, tipo_na_sala='professor')
+        self.participacao = ParticipacaoSala.objects.create(usuario=self.aluno, sala=self.sala, tipo_na_sala='aluno')
+        self.missao = Missao.objects.create(sala=self.sala, titulo='M', descricao='-', pontos=10)
+        self.client.login(email='prof@test.com', password='test123')
+
+    def _corrigir(self, pontos):
+        url = reverse('usuarios:chat_missao', args=[self.missao.id])
+        self.client.post(url, {'corrigir': '1', 'aluno_id': self.aluno.id, 'pontos_atingidos': pontos})
+        self.aluno.refresh_from_db()
+        self.participacao.refresh_from_db()
+
+    def test_correcao_e_recorrecao_atualizam_contadores(self):
+        self._corrigir(7)
+        self.assertEqual((self.aluno.pontos_totais, self.aluno.missoes_completadas), (7, 1))
+        self.assertEqual((self.participacao.pontos_na_sala, self.participacao.missoes_na_sala), (7, 1))
+
+        # nota zero deixa de contar como missão completada
+        self._corrigir(0)
+        self.assertEqual((self.aluno.pontos_totais, self.aluno.missoes_completadas), (0, 0))
+        self.assertEqual((self.participacao.pontos_na_sala, self.participacao.missoes_na_sala), (0, 0))
+
+        self._corrigir(5)
+        self.assertEqual(self.aluno.missoes_completadas_globais(), 1)
+        self.assertEqual(self.participacao.calcular_pontos_na_sala(), 5)
+        self.assertEqual(divergencias_contadores(), [])
+
+    def test_correcao_editada_ou_excluida_fora_da_view(self):
+        # criar, editar e excluir como o admin faz: save()/delete() do modelo
+        outro = get_user_model().objects.create_user(email='outro@test.com', password='test123', tipo_usuario='aluno')
+        ParticipacaoSala.objects.create(usuario=outro, sala=self.sala, tipo_na_sala='aluno')
+        correcao = correcaoMissao.objects.create(
+            missao=self.missao, aluno=self.aluno, professor=self.professor, pontos_atingidos=7
+        )
+        correcao.pontos_atingidos = 3
+        correcao.save()
+        self.assertEqual(self.sala.ranking.get(aluno=self.aluno).pontos, 3)
+
+        correcao.aluno = outro
+        correcao.save()
+        self.assertEqual(divergencias_contadores(), [])
+        self.assertEqual(RankingSala.divergencias(self.sala), [])
+        self.assertEqual(
+            list(PontuacaoDiaria.objects.filter(pontos__gt=0).values_list('aluno_id', 'pontos', 'correcoes')),
+            [(outro.id, 3, 1)],
+        )
+
+        correcao.delete()
+        self.assertEqual(divergencias_contadores(), [])
+        self.assertEqual(RankingSala.divergencias(self.sala), [])
+        self.assertFalse(PontuacaoDiaria.objects.exclude(pontos=0, correcoes=0).exists())
+        outro.refresh_from_db()
+        self.assertEqual((outro.pontos_totais, outro.missoes_completadas), (0, 0))
+
+    def test_comando_detecta_e_corrige_desvio(self):
+        self._corrigir(7)
+        ParticipacaoSala.objects.filter(id=self.participacao.id).update(pontos_na_sala=99)
+        get_user_model().objects.filter(id=self.aluno.id).update(missoes_completadas=3)
+
+        with self.assertRaises(CommandError):
+            call_command('reconciliar_contadores', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('reconciliar_contadores', stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(divergencias_contadores(), [])
+        self.participacao.refresh_from_db()
+        self.assertEqual(self.participacao.pontos_na_sala, 7)
+
+
+class ListarTitulosTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.aluno = Usuario.objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.total_salas = 0
+        self.client.login(email='aluno@test.com', password='test123')
+
+    def _popular(self, n_salas, n_titulos):
+        for _ in range(n_salas):
+            self.total_salas += 1
+            sala = Sala.objects.create(nome=f'Sala {self.total_salas}', criador=self.professor)
+            ParticipacaoSala.objects.create(
+                usuario=self.aluno, sala=sala, tipo_na_sala='aluno', pontos_na_sala=10, missoes_na_sala=1
+            )
+        for i in range(n_titulos):
+            Titulo.objects.create(nome=f'G{i}', descricao='-', tipo='global', pontos_necessarios=40, missoes_necessarias=4)
+            Titulo.objects.create(nome=f'S{i}', descricao='-', tipo='sala', pontos_necessarios=20, missoes_necessarias=0)
+        executar_pendentes()
+
+    def _carregar(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('usuarios:listar_titulos'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response
+
+    def test_quantidade_de_queries_nao_cresce_com_salas_e_titulos(self):
+        self._popular(n_salas=1, n_titulos=1)
+        queries_pequena, _ = self._carregar()
+
+        self._popular(n_salas=4, n_titulos=6)
+        queries_grande, response = self._carregar()
+
+        self.assertEqual(queries_pequena, queries_grande)
+        self.assertEqual(len(response.context['titulos_globais_info']), 7)
+        self.assertEqual(len(response.context['titulos_salas_info']), 5 * 7)
+
+    def test_progresso_calculado_dos_contadores(self):
+        get_user_model().objects.filter(id=self.aluno.id).update(pontos_totais=10, missoes_completadas=1)
+        self._popular(n_salas=1, n_titulos=1)
+        _, response = self._carregar()
+
+        info_global = response.context['titulos_globais_info'][0]
+        self.assertEqual((info_global['progresso_pontos'], info_global['progresso_missoes']), (25, 25))
+        info_sala = response.context['titulos_salas_info'][0]
+        self.assertFalse(info_sala['conquistado'])
+        self.assertEqual((info_sala['progresso_pontos'], info_sala['progresso_missoes']), (50, 0))
+
+
+class RankingGlobalTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        pontos = [50, 30, 30, 10, 0]
+        self.usuarios = [
+            Usuario.objects.create(email=f'u{i}@test.com', tipo_usuario='aluno', pontos_totais=p)
+            for i, p in enumerate(pontos)
+        ]
+        Usuario.objects.create(email='inativo@test.com', tipo_usuario='aluno', pontos_totais=999, is_active=False)
+
+    def test_posicao_global_conta_quem_esta_acima(self):
+        self.assertEqual([u.posicao_global() for u in self.usuarios], [1, 2, 3, 4, 5])
+
+    def test_vizinhos_em_ordem_de_ranking(self):
+        acima, abaixo = self.usuarios[2].vizinhos_ranking(janela=2)
+        self.assertEqual(acima, self.usuarios[0:2])
+        self.assertEqual(abaixo, self.usuarios[3:5])
+
+    def test_pagina_de_ranking(self):
+        self.client.force_login(self.usuarios[3])
+        response = self.client.get(reverse('usuarios:ranking'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['minha_posicao'], 4)
+        self.assertEqual([l['posicao'] for l in response.context['linhas']], [1, 2, 3, 4, 5])
+        self.assertEqual([v['posicao'] for v in response.context['vizinhos']], [2, 3, 4, 5])
+
+
+class RankingPeriodoTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create(email='prof@test.com', tipo_usuario='professor')
+        self.aluno1 = Usuario.objects.create(email='a1@test.com', tipo_usuario='aluno')
+        self.aluno2 = Usuario.objects.create(email='a2@test.com', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', criador=self.professor)
+        self.missoes = [
+            Missao.objects.create(sala=self.sala, titulo=f'M{i}', descricao='-', pontos=10) for i in range(3)
+        ]
+
+    def _corrigir(self, missao, aluno, pontos, dias_atras):
+        correcao = correcaoMissao.objects.create(
+            missao=missao, aluno=aluno, professor=self.professor, pontos_atingidos=pontos
+        )
+        correcaoMissao.objects.filter(pk=correcao.pk).update(
+            data_correcao=timezone.now() - datetime.timedelta(days=dias_atras)
+        )
+
+    def test_ranking_do_periodo_usa_apenas_baldes_recentes(self):
+        self._corrigir(self.missoes[0], self.aluno1, 10, dias_atras=400)
+        self._corrigir(self.missoes[1], self.aluno2, 3, dias_atras=0)
+        self._corrigir(self.missoes[2], self.aluno1, 2, dias_atras=0)
+        call_command('rebuild_pontuacao_diaria', '--completo', stdout=StringIO())
+
+        hoje = timezone.localdate()
+        ranking = list(PontuacaoDiaria.ranking(hoje, self.sala))
+        self.assertEqual([r['aluno_id'] for r in ranking], [self.aluno2.id, self.aluno1.id])
+        self.assertEqual([r['pontos_periodo'] for r in ranking], [3, 2])
+        self.assertEqual(PontuacaoDiaria.posicao(self.aluno1, hoje), 2)
+
+        geral = PontuacaoDiaria.ranking(hoje - datetime.timedelta(days=500))
+        self.assertEqual(geral[0]['aluno_id'], self.aluno1.id)
+
+    def test_rebuild_incremental_refaz_so_o_intervalo(self):
+        self._corrigir(self.missoes[0], self.aluno1, 10, dias_atras=10)
+        call_command('rebuild_pontuacao_diaria', '--completo', stdout=StringIO())
+        self._corrigir(self.missoes[1], self.aluno1, 5, dias_atras=0)
+
+        call_command('rebuild_pontuacao_diaria', '--dias', '1', stdout=StringIO())
+        self.assertEqual(
+            sorted(PontuacaoDiaria.objects.values_list('pontos', flat=True)), [5, 10]
+        )
+
+    def test_ranking_global_do_periodo_ignora_contas_inativas(self):
+        self._corrigir(self.missoes[0], self.aluno1, 10, dias_atras=0)
+        self._corrigir(self.missoes[1], self.aluno2, 3, dias_atras=0)
+        call_command('rebuild_pontuacao_diaria', '--completo', stdout=StringIO())
+        get_user_model().objects.filter(pk=self.aluno1.pk).update(is_active=False)
+
+        hoje = timezone.localdate()
+        self.assertEqual([r['aluno_id'] for r in PontuacaoDiaria.ranking(hoje)], [self.aluno2.id])
+        self.assertEqual(PontuacaoDiaria.posicao(self.aluno2, hoje), 1)
+        # no ranking da sala continua, como no ranking materializado
+        self.assertEqual(len(PontuacaoDiaria.ranking(hoje, self.sala)), 2)
+
+    def test_balde_criado_ao_mesmo_tempo_recebe_a_soma(self):
+        from unittest import mock
+        from django.db.models import QuerySet
+
+        self._corrigir(self.missoes[0], self.aluno1, 4, dias_atras=0)
+        call_command('rebuild_pontuacao_diaria', '--completo', stdout=StringIO())
+
+        # a primeira UPDATE não vê o balde (criado por outra transação logo depois)
+        update_original = QuerySet.update
+        chamadas = []
+
+        def update_perde_a_corrida(queryset, **campos):
+            chamadas.append(campos)
+            return 0 if len(chamadas) == 1 else update_original(queryset, **campos)
+
+        with mock.patch.object(QuerySet, 'update', update_perde_a_corrida):
+            PontuacaoDiaria.aplicar_correcao(self.sala.id, self.aluno1.id, timezone.now(), 6, 1)
+
+        balde = PontuacaoDiaria.objects.get(aluno=self.aluno1)
+        self.assertEqual((balde.pontos, balde.correcoes), (10, 2))
+
+    def test_inicio_periodo(self):
+        quarta = datetime.date(2026, 10, 14)
+        self.assertEqual(inicio_periodo('semana', quarta), datetime.date(2026, 10, 12))
+        self.assertEqual(inicio_periodo('mes', quarta), datetime.date(2026, 10, 1))
+        self.assertEqual(inicio_periodo('semestre', quarta), datetime.date(2026, 7, 1))
+
+
+class MotorTitulosTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create(email='prof@test.com', tipo_usuario='professor')
+        self.aluno = Usuario.objects.create(email='aluno@test.com', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', criador=self.professor)
+        self.participacao = ParticipacaoSala.objects.create(usuario=self.aluno, sala=self.sala, tipo_na_sala='aluno')
+        for i, pontos in enumerate([20, 10, 0]):
+            missao = Missao.objects.create(sala=self.sala, titulo=f'M{i}', descricao='-', pontos=20)
+            correcaoMissao.objects.create(missao=missao, aluno=self.aluno, professor=self.professor, pontos_atingidos=pontos)
+        reconciliar_contadores()
+        self.aluno.refresh_from_db()
+        self.participacao.refresh_from_db()
+
+    def test_concede_apenas_titulos_globais_elegiveis_e_nao_repetidos(self):
+        ok = Titulo.objects.create(nome='Ok', descricao='-', tipo='global', pontos_necessarios=30, missoes_necessarias=2)
+        Titulo.objects.create(nome='Pontos', descricao='-', tipo='global', pontos_necessarios=31, missoes_necessarias=0)
+        Titulo.objects.create(nome='Missões', descricao='-', tipo='global', pontos_necessarios=0, missoes_necessarias=3)
+        self.aluno.titulos_globais.clear()
+
+        self.assertEqual(conceder_titulos_globais(self.aluno), [ok])
+        self.assertEqual(conceder_titulos_globais(self.aluno), [])
+        self.assertEqual(list(self.aluno.titulos_globais.all()), [ok])
+
+    def test_titulos_de_sala_em_numero_fixo_de_queries(self):
+        for i in range(10):
+            Titulo.objects.create(nome=f'T{i}', descricao='-', tipo='sala', pontos_necessarios=i * 5, missoes_necessarias=1)
+        self.participacao.titulos_sala.clear()
+
+        # elegíveis + bulk insert (estatísticas vêm dos contadores)
+        with self.assertNumQueries(2):
+            novos = self.participacao.verificar_titulos_sala()
+        self.assertEqual(len(novos), 7)  # 30 pontos na sala: limiares 0..30
+
+    def test_titulo_retroativo_de_sala_em_consultas_fixas(self):
+        outra_sala = Sala.objects.create(nome='Outra', criador=self.professor)
+        ParticipacaoSala.objects.create(usuario=self.aluno, sala=outra_sala, tipo_na_sala='aluno')
+        titulo = Titulo.objects.create(nome='Retro', descricao='-', tipo='sala', pontos_necessarios=25, missoes_necessarias=2)
+
+        # seleção dos elegíveis + bulk insert
+        with self.assertNumQueries(2):
+            conceder_titulo_retroativo(titulo)
+        self.assertEqual(list(titulo.participacoes_com_titulo.all()), [self.participacao])
+
+    def test_titulo_retroativo_global(self):
+        Usuario = get_user_model()
+        Usuario.objects.create(email='pobre@test.com', tipo_usuario='aluno', pontos_totais=100)
+        titulo = Titulo.objects.create(nome='G', descricao='-', tipo='global', pontos_necessarios=30, missoes_necessarias=2)
+        # a concessão é enfileirada, não feita na requisição
+        self.assertFalse(titulo.usuarios_com_titulo.exists())
+        executar_pendentes()
+        self.assertEqual(list(titulo.usuarios_com_titulo.all()), [self.aluno])
+        self.assertEqual(conceder_titulo_retroativo(titulo), 0)
+
+
+class FilaTarefasTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.aluno = Usuario.objects.create_user(email='aluno@test.com', password='test123', tipo_usuario='aluno')
+        self.sala = Sala.objects.create(nome='Sala', criador=self.professor)
+        ParticipacaoSala.objects.create(usuario=self.aluno, sala=self.sala, tipo_na_sala='aluno')
+        self.missao = Missao.objects.create(sala=self.sala, titulo='M', descricao='-', pontos=50)
+
+    def test_correcao_enfileira_titulos_uma_unica_vez_por_chave(self):
+        Titulo.objects.create(nome='Primeiros passos', descricao='-', tipo='global', pontos_necessarios=10, missoes_necessarias=1)
+        executar_pendentes()
+
+        outra = Missao.objects.create(sala=self.sala, titulo='M2', descricao='-', pontos=50)
+        correcaoMissao.objects.create(missao=self.missao, aluno=self.aluno, professor=self.professor, pontos_atingidos=40)
+        correcaoMissao.objects.create(missao=outra, aluno=self.aluno, professor=self.professor, pontos_atingidos=40)
+        self.assertEqual(Tarefa.objects.filter(status='pendente', nome='usuarios.conceder_titulos_aluno').count(), 1)
+
+        self.assertEqual(executar_pendentes(), 1)
+        self.assertEqual(self.aluno.titulos_globais.count(), 1)
+
+    def test_falha_reagenda_com_backoff_e_depois_desiste(self):
+        tarefa_obj = enfileirar('usuarios.conceder_titulo_retroativo', max_tentativas=2, titulo_id='invalido')
+
+        with self.assertLogs('core.tarefas', 'ERROR'):
+            executar_pendentes()
+        tarefa_obj.refresh_from_db()
+        self.assertEqual(tarefa_obj.status, 'pendente')
+        self.assertEqual(tarefa_obj.tentativas, 1)
+        self.assertGreater(tarefa_obj.executar_apos, timezone.now())
+        self.assertIn('ValueError', tarefa_obj.erro)
+
+        Tarefa.objects.filter(id=tarefa_obj.id).update(executar_apos=timezone.now())
+        with self.assertLogs('core.tarefas', 'ERROR'):
+            executar_pendentes()
+        tarefa_obj.refresh_from_db()
+        self.assertEqual(tarefa_obj.status, 'falhou')
+        self.assertEqual(tarefa_obj.tentativas, 2)
+
+
+class AdminListagensTests(TestCase):
+    def setUp(self):
+        call_command('seed_platform', usuarios=40, missoes_por_sala=3, stdout=StringIO())
+        Usuario = get_user_model()
+        self.admin = Usuario.objects.create_superuser(email='admin@test.com', password='test123')
+        self.client.force_login(self.admin)
+
+    def _consultas(self, url, model_admin, por_pagina):
+        original = model_admin.list_per_page
+        model_admin.list_per_page = por_pagina
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+        finally:
+            model_admin.list_per_page = original
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx)
+
+    def test_consultas_nao_crescem_com_linhas_da_pagina(self):
+        from django.contrib import admin
+        for modelo, model_admin in admin.site._registry.items():
+            if modelo._meta.app_label not in ('usuarios', 'cursos') or not modelo.objects.count() >= 10:
+                continue
+            url = reverse(f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}_changelist')
+            with self.subTest(modelo=modelo.__name__):
+                self.assertEqual(self._consultas(url, model_admin, 1), self._consultas(url, model_admin, 10))
+
+
+class UltimasEntregasTests(TestCase):
+    def setUp(self):
+        Usuario = get_user_model()
+        self.professor = Usuario.objects.create_user(email='prof@test.com', password='test123', tipo_usuario='professor')
+        self.sala = Sala.objects.create(nome='Sala', criador=self.professor)
+        ParticipacaoSala.objects.create(usuario=self.professor, sala=self.sala, tipo_na_sala='professor')
+        self.missao = Missao.objects.create(sala=self.sala, titulo='Missão', descricao='d', pontos=10)
+        self.total_alunos = 0
+
+    def _entregar(self, n_alunos):
+        """Cada aluno entrega duas vezes; devolve {aluno_id: id da última entrega}."""
+        ultimas = {}
+        for _ in range(n_alunos):
+            self.total_alunos += 1
+            aluno = get_user_model().objects.create_user(
+                email=f'aluno{self.total_alunos}@test.com', password='test123', tipo_usuario='aluno'
+            )
+            ParticipacaoSala.objects.create(usuario=aluno, sala=self.sala, tipo_na_sala='aluno')
+            for texto in ('primeira', 'segunda'):
+                entrega = MensagemMissao.objects.create(missao=self.missao, usuario=aluno, texto=texto, tipo='entrega')
+            MensagemMissao.objects.create(missao=self.missao, usuario=aluno, texto='dúvida', tipo='comentario')
+            ultimas[aluno.id] = entrega.id
+        return ultimas
+
+    def _entregas_na_view(self):
+        self.client.force_login(self.professor)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('usuarios:chat_missao', args=[self.missao.id]))
+        self.assertEqual(response.status_code, 200)
+        return response.context['entregas_com_dados'], len(ctx)
+
+    def test_ultima_entrega_de_cada_aluno_com_correcao(self):
+        ultimas = self._entregar(3)
+        corrigido = next(iter(ultimas))
+        correcaoMissao.objects.create(missao=self.missao, aluno_id=corrigido, professor=self.professor, pontos_atingidos=7)
+
+        entregas, _ = self._entregas_na_view()
+        self.assertEqual({item['aluno'].id: item['entrega'].id for item in entregas}, ultimas)
+        self.assertEqual(
+            {item['aluno'].id: item['pontos_corrigidos'] for item in entregas},
+            {aluno_id: (7 if aluno_id == corrigido else None) for aluno_id in ultimas},
+        )
 
-# Create your tests here.
+    def test_consultas_nao_crescem_com_alunos(self):
+        self._entregar(2)
+        self._entregas_na_view()
+        _, antes = self._entregas_na_view()
+        self._entregar(8)
+        entregas, depois = self._entregas_na_view()
+        self.assertEqual(len(entregas), 10)
+        self.assertEqual(antes, depois)
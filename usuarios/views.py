@@ -1,12 +1,20 @@
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from .forms import LoginForm, CadastroForm, SalaForm, MissaoForm, MensagemMissaoForm, CorrecaoMissaoForm, PerfilForm
 from .models import *
 from cursos.models import Trilha
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count, Sum
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.core.paginator import Paginator
+from django.db.models import Q, Count, Sum, Prefetch
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from . import streaming
+from .acesso import papel_na_sala, participacao_na_sala, participacao_requerida
+import asyncio
 import json
 
 def login_view(request):
@@ -55,7 +63,7 @@ def principal(request):
         codigo = request.POST.get('codigo', '').strip().upper()
         try:
             sala = Sala.objects.get(codigo=codigo)
-            if ParticipacaoSala.objects.filter(usuario=request.user, sala=sala).exists():
+            if papel_na_sala(request.user, sala.id):
                 messages.info(request, f'Você já está na sala {sala.nome}.')
             else:
                 ParticipacaoSala.objects.create(usuario=request.user, sala=sala, tipo_na_sala='aluno')
@@ -94,19 +102,17 @@ def criar_sala(request):
         'form': form
     })
     
+def _url_sala_virtual(sala_id):
+    return reverse('usuarios:sala_virtual', args=[sala_id])
+
+
 @login_required
+@participacao_requerida()
 def detalhe_sala(request, sala_id):
     """Exibe os detalhes de uma sala específica."""
-    sala = get_object_or_404(Sala, id=sala_id)
-    # Verificar se usuário participa da sala
-    participacao = ParticipacaoSala.objects.filter(usuario=request.user, sala=sala).first()
-    if not participacao:
-        messages.error(request, 'Você não tem acesso a esta sala.')
-        return redirect('usuarios:pag_principal')
-        
     return render(request, 'usuarios/detalhe_sala.html', {
-        'sala': sala,
-        'minha_participacao': participacao
+        'sala': request.sala,
+        'minha_participacao': request.participacao
     })
 
 @login_required
@@ -121,10 +127,58 @@ def missoes(request):
     """Exibe a página de missões (placeholder)."""
     return render(request, 'usuarios/missoes.html')
 
+# Usuários por página no ranking global
+RANKING_GLOBAL_POR_PAGINA = 50
+
+
 @login_required
 def ranking(request):
-    """Exibe a página de ranking (placeholder)."""
-    return render(request, 'usuarios/ranking.html')
+    """Ranking global paginado por pontos totais, com a posição do usuário logado.
+
+    Com ``?periodo=semana|mes|semestre`` usa a soma dos baldes diários do período.
+    """
+    periodo = request.GET.get('periodo')
+    if periodo not in dict(PERIODOS_RANKING):
+        periodo = None
+
+    if periodo:
+        inicio = inicio_periodo(periodo)
+        pagina = Paginator(PontuacaoDiaria.ranking(inicio), RANKING_GLOBAL_POR_PAGINA).get_page(request.GET.get('page'))
+        usuarios = Usuario.objects.in_bulk([linha['aluno_id'] for linha in pagina])
+        linhas = [
+            {'posicao': posicao, 'usuario': usuarios[linha['aluno_id']], 'pontos': linha['pontos_periodo']}
+            for posicao, linha in enumerate(pagina, pagina.start_index())
+        ]
+        minha_posicao = PontuacaoDiaria.posicao(request.user, inicio)
+        vizinhos = []
+    else:
+        ranking_global = Usuario.objects.ranking_global().only(
+            'id', 'email', 'first_name', 'last_name', 'pontos_totais', 'foto'
+        )
+        pagina = Paginator(ranking_global, RANKING_GLOBAL_POR_PAGINA).get_page(request.GET.get('page'))
+        linhas = [
+            {'posicao': posicao, 'usuario': usuario, 'pontos': usuario.pontos_totais}
+            for posicao, usuario in enumerate(pagina, pagina.start_index())
+        ]
+
+        # Posição e vizinhança calculadas por contagem/fatias no índice
+        minha_posicao = request.user.posicao_global()
+        acima, abaixo = request.user.vizinhos_ranking()
+        vizinhos = (
+            [{'posicao': minha_posicao - len(acima) + i, 'usuario': u} for i, u in enumerate(acima)]
+            + [{'posicao': minha_posicao, 'usuario': request.user}]
+            + [{'posicao': minha_posicao + 1 + i, 'usuario': u} for i, u in enumerate(abaixo)]
+        )
+
+    return render(request, 'usuarios/ranking.html', {
+        'pagina': pagina,
+        'linhas': linhas,
+        'minha_posicao': minha_posicao,
+        'minha_pagina': (minha_posicao - 1) // RANKING_GLOBAL_POR_PAGINA + 1,
+        'vizinhos': vizinhos,
+        'periodo': periodo,
+        'periodos_ranking': PERIODOS_RANKING,
+    })
 
 @login_required
 def configuracoes(request):
@@ -147,51 +201,60 @@ def painel_adm(request):
     
     return render(request, 'usuarios/painel_adm.html', context)
 
+# Quantidade de alunos exibidos no ranking da sala
+RANKING_SALA_TAMANHO = getattr(settings, 'RANKING_SALA_TAMANHO', 100)
+
+
+def _ranking_periodo(inicio, sala, limite):
+    """Ranking de um período a partir dos baldes diários (uma consulta + alunos)."""
+    linhas = list(PontuacaoDiaria.ranking(inicio, sala)[:limite])
+    alunos = Usuario.objects.in_bulk([linha['aluno_id'] for linha in linhas])
+    return [
+        {
+            'aluno': alunos[linha['aluno_id']],
+            'pontos_sala': linha['pontos_periodo'],
+            'pontos_total': alunos[linha['aluno_id']].pontos_totais,
+            'missoes_entregues': linha['correcoes_periodo'],
+            'posicao': posicao,
+        }
+        for posicao, linha in enumerate(linhas, 1)
+    ]
+
+
 @login_required
+@participacao_requerida()
 def sala_virtual(request, sala_id):
-    sala = get_object_or_404(Sala, id=sala_id)
-    
-    # Verificar se usuário participa da sala
-    participacao = ParticipacaoSala.objects.filter(usuario=request.user, sala=sala).first()
-    if not participacao:
-        messages.error(request, 'Você não tem acesso a esta sala.')
-        return redirect('usuarios:pag_principal')
+    sala = request.sala
+    participacao = request.participacao
 
     # MISSÕES DA SALA
     missoes_da_sala = Missao.objects.filter(sala=sala)
 
-    # RANKING - usar participantes reais da sala
-    ranking_sala = []
-    participantes_alunos = ParticipacaoSala.objects.filter(sala=sala, tipo_na_sala='aluno')
-    
-    for participante in participantes_alunos:
-        aluno = participante.usuario
-        pontos_na_sala = 0
-        missoes_entregues = 0
-
-        for missao in missoes_da_sala:
-            correcao = correcaoMissao.objects.filter(missao=missao, aluno=aluno).first()
-            if correcao:
-                pontos_na_sala += correcao.pontos_atingidos or 0
-                missoes_entregues += 1
-
-        ranking_sala.append({
-            'aluno': aluno,
-            'pontos_sala': pontos_na_sala,
-            'pontos_total': aluno.pontos_totais,
-            'missoes_entregues': missoes_entregues,
-        })
-
-    ranking_sala.sort(key=lambda x: x['pontos_sala'], reverse=True)
-    
-    for i, item in enumerate(ranking_sala, 1):
-        item['posicao'] = i
+    # RANKING - geral: fatia ordenada do ranking materializado (índice sala, -pontos)
+    #           por período: soma dos baldes diários da sala
+    periodo = request.GET.get('periodo')
+    if periodo in dict(PERIODOS_RANKING):
+        ranking_sala = _ranking_periodo(inicio_periodo(periodo), sala, RANKING_SALA_TAMANHO)
+    else:
+        periodo = None
+        ranking_sala = [
+            {
+                'aluno': linha.aluno,
+                'pontos_sala': linha.pontos,
+                'pontos_total': linha.aluno.pontos_totais,
+                'missoes_entregues': linha.missoes_corrigidas,
+                'posicao': posicao,
+            }
+            for posicao, linha in enumerate(
+                sala.ranking.select_related('aluno')[:RANKING_SALA_TAMANHO], 1
+            )
+        ]
 
     # TÍTULOS DA SALA
     titulos_sala = Titulo.objects.filter(tipo='sala')
 
     # Verificar se usuário é professor nesta sala
-    is_professor_na_sala = participacao.tipo_na_sala == 'professor'
+    is_professor_na_sala = participacao.is_professor
 
     # TRILHAS DA SALA (apenas para o contexto local)
     trilhas_sala = Trilha.objects.filter(sala=sala).order_by('ordem')
@@ -200,6 +263,8 @@ def sala_virtual(request, sala_id):
         'sala': sala,
         'missoes': missoes_da_sala,
         'ranking_sala': ranking_sala,
+        'periodo': periodo,
+        'periodos_ranking': PERIODOS_RANKING,
         'is_professor_na_sala': is_professor_na_sala,
         'minha_participacao': participacao,
         'titulos_sala': titulos_sala,
@@ -208,34 +273,62 @@ def sala_virtual(request, sala_id):
     return render(request, 'usuarios/sala_virtual.html', context)
 
 
+def _ler_cursor(request):
+    """Lê o parâmetro ``after_id`` (último id já recebido pelo cliente).
+
+    Retorna ``None`` quando ausente e levanta ``ValueError`` se inválido.
+    """
+    after_id = request.GET.get('after_id')
+    if after_id in (None, ''):
+        return None
+    after_id = int(after_id)
+    if after_id < 0:
+        raise ValueError('after_id não pode ser negativo')
+    return after_id
+
+
+def _buscar_mensagens_incrementais(queryset, after_id, limite=100):
+    """Retorna as mensagens em ordem cronológica e o novo cursor.
+
+    Sem cursor: as últimas ``limite`` mensagens.
+    Com cursor: apenas as mensagens com id maior que ``after_id``.
+    """
+    if after_id is None:
+        msgs = list(queryset.order_by('-id')[:limite])
+        msgs.reverse()
+        cursor = msgs[-1].id if msgs else 0
+    else:
+        msgs = list(queryset.filter(id__gt=after_id).order_by('id')[:limite])
+        cursor = msgs[-1].id if msgs else after_id
+    return msgs, cursor
+
+
 @login_required
+@participacao_requerida(mensagem='Acesso negado à sala.', json=True)
 def sala_messages(request, sala_id):
     """API simples para obter e postar mensagens do chat geral da sala.
 
-    GET: retorna JSON com as últimas mensagens (até 100)
+    GET: retorna JSON ``{'mensagens': [...], 'cursor': <id>}``.
+         Sem ``after_id`` traz as últimas mensagens (até 100); com
+         ``?after_id=<id>`` traz só as mensagens mais novas que o cursor.
     POST: cria uma nova mensagem (espera campo 'texto' em form-data ou JSON)
     """
-    sala = get_object_or_404(Sala, id=sala_id)
-
-    # Verificar se usuário participa da sala
-    participacao = ParticipacaoSala.objects.filter(usuario=request.user, sala=sala).first()
-    if not participacao:
-        return JsonResponse({'error': 'Acesso negado à sala.'}, status=403)
+    sala = request.sala
 
     if request.method == 'GET':
-        msgs = ChatMessage.objects.filter(sala=sala).order_by('-criado_em')[:100]
-        msgs = reversed(list(msgs))
-        data = [
-            {
-                'id': m.id,
-                'usuario_id': m.usuario.id,
-                'usuario_nome': m.usuario.get_nome_exibicao(),
-                'texto': m.texto,
-                'criado_em': m.criado_em.isoformat(),
-            }
-            for m in msgs
-        ]
-        return JsonResponse(data, safe=False)
+        try:
+            after_id = _ler_cursor(request)
+        except ValueError:
+            return HttpResponseBadRequest('Parâmetro after_id inválido.')
+
+        msgs, cursor = _buscar_mensagens_incrementais(
+            ChatMessage.objects.filter(sala=sala).select_related('usuario'),
+            after_id,
+        )
+        return JsonResponse({
+            'mensagens': [m.para_dict() for m in msgs],
+            'cursor': cursor,
+        })
 
     elif request.method == 'POST':
         # suporta form-data ou JSON
@@ -252,32 +345,154 @@ def sala_messages(request, sala_id):
 
         msg = ChatMessage.objects.create(sala=sala, usuario=request.user, texto=texto.strip())
 
-        data = {
-            'id': msg.id,
-            'usuario_id': msg.usuario.id,
-            'usuario_nome': msg.usuario.get_nome_exibicao(),
-            'texto': msg.texto,
-            'criado_em': msg.criado_em.isoformat(),
-        }
-        return JsonResponse(data, status=201)
+        return JsonResponse(msg.para_dict(), status=201)
 
     else:
         return JsonResponse({'error': 'Método não permitido.'}, status=405)
 
+# ==============================
+# STREAM DOS CHATS (Server-Sent Events)
+# ==============================
+# Intervalo entre heartbeats (comentários SSE) para manter a conexão viva
+# através de proxies que derrubam conexões ociosas. É também o atraso máximo
+# de uma mensagem postada em outro processo.
+SSE_HEARTBEAT_SEGUNDOS = getattr(settings, 'CHAT_SSE_HEARTBEAT_SEGUNDOS', 15)
+
+
+def _aceita_stream(request):
+    """O stream só funciona sob ASGI e para clientes que pedem text/event-stream."""
+    return (
+        isinstance(request, ASGIRequest)
+        and 'text/event-stream' in request.headers.get('Accept', '')
+    )
+
+
+def _cursor_stream(request):
+    """Cursor inicial do stream: Last-Event-ID (reconexão) ou ?after_id=."""
+    ultimo = request.headers.get('Last-Event-ID')
+    if ultimo:
+        return int(ultimo)
+    return _ler_cursor(request)
+
+
+def _backlog(queryset, after_id):
+    msgs, cursor = _buscar_mensagens_incrementais(queryset, after_id)
+    return [m.para_dict() for m in msgs], cursor
+
+
+def _ler_em_ordem(queryset, cursor, ao_vivo):
+    """Tudo depois do cursor, do banco e da fila, em ordem de id.
+
+    O banco traz também o que foi salvo em outros processos; ``ao_vivo``
+    (payloads da fila, por id) completa o que a leitura ainda não enxerga.
+    """
+    limite = 100
+    eventos = {}
+    while True:
+        msgs, cursor = _buscar_mensagens_incrementais(queryset, cursor, limite)
+        eventos.update((m.id, m.para_dict()) for m in msgs)
+        if len(msgs) < limite:
+            break
+    for id_, payload in ao_vivo.items():
+        eventos.setdefault(id_, payload)
+    return [eventos[id_] for id_ in sorted(eventos)]
+
+
+def _drenar(fila, primeiro):
+    """O payload recebido e o que mais já estiver na fila; None no lugar da lista se for para encerrar."""
+    payloads = [primeiro]
+    while not fila.empty():
+        payloads.append(fila.get_nowait())
+    if any(payload is streaming.ENCERRAR for payload in payloads):
+        return None
+    return payloads
+
+
+def _formatar_evento(payload):
+    return f"id: {payload['id']}\nevent: mensagem\ndata: {json.dumps(payload)}\n\n"
+
+
+async def _eventos_sse(chave, queryset, after_id):
+    """Gera os eventos SSE em ordem de id: primeiro o que o cliente perdeu, depois o ao vivo."""
+    # Assina antes de ler o banco para não perder mensagens entre as duas etapas
+    assinatura = streaming.registro.assinar(chave)
+    try:
+        pendentes, cursor = await sync_to_async(_backlog)(queryset, after_id)
+        yield 'retry: 3000\n\n'
+        for payload in pendentes:
+            yield _formatar_evento(payload)
+
+        # O fan-out só alcança mensagens salvas neste processo; as salvas em
+        # outros workers/dynos estão só no banco e podem ter id menor que uma
+        # que chegou ao vivo. O cliente guarda só o maior id recebido, então
+        # nada sai direto da fila: cada chegada ao vivo (e cada heartbeat)
+        # relê o banco a partir do cursor e envia tudo junto, em ordem.
+        loop = asyncio.get_running_loop()
+        proxima_batida = loop.time() + SSE_HEARTBEAT_SEGUNDOS
+        while True:
+            espera = proxima_batida - loop.time()
+            batida = espera <= 0
+            ao_vivo = {}
+            if not batida:
+                try:
+                    primeiro = await asyncio.wait_for(assinatura.fila.get(), timeout=espera)
+                except asyncio.TimeoutError:
+                    continue
+                payloads = _drenar(assinatura.fila, primeiro)
+                if payloads is None:
+                    break
+                ao_vivo = {payload['id']: payload for payload in payloads if payload['id'] > cursor}
+                if not ao_vivo:
+                    continue  # já enviado
+
+            for payload in await sync_to_async(_ler_em_ordem)(queryset, cursor, ao_vivo):
+                cursor = payload['id']
+                yield _formatar_evento(payload)
+            if batida:
+                yield ': heartbeat\n\n'
+                proxima_batida = loop.time() + SSE_HEARTBEAT_SEGUNDOS
+    finally:
+        streaming.registro.cancelar(assinatura)
+
+
+def _resposta_sse(eventos):
+    response = StreamingHttpResponse(eventos, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # desativa buffer do nginx
+    return response
+
+
 @login_required
+async def sala_stream(request, sala_id):
+    """Stream SSE do chat geral da sala.
+
+    Clientes sem suporte a stream (ou servidor rodando via WSGI) recebem
+    o mesmo JSON de ``sala_messages``.
+    """
+    if not _aceita_stream(request):
+        return await sync_to_async(sala_messages)(request, sala_id)
+
+    usuario = await request.auser()
+    if await sync_to_async(papel_na_sala)(usuario, sala_id) is None:
+        return JsonResponse({'error': 'Acesso negado à sala.'}, status=403)
+
+    try:
+        after_id = _cursor_stream(request)
+    except ValueError:
+        return HttpResponseBadRequest('Parâmetro after_id inválido.')
+
+    queryset = ChatMessage.objects.filter(sala_id=sala_id).select_related('usuario')
+    return _resposta_sse(_eventos_sse(streaming.chave_sala(sala_id), queryset, after_id))
+
+
+@login_required
+@participacao_requerida(
+    papel='professor',
+    mensagem='Apenas professores desta sala podem postar missões.',
+    destino=_url_sala_virtual,
+)
 def postar_missao(request, sala_id):
-    sala = get_object_or_404(Sala, id=sala_id)
-    
-    # Verificar se usuário é professor nesta sala específica
-    participacao = ParticipacaoSala.objects.filter(
-        usuario=request.user, 
-        sala=sala, 
-        tipo_na_sala='professor'
-    ).first()
-    
-    if not participacao:
-        messages.error(request, 'Apenas professores desta sala podem postar missões.')
-        return redirect('usuarios:sala_virtual', sala_id=sala_id)
+    sala = request.sala
         
     if request.method == 'POST':
         form = MissaoForm(request.POST)
@@ -295,14 +510,10 @@ def postar_missao(request, sala_id):
 
 @login_required
 def chat_missao(request, missao_id):
-    missao = get_object_or_404(Missao, id=missao_id)
+    missao = get_object_or_404(Missao.objects.select_related('sala'), id=missao_id)
 
     # Verifica se o usuário participa da sala da missão
-    participacao = ParticipacaoSala.objects.filter(
-        usuario=request.user,
-        sala=missao.sala
-    ).first()
-
+    participacao = participacao_na_sala(request, missao.sala_id)
     if not participacao:
         messages.error(request, 'Você não tem acesso a esta missão.')
         return redirect('usuarios:pag_principal')
@@ -310,7 +521,7 @@ def chat_missao(request, missao_id):
     # Todas as mensagens do chat
     mensagens = missao.mensagens.all().order_by('data_envio')
 
-    is_professor_na_sala = participacao.tipo_na_sala == 'professor'
+    is_professor_na_sala = participacao.is_professor
 
     # Verifica se o aluno já entregou a missão
     ja_entregou = missao.mensagens.filter(
@@ -318,25 +529,20 @@ def chat_missao(request, missao_id):
         tipo='entrega'
     ).exists()
 
-    # === LISTA DE ENTREGAS PARA O PROFESSOR (funciona com SQLite!) ===
+    # === LISTA DE ENTREGAS PARA O PROFESSOR ===
+    # Última entrega de cada aluno com a correção existente, em uma consulta
     entregas_com_dados = []
     if is_professor_na_sala:
-        # Pega apenas os IDs dos alunos que entregaram (distinct funciona aqui no SQLite)
-        alunos_com_entrega = missao.mensagens.filter(tipo='entrega')\
-            .values_list('usuario_id', flat=True).distinct()
-
-        for aluno_id in alunos_com_entrega:
-            # Pega a entrega mais recente de cada aluno
-            ultima_entrega = missao.mensagens.filter(
-                tipo='entrega',
-                usuario_id=aluno_id
-            ).order_by('-data_envio').first()
-
-            if ultima_entrega:
-                entregas_com_dados.append({
-                    'aluno': ultima_entrega.usuario,
-                    'entrega': ultima_entrega,
-                })
+        entregas = sorted(missao.ultimas_entregas(), key=lambda entrega: (entrega.data_envio, entrega.id))
+        entregas_com_dados = [
+            {
+                'aluno': entrega.usuario,
+                'entrega': entrega,
+                'pontos_corrigidos': entrega.pontos_corrigidos,
+                'data_correcao': entrega.data_correcao,
+            }
+            for entrega in entregas
+        ]
 
     # === PROCESSAMENTO DE ENVIO (POST) ===
     if request.method == 'POST' and missao.status != 'corrigida':
@@ -384,22 +590,14 @@ def chat_missao(request, missao_id):
                     tipo='correcao',
                 )
 
-                # Salva/atualiza a correção oficial
-                correcao, created = correcaoMissao.objects.update_or_create(
+                # Salva/atualiza a correção oficial; os signals aplicam a diferença
+                # nos contadores do aluno, no ranking da sala e no balde do dia
+                correcaoMissao.objects.update_or_create(
                     missao=missao,
                     aluno=aluno,
                     defaults={'professor': request.user, 'pontos_atingidos': pontos_atingidos}
                 )
 
-                # Atualiza pontos totais do aluno (só soma a diferença)
-                if not created and correcao.pontos_atingidos < pontos_atingidos:
-                    diferenca = pontos_atingidos - correcao.pontos_atingidos
-                    aluno.pontos_totais += diferenca
-                    aluno.save()
-                elif created:
-                    aluno.pontos_totais += pontos_atingidos
-                    aluno.save()
-
                 messages.success(request, f'Correção salva! {aluno.get_nome_exibicao()} recebeu {pontos_atingidos} pontos.')
 
                 # Verifica se todos que entregaram já foram corrigidos
@@ -447,37 +645,57 @@ def chat_missao(request, missao_id):
 def missao_messages(request, missao_id):
     """API simples para obter mensagens do chat da missão.
 
-    GET: retorna JSON com as últimas mensagens (até 100)
+    GET: retorna JSON ``{'mensagens': [...], 'cursor': <id>}``.
+         Aceita ``?after_id=<id>`` para buscar só as mensagens novas.
     """
     missao = get_object_or_404(Missao, id=missao_id)
 
     # Verificar se usuário participa da sala da missão
-    participacao = ParticipacaoSala.objects.filter(usuario=request.user, sala=missao.sala).first()
-    if not participacao:
+    if not participacao_na_sala(request, missao.sala_id):
         return JsonResponse({'error': 'Acesso negado à missão.'}, status=403)
 
     if request.method == 'GET':
-        msgs = MensagemMissao.objects.filter(missao=missao).order_by('-data_envio')[:100]
-        msgs = reversed(list(msgs))
-        data = [
-            {
-                'id': m.id,
-                'usuario_id': m.usuario.id,
-                'usuario_nome': m.usuario.get_nome_exibicao(),
-                'texto': m.texto,
-                'arquivo': m.arquivo.url if m.arquivo else None,
-                'tipo': m.tipo,
-                'data_envio': m.data_envio.isoformat(),
-            }
-            for m in msgs
-        ]
-        return JsonResponse(data, safe=False)
+        try:
+            after_id = _ler_cursor(request)
+        except ValueError:
+            return HttpResponseBadRequest('Parâmetro after_id inválido.')
+
+        msgs, cursor = _buscar_mensagens_incrementais(
+            MensagemMissao.objects.filter(missao=missao).select_related('usuario'),
+            after_id,
+        )
+        return JsonResponse({
+            'mensagens': [m.para_dict() for m in msgs],
+            'cursor': cursor,
+        })
 
     else:
         return JsonResponse({'error': 'Método não permitido.'}, status=405)
 
 
 
+@login_required
+async def missao_stream(request, missao_id):
+    """Stream SSE do chat da missão, com fallback para ``missao_messages``."""
+    if not _aceita_stream(request):
+        return await sync_to_async(missao_messages)(request, missao_id)
+
+    usuario = await request.auser()
+    missao = await Missao.objects.filter(id=missao_id).only('id', 'sala_id').afirst()
+    if missao is None:
+        return JsonResponse({'error': 'Missão não encontrada.'}, status=404)
+    if await sync_to_async(papel_na_sala)(usuario, missao.sala_id) is None:
+        return JsonResponse({'error': 'Acesso negado à missão.'}, status=403)
+
+    try:
+        after_id = _cursor_stream(request)
+    except ValueError:
+        return HttpResponseBadRequest('Parâmetro after_id inválido.')
+
+    queryset = MensagemMissao.objects.filter(missao_id=missao_id).select_related('usuario')
+    return _resposta_sse(_eventos_sse(streaming.chave_missao(missao_id), queryset, after_id))
+
+
 @login_required
 def perfil(request):
     """View unificada para exibir e editar perfil."""
@@ -503,66 +721,63 @@ def perfil(request):
     return render(request, 'usuarios/perfil.html', context)
 
 
+def _progresso(valor, necessario):
+    """Percentual (0-100) de ``valor`` em relação ao requisito."""
+    if necessario <= 0:
+        return 0
+    return min(100, int((valor / necessario) * 100))
+
+
 @login_required
 def listar_titulos(request):
     """
     Lista todos os títulos disponíveis (globais e de salas).
     Mostra quais o usuário já conquistou e o progresso dos restantes.
+
+    Número fixo de consultas: os títulos e as conquistas são lidos uma vez
+    e os contadores desnormalizados dão pontos e missões de cada sala.
     """
+    usuario = request.user
+    titulos = list(Titulo.objects.order_by('pontos_necessarios', 'id'))
+    titulos_globais = [t for t in titulos if t.tipo == 'global']
+    titulos_sala = [t for t in titulos if t.tipo == 'sala']
+
     # TÍTULOS GLOBAIS
-    titulos_globais = Titulo.objects.filter(tipo='global').order_by('pontos_necessarios')
-    
+    conquistados_globais = set(usuario.titulos_globais.values_list('id', flat=True))
+    missoes_completadas = usuario.missoes_completadas
+
     titulos_globais_info = []
     for titulo in titulos_globais:
-        conquistado = titulo in request.user.titulos_globais.all()
-        
-        # Calcular progresso
-        progresso_pontos = 0
-        progresso_missoes = 0
-        
-        if not conquistado:
-            if titulo.pontos_necessarios > 0:
-                progresso_pontos = min(100, int((request.user.pontos_totais / titulo.pontos_necessarios) * 100))
-            
-            missoes_completadas = request.user.missoes_completadas_globais()
-            if titulo.missoes_necessarias > 0:
-                progresso_missoes = min(100, int((missoes_completadas / titulo.missoes_necessarias) * 100))
-        
+        conquistado = titulo.id in conquistados_globais
         titulos_globais_info.append({
             'titulo': titulo,
             'conquistado': conquistado,
-            'progresso_pontos': progresso_pontos,
-            'progresso_missoes': progresso_missoes,
-            'missoes_completadas': request.user.missoes_completadas_globais(),
+            'progresso_pontos': 0 if conquistado else _progresso(usuario.pontos_totais, titulo.pontos_necessarios),
+            'progresso_missoes': 0 if conquistado else _progresso(missoes_completadas, titulo.missoes_necessarias),
+            'missoes_completadas': missoes_completadas,
         })
-    
+
     # TÍTULOS DE SALAS
-    participacoes = ParticipacaoSala.objects.filter(usuario=request.user).select_related('sala')
-    
+    participacoes = (
+        ParticipacaoSala.objects.filter(usuario=usuario)
+        .select_related('sala')
+        .prefetch_related(Prefetch('titulos_sala', queryset=Titulo.objects.only('id')))
+    )
+
     titulos_salas_info = []
     for participacao in participacoes:
-        titulos_sala = Titulo.objects.filter(tipo='sala')
-        
+        conquistados_sala = {t.id for t in participacao.titulos_sala.all()}
+        pontos_na_sala = participacao.pontos_na_sala
+        missoes_na_sala = participacao.missoes_na_sala
+
         for titulo in titulos_sala:
-            conquistado = titulo in participacao.titulos_sala.all()
-            pontos_na_sala = participacao.calcular_pontos_na_sala()
-            missoes_na_sala = participacao.missoes_completadas_na_sala()
-            
-            progresso_pontos = 0
-            progresso_missoes = 0
-            
-            if not conquistado:
-                if titulo.pontos_necessarios > 0:
-                    progresso_pontos = min(100, int((pontos_na_sala / titulo.pontos_necessarios) * 100))
-                if titulo.missoes_necessarias > 0:
-                    progresso_missoes = min(100, int((missoes_na_sala / titulo.missoes_necessarias) * 100))
-            
+            conquistado = titulo.id in conquistados_sala
             titulos_salas_info.append({
                 'titulo': titulo,
                 'sala': participacao.sala,
                 'conquistado': conquistado,
-                'progresso_pontos': progresso_pontos,
-                'progresso_missoes': progresso_missoes,
+                'progresso_pontos': 0 if conquistado else _progresso(pontos_na_sala, titulo.pontos_necessarios),
+                'progresso_missoes': 0 if conquistado else _progresso(missoes_na_sala, titulo.missoes_necessarias),
                 'pontos_na_sala': pontos_na_sala,
                 'missoes_na_sala': missoes_na_sala,
             })
@@ -576,23 +791,17 @@ def listar_titulos(request):
 
 
 @login_required
+@participacao_requerida(
+    papel='professor',
+    mensagem='Apenas professores desta sala podem criar títulos.',
+    destino=_url_sala_virtual,
+)
 def criar_titulo_sala(request, sala_id):
     """
     Permite que professores criem títulos específicos para suas salas.
     Apenas professores da sala podem criar títulos.
     """
-    sala = get_object_or_404(Sala, id=sala_id)
-    
-    # Verificar se usuário é professor nesta sala
-    participacao = ParticipacaoSala.objects.filter(
-        usuario=request.user, 
-        sala=sala, 
-        tipo_na_sala='professor'
-    ).first()
-    
-    if not participacao:
-        messages.error(request, 'Apenas professores desta sala podem criar títulos.')
-        return redirect('usuarios:sala_virtual', sala_id=sala_id)
+    sala = request.sala
     
     if request.method == 'POST':
         nome = request.POST.get('nome', '').strip()
@@ -633,20 +842,8 @@ def criar_titulo_sala(request, sala_id):
         
         messages.success(request, f'Título "{titulo.nome}" criado com sucesso!')
         
-        # Verificar se algum aluno já merece este título
-        alunos_sala = ParticipacaoSala.objects.filter(sala=sala, tipo_na_sala='aluno')
-        novos_titulos = 0
-        
-        for part in alunos_sala:
-            pontos = part.calcular_pontos_na_sala()
-            missoes = part.missoes_completadas_na_sala()
-            
-            if pontos >= titulo.pontos_necessarios and missoes >= titulo.missoes_necessarias:
-                part.titulos_sala.add(titulo)
-                novos_titulos += 1
-        
-        if novos_titulos > 0:
-            messages.info(request, f'{novos_titulos} aluno(s) conquistaram este título automaticamente!')
+        # A concessão retroativa foi enfileirada pelo signal de criação do título
+        messages.info(request, 'Os alunos que já atendem os requisitos receberão este título em instantes.')
         
         return redirect('usuarios:sala_virtual', sala_id=sala_id)
     
@@ -702,18 +899,8 @@ def criar_titulo_global(request):
         
         messages.success(request, f'Título global "{titulo.nome}" criado com sucesso!')
         
-        # Verificar todos os usuários
-        usuarios = Usuario.objects.all()
-        novos_titulos = 0
-        
-        for usuario in usuarios:
-            if usuario.pontos_totais >= titulo.pontos_necessarios and \
-               usuario.missoes_completadas_globais() >= titulo.missoes_necessarias:
-                usuario.titulos_globais.add(titulo)
-                novos_titulos += 1
-        
-        if novos_titulos > 0:
-            messages.info(request, f'{novos_titulos} usuário(s) conquistaram este título!')
+        # A concessão retroativa foi enfileirada pelo signal de criação do título
+        messages.info(request, 'Os usuários que já atendem os requisitos receberão este título em instantes.')
         
         return redirect('usuarios:painel_adm')
     
@@ -741,14 +928,14 @@ def excluir_titulo(request, titulo_id):
         # Verificar se é professor em alguma sala que usa este título
         # (na prática, títulos de sala não são vinculados a salas específicas no modelo atual,
         # então qualquer professor pode criar/excluir - você pode querer ajustar isso)
-        participacoes_prof = ParticipacaoSala.objects.filter(
-            usuario=request.user,
-            tipo_na_sala='professor'
+        salas_prof = sorted(
+            sala_id for sala_id, tipo in ParticipacaoSala.papeis_do_usuario(request.user).items()
+            if tipo == 'professor'
         )
-        if participacoes_prof.exists():
+        if salas_prof:
             pode_excluir = True
             # Pegar primeira sala do professor
-            redirect_url = f"usuarios:sala_virtual", participacoes_prof.first().sala.id
+            redirect_url = _url_sala_virtual(salas_prof[0])
     
     if not pode_excluir:
         messages.error(request, 'Você não tem permissão para excluir este título.')